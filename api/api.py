@@ -1,11 +1,14 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from typing import List, Optional
 import sys
 import os
+import asyncio
+import threading
 import json
 import re
+import importlib.util
 
 # Agregar el directorio rag al path para importar funciones de RAG
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'rag'))
@@ -14,17 +17,37 @@ from bd.dto import (
     EstudianteCreate, RespuestaCreate, TemaBasico, TemaDetallado,
     PreguntaResponse, RespuestaEstudianteResponse, EstudianteCreateResponse,
     TipoPreguntaEnum, GradoEnum, PersonajeResponse, InvestigadorResponse,
-    EstudianteResponse, EstudianteUpdate, PreguntaTemporal, SexoEnum
+    EstudianteResponse, EstudianteUpdate, PreguntaTemporal, SexoEnum, FormatoListadoEnum,
+    TrabajoCreadoResponse, TrabajoResponse
 )
-from bd.bd_supabase import supabase
+from bd.bd_supabase import supabase, ejecutar, cerrar_executor
+from bd.cache import catalogo_cache
+from bd.buffer_respuestas import BufferRespuestas, BufferLlenoError, RESPUESTAS_WRITE_BEHIND
+from api.trabajos import cola_trabajos, ColaLlenaError, Trabajo, ERROR as ESTADO_ERROR
+from api.pool_preguntas import PoolPreguntas, POOL_PREGUNTAS, POOL_PREGUNTAS_PRECALENTAR
 from datetime import datetime
 
+# Módulos que execute_rag importa recién en el primer uso. Se verifica al iniciar que estén instalados
+# para que, si faltan, los endpoints de RAG respondan 503 en lugar de fallar en la primera generación
+DEPENDENCIAS_RAG = ["chromadb", "sentence_transformers", "langchain_google_genai", "numpy"]
+
 try:
-    from execute_rag import execute_rag_for_query
+    dependencias_faltantes = [modulo for modulo in DEPENDENCIAS_RAG if importlib.util.find_spec(modulo) is None]
+    if dependencias_faltantes:
+        raise ImportError(f"Faltan dependencias de RAG: {', '.join(dependencias_faltantes)}")
+    # Importar execute_rag es barato: los modelos y Chroma se cargan en el primer uso (o en el precalentamiento)
+    from execute_rag import execute_rag_for_query, execute_rag_stream, recargar_colecciones, precalentar_colecciones, precalentar_rag, estadisticas_rag
+    from json_incremental import ParserArregloJSON
     print("[DEBUG] execute_rag_for_query importado exitosamente")
 except ImportError as e:
     print(f"[ERROR] Error importando execute_rag_for_query: {e}")
     execute_rag_for_query = None
+    execute_rag_stream = None
+    ParserArregloJSON = None
+    recargar_colecciones = None
+    precalentar_colecciones = None
+    precalentar_rag = None
+    estadisticas_rag = None
     
 grado_translate = {
     "1er": "Primer Grado",
@@ -35,6 +58,17 @@ grado_translate = {
     "6to": "Sexto Grado",
 }
 
+# Paginación keyset de los listados (estudiantes, respuestas)
+LISTADO_TAMANO_LOTE = int(os.getenv("LISTADO_TAMANO_LOTE", "500"))  # filas por consulta a Supabase
+LISTADO_LIMITE_DEFECTO = 100
+LISTADO_LIMITE_MAXIMO = 1000
+
+# Cargar modelos y colecciones de RAG en segundo plano al iniciar (RAG_PRECALENTAR=1)
+RAG_PRECALENTAR = os.getenv("RAG_PRECALENTAR", "0") == "1"
+
+# Precargar el catálogo de temas al iniciar el servidor (CATALOGO_CACHE_PRECALENTAR=1)
+CATALOGO_CACHE_PRECALENTAR = os.getenv("CATALOGO_CACHE_PRECALENTAR", "0") == "1"
+
 app = FastAPI(title="MINEDU RAG API", description="API para sistema educativo MINEDU", version="1.0.0")
 
 # Configurar directorio de archivos estáticos para imágenes
@@ -45,19 +79,197 @@ if os.path.exists(images_directory):
 else:
     print(f"[WARNING] Directorio de imágenes no encontrado: {images_directory}")
 
+@app.on_event("startup")
+async def startup():
+    """
+    Inicia la cola de trabajos de generación, el buffer write-behind de respuestas (si está habilitado) y
+    precarga opcionalmente el catálogo de temas para servir las primeras peticiones desde memoria
+    """
+    cola_trabajos.iniciar()
+    
+    if RAG_PRECALENTAR and precalentar_rag is not None:
+        # En un hilo aparte: el servidor empieza a atender mientras se cargan los modelos
+        threading.Thread(target=precalentar_rag, name="precalentar-rag", daemon=True).start()
+        print("[INFO] Precalentamiento de RAG iniciado en segundo plano")
+    
+    if pool_preguntas is not None and POOL_PREGUNTAS_PRECALENTAR:
+        # Rellenar en segundo plano los pools de todos los temas; el servidor atiende mientras tanto
+        try:
+            temas_response = await ejecutar(supabase.table("tema").select("id"))
+            for tema in temas_response.data or []:
+                pool_preguntas.rellenar(TipoPreguntaEnum.TEMA, str(tema["id"]))
+            print(f"[INFO] Relleno de pools de preguntas iniciado para {len(temas_response.data or [])} temas")
+        except Exception as e:
+            print(f"[WARNING] No se pudo iniciar el relleno de pools de preguntas: {e}")
+    
+    if buffer_respuestas is not None:
+        buffer_respuestas.iniciar()
+        print(f"[INFO] Buffer write-behind de respuestas activo (max_filas={buffer_respuestas.max_filas}, max_espera={buffer_respuestas.max_espera}s)")
+    
+    if CATALOGO_CACHE_PRECALENTAR:
+        try:
+            for grado in GradoEnum:
+                await consultar_catalogo(("tema", "grado", grado.value), supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", grado.value))
+            print(f"[INFO] Cache de catálogo precalentado: {catalogo_cache.estadisticas()['entradas']} entradas")
+        except Exception as e:
+            print(f"[WARNING] No se pudo precalentar el cache de catálogo: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Detiene la cola de trabajos, vacía el buffer de respuestas pendientes y libera el pool de hilos usado para las consultas a Supabase
+    """
+    if pool_preguntas is not None:
+        await pool_preguntas.detener()
+    await cola_trabajos.detener()
+    if buffer_respuestas is not None:
+        await buffer_respuestas.detener()
+    cerrar_executor()
+
+async def insertar_respuestas(filas: List[dict]):
+    """
+    Inserta varias respuestas con un único insert multi-fila
+    """
+    response = await ejecutar(supabase.table("respuesta").insert(filas))
+    if not response.data:
+        raise Exception("Supabase no confirmó la inserción de las respuestas")
+    return response
+
+def respuesta_a_fila(respuesta: RespuestaCreate) -> dict:
+    return {
+        "id_pregunta": respuesta.id_pregunta,
+        "id_estudiante": respuesta.id_estudiante,
+        "resultado": respuesta.resultado,
+        "tiempo_inicio_pregunta": respuesta.tiempo_inicio_pregunta.isoformat(),
+        "tiempo_envio_respuesta": respuesta.tiempo_envio_respuesta.isoformat()
+    }
+
+# Buffer write-behind opcional para las respuestas (RESPUESTAS_WRITE_BEHIND=1)
+buffer_respuestas = BufferRespuestas(insertar_respuestas) if RESPUESTAS_WRITE_BEHIND else None
+
+async def consultar_catalogo(clave: tuple, query) -> list:
+    """
+    Lee una consulta del catálogo (tema, personaje, investigador) a través del cache en memoria.
+    La consulta solo se envía a Supabase si la clave no está cacheada o expiró.
+    """
+    async def cargar():
+        response = await ejecutar(query)
+        return response.data or []
+    
+    return await catalogo_cache.obtener(clave, cargar)
+
+async def obtener_ids_respondidas_correctamente(id_estudiante: int, ids_preguntas: List[int]) -> set:
+    """
+    Devuelve el conjunto de ids de pregunta que el estudiante respondió correctamente AL MENOS UNA VEZ
+    (puede haber múltiples respuestas incorrectas, pero si al menos una es correcta, estado = True).
+    Se resuelve con una sola consulta filtrada con `in_` en lugar de una consulta por pregunta.
+    """
+    if not ids_preguntas:
+        return set()
+    
+    response = await ejecutar(supabase.table("respuesta").select("id_pregunta").eq("id_estudiante", id_estudiante).eq("resultado", True).in_("id_pregunta", ids_preguntas))
+    
+    return {respuesta["id_pregunta"] for respuesta in (response.data or [])}
+
+def fila_a_estudiante(estudiante: dict) -> EstudianteResponse:
+    return EstudianteResponse(
+        id=estudiante["id"],
+        nombre=estudiante["nombre"],
+        sexo=estudiante["sexo"],
+        grado=estudiante["grado"]
+    )
+
+def fila_a_respuesta_estudiante(respuesta: dict) -> RespuestaEstudianteResponse:
+    # Calcular duración en segundos
+    inicio = datetime.fromisoformat(respuesta["tiempo_inicio_pregunta"].replace('Z', '+00:00'))
+    envio = datetime.fromisoformat(respuesta["tiempo_envio_respuesta"].replace('Z', '+00:00'))
+    duracion = int((envio - inicio).total_seconds())
+    
+    return RespuestaEstudianteResponse(
+        id_pregunta=respuesta["id_pregunta"],
+        pregunta=respuesta["Pregunta"]["pregunta"],
+        resultado=respuesta["resultado"],
+        duracion=duracion
+    )
+
+async def iterar_por_keyset(construir_query, despues_de_id: Optional[int] = None, limite: Optional[int] = None):
+    """
+    Recorre una tabla en lotes ordenados por `id` usando paginación keyset (id > cursor).
+    `construir_query` devuelve un query builder nuevo (con select y filtros) en cada llamada.
+    Solo un lote vive en memoria a la vez, sin importar el tamaño de la tabla.
+    """
+    cursor = despues_de_id
+    restantes = limite
+    
+    while True:
+        tamano_lote = LISTADO_TAMANO_LOTE if restantes is None else min(LISTADO_TAMANO_LOTE, restantes)
+        query = construir_query()
+        if cursor is not None:
+            query = query.gt("id", cursor)
+        
+        response = await ejecutar(query.order("id").limit(tamano_lote))
+        filas = response.data or []
+        if not filas:
+            return
+        
+        yield filas
+        
+        cursor = filas[-1]["id"]
+        if restantes is not None:
+            restantes -= len(filas)
+            if restantes <= 0:
+                return
+        if len(filas) < tamano_lote:
+            return
+
+async def listar_por_keyset(construir_query, convertir, response: Response, despues_de_id: Optional[int], limite: Optional[int], formato: FormatoListadoEnum):
+    """
+    Resuelve un listado en uno de tres modos:
+    - NDJSON: emite una línea por fila a medida que llegan los lotes desde Supabase (memoria constante).
+    - Página por cursor (si se indica `despues_de_id` o `limite`): devuelve una página y, si hay más,
+      el cursor de la siguiente en la cabecera `X-Siguiente-Cursor`.
+    - Sin parámetros: lista completa, como antes.
+    """
+    if formato == FormatoListadoEnum.NDJSON:
+        async def generar_ndjson():
+            try:
+                async for filas in iterar_por_keyset(construir_query, despues_de_id, limite):
+                    for fila in filas:
+                        yield convertir(fila).model_dump_json() + "\n"
+            except Exception as e:
+                # El status ya se envió; se informa el error como última línea del stream
+                print(f"[ERROR] Error durante el streaming NDJSON: {str(e)}")
+                yield json.dumps({"error": str(e)}) + "\n"
+        
+        return StreamingResponse(generar_ndjson(), media_type="application/x-ndjson")
+    
+    if despues_de_id is not None or limite is not None:
+        limite_pagina = limite or LISTADO_LIMITE_DEFECTO
+        filas = []
+        async for lote in iterar_por_keyset(construir_query, despues_de_id, limite_pagina):
+            filas.extend(lote)
+        
+        if len(filas) == limite_pagina:
+            response.headers["X-Siguiente-Cursor"] = str(filas[-1]["id"])
+        
+        return [convertir(fila) for fila in filas]
+    
+    response_completa = await ejecutar(construir_query())
+    return [convertir(fila) for fila in (response_completa.data or [])]
+
 @app.get("/getTodosTemas", response_model=List[TemaBasico])
 async def get_todos_temas(grado: GradoEnum):
     """
     Obtiene todos los temas de un grado específico
     """
     try:
-        response = supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", grado.value).execute()
+        temas_data = await consultar_catalogo(("tema", "grado", grado.value), supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", grado.value))
         
-        if not response.data:
+        if not temas_data:
             return []
         
         temas = []
-        for tema in response.data:
+        for tema in temas_data:
             temas.append(TemaBasico(
                 tema=tema["nombre"],
                 descripcion=tema["descripcion"],
@@ -75,30 +287,46 @@ async def get_tema_especifico(grado: GradoEnum, id_tema: int):
     Obtiene un tema específico con sus personajes e investigadores
     """
     try:
-        # Obtener tema
-        tema_response = supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", grado.value).eq("id", id_tema).execute()
+        # Obtener tema, personajes e investigadores en paralelo (son consultas independientes)
+        temas_data, personajes_data, investigadores_data = await asyncio.gather(
+            consultar_catalogo(("tema", "grado_id", grado.value, id_tema), supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", grado.value).eq("id", id_tema)),
+            consultar_catalogo(("personaje", "id_tema", id_tema), supabase.table("personaje").select("nombre, descripcion, imagen").eq("id_tema", id_tema)),
+            consultar_catalogo(("investigador", "id_tema", id_tema), supabase.table("investigador").select("nombres, sexo, descripcion, es_provincia, enlace_renacyt, area, imagen").eq("id_tema", id_tema)),
+            return_exceptions=True
+        )
+        
+        # El tema manda: si falla o no existe no tiene sentido reportar el resto
+        if isinstance(temas_data, Exception):
+            raise HTTPException(status_code=500, detail=f"Error interno del servidor al obtener el tema: {str(temas_data)}")
         
-        if not tema_response.data:
+        if not temas_data:
             raise HTTPException(status_code=404, detail="Tema no encontrado")
         
-        tema_data = tema_response.data[0]
+        # Reportar cualquier fallo parcial indicando qué consulta falló
+        errores = []
+        if isinstance(personajes_data, Exception):
+            errores.append(f"personajes: {str(personajes_data)}")
+        if isinstance(investigadores_data, Exception):
+            errores.append(f"investigadores: {str(investigadores_data)}")
+        if errores:
+            raise HTTPException(status_code=500, detail=f"Error interno del servidor al obtener {'; '.join(errores)}")
         
-        # Obtener personajes
-        personajes_response = supabase.table("personaje").select("nombre, descripcion, imagen").eq("id_tema", id_tema).execute()
+        tema_data = temas_data[0]
+        
+        # Armar personajes
         personajes = []
-        if personajes_response.data:
-            for personaje in personajes_response.data:
+        if personajes_data:
+            for personaje in personajes_data:
                 personajes.append(PersonajeResponse(
                     nombre=personaje["nombre"],
                     descripcion=personaje["descripcion"],
                     imagen=personaje["imagen"]
                 ))
         
-        # Obtener investigadores
-        investigadores_response = supabase.table("investigador").select("nombres, sexo, descripcion, es_provincia, enlace_renacyt, area, imagen").eq("id_tema", id_tema).execute()
+        # Armar investigadores
         investigadores = []
-        if investigadores_response.data:
-            for investigador in investigadores_response.data:
+        if investigadores_data:
+            for investigador in investigadores_data:
                 investigadores.append(InvestigadorResponse(
                     nombres=investigador["nombres"],
                     sexo=investigador["sexo"],
@@ -129,21 +357,16 @@ async def get_all_preguntas(tipo: TipoPreguntaEnum, id_tipo: str, id_estudiante:
     """
     try:
         # Obtener todas las preguntas del tipo especificado
-        preguntas_response = supabase.table("pregunta").select("id, pregunta, alternativa_a, alternativa_b, alternativa_c, alternativa_d, alternativa_correcta").eq("tipo", tipo.value).eq("id_tipo", id_tipo).execute()
+        preguntas_response = await ejecutar(supabase.table("pregunta").select("id, pregunta, alternativa_a, alternativa_b, alternativa_c, alternativa_d, alternativa_correcta").eq("tipo", tipo.value).eq("id_tipo", id_tipo))
         
         if not preguntas_response.data:
             return []
         
+        # Una sola consulta para conocer qué preguntas ya respondió correctamente el estudiante
+        ids_correctas = await obtener_ids_respondidas_correctamente(id_estudiante, [pregunta["id"] for pregunta in preguntas_response.data])
+        
         preguntas = []
         for pregunta in preguntas_response.data:
-            # Verificar si el estudiante respondió correctamente esta pregunta AL MENOS UNA VEZ
-            # (puede haber múltiples respuestas incorrectas, pero si al menos una es correcta, estado = True)
-            respuesta_correcta = supabase.table("respuesta").select("id").eq("id_pregunta", pregunta["id"]).eq("id_estudiante", id_estudiante).eq("resultado", True).execute()
-            
-            # El estado es True si existe al menos una respuesta correcta para esta pregunta
-            # Sin importar cuántas respuestas incorrectas haya tenido antes
-            estado_respondida_correctamente = len(respuesta_correcta.data) > 0
-            
             preguntas.append(PreguntaResponse(
                 pregunta=pregunta["pregunta"],
                 alternativa_a=pregunta["alternativa_a"],
@@ -151,7 +374,7 @@ async def get_all_preguntas(tipo: TipoPreguntaEnum, id_tipo: str, id_estudiante:
                 alternativa_c=pregunta["alternativa_c"],
                 alternativa_d=pregunta["alternativa_d"],
                 alternativa_correcta=pregunta["alternativa_correcta"],
-                estado=estado_respondida_correctamente
+                estado=pregunta["id"] in ids_correctas
             ))
         
         return preguntas
@@ -170,21 +393,16 @@ async def get_preguntas_paginado(tipo: TipoPreguntaEnum, id_tipo: str, paginado:
         offset = (paginado - 1) * page_size
         
         # Obtener preguntas paginadas del tipo especificado
-        preguntas_response = supabase.table("pregunta").select("id, pregunta, alternativa_a, alternativa_b, alternativa_c, alternativa_d, alternativa_correcta").eq("tipo", tipo.value).eq("id_tipo", id_tipo).range(offset, offset + page_size - 1).execute()
+        preguntas_response = await ejecutar(supabase.table("pregunta").select("id, pregunta, alternativa_a, alternativa_b, alternativa_c, alternativa_d, alternativa_correcta").eq("tipo", tipo.value).eq("id_tipo", id_tipo).range(offset, offset + page_size - 1))
         
         if not preguntas_response.data:
             return []
         
+        # Una sola consulta para conocer qué preguntas ya respondió correctamente el estudiante
+        ids_correctas = await obtener_ids_respondidas_correctamente(id_estudiante, [pregunta["id"] for pregunta in preguntas_response.data])
+        
         preguntas = []
         for pregunta in preguntas_response.data:
-            # Verificar si el estudiante respondió correctamente esta pregunta AL MENOS UNA VEZ
-            # (puede haber múltiples respuestas incorrectas, pero si al menos una es correcta, estado = True)
-            respuesta_correcta = supabase.table("respuesta").select("id").eq("id_pregunta", pregunta["id"]).eq("id_estudiante", id_estudiante).eq("resultado", True).execute()
-            
-            # El estado es True si existe al menos una respuesta correcta para esta pregunta
-            # Sin importar cuántas respuestas incorrectas haya tenido antes
-            estado_respondida_correctamente = len(respuesta_correcta.data) > 0
-            
             preguntas.append(PreguntaResponse(
                 pregunta=pregunta["pregunta"],
                 alternativa_a=pregunta["alternativa_a"],
@@ -192,7 +410,7 @@ async def get_preguntas_paginado(tipo: TipoPreguntaEnum, id_tipo: str, paginado:
                 alternativa_c=pregunta["alternativa_c"],
                 alternativa_d=pregunta["alternativa_d"],
                 alternativa_correcta=pregunta["alternativa_correcta"],
-                estado=estado_respondida_correctamente
+                estado=pregunta["id"] in ids_correctas
             ))
         
         return preguntas
@@ -201,32 +419,23 @@ async def get_preguntas_paginado(tipo: TipoPreguntaEnum, id_tipo: str, paginado:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 @app.get("/getAllRespuestas", response_model=List[RespuestaEstudianteResponse])
-async def get_all_respuestas(id_estudiante: int):
+async def get_all_respuestas(
+    id_estudiante: int,
+    response: Response,
+    despues_de_id: Optional[int] = Query(None, ge=0, description="Cursor: devolver respuestas con id mayor a este valor"),
+    limite: Optional[int] = Query(None, ge=1, le=LISTADO_LIMITE_MAXIMO, description="Cantidad máxima de respuestas a devolver"),
+    formato: FormatoListadoEnum = Query(FormatoListadoEnum.JSON, description="json o ndjson (streaming)")
+):
     """
-    Obtiene todas las respuestas de un estudiante específico
+    Obtiene todas las respuestas de un estudiante específico.
+    Soporta paginación por cursor (`despues_de_id` + `limite`) y streaming NDJSON (`formato=ndjson`)
     """
     try:
         # Hacer join entre Respuesta y Pregunta para obtener el texto de la pregunta
-        response = supabase.table("respuesta").select("id_pregunta, resultado, tiempo_inicio_pregunta, tiempo_envio_respuesta, Pregunta(pregunta)").eq("id_estudiante", id_estudiante).execute()
-        
-        if not response.data:
-            return []
-        
-        respuestas = []
-        for respuesta in response.data:
-            # Calcular duración en segundos
-            inicio = datetime.fromisoformat(respuesta["tiempo_inicio_pregunta"].replace('Z', '+00:00'))
-            envio = datetime.fromisoformat(respuesta["tiempo_envio_respuesta"].replace('Z', '+00:00'))
-            duracion = int((envio - inicio).total_seconds())
-            
-            respuestas.append(RespuestaEstudianteResponse(
-                id_pregunta=respuesta["id_pregunta"],
-                pregunta=respuesta["Pregunta"]["pregunta"],
-                resultado=respuesta["resultado"],
-                duracion=duracion
-            ))
+        def construir_query():
+            return supabase.table("respuesta").select("id, id_pregunta, resultado, tiempo_inicio_pregunta, tiempo_envio_respuesta, Pregunta(pregunta)").eq("id_estudiante", id_estudiante)
         
-        return respuestas
+        return await listar_por_keyset(construir_query, fila_a_respuesta_estudiante, response, despues_de_id, limite, formato)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
@@ -237,33 +446,69 @@ async def enviar_respuesta(respuesta: RespuestaCreate):
     Envía una respuesta de un estudiante
     """
     try:
-        response = supabase.table("respuesta").insert({
-            "id_pregunta": respuesta.id_pregunta,
-            "id_estudiante": respuesta.id_estudiante,
-            "resultado": respuesta.resultado,
-            "tiempo_inicio_pregunta": respuesta.tiempo_inicio_pregunta.isoformat(),
-            "tiempo_envio_respuesta": respuesta.tiempo_envio_respuesta.isoformat()
-        }).execute()
+        if buffer_respuestas is not None:
+            await buffer_respuestas.agregar([respuesta_a_fila(respuesta)])
+            return JSONResponse(content={"message": "Respuesta recibida"}, status_code=202)
+        
+        response = await ejecutar(supabase.table("respuesta").insert(respuesta_a_fila(respuesta)))
         
         if response.data:
             return JSONResponse(content={"message": "Respuesta enviada exitosamente"}, status_code=201)
         else:
             raise HTTPException(status_code=400, detail="Error al enviar la respuesta")
     
+    except BufferLlenoError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+@app.post("/enviarRespuestas")
+async def enviar_respuestas(respuestas: List[RespuestaCreate]):
+    """
+    Envía varias respuestas de estudiantes en un único insert multi-fila
+    """
+    try:
+        if not respuestas:
+            raise HTTPException(status_code=400, detail="La lista de respuestas está vacía")
+        
+        filas = [respuesta_a_fila(respuesta) for respuesta in respuestas]
+        
+        if buffer_respuestas is not None:
+            await buffer_respuestas.agregar(filas)
+            return JSONResponse(content={"message": "Respuestas recibidas", "cantidad": len(filas)}, status_code=202)
+        
+        await insertar_respuestas(filas)
+        return JSONResponse(content={"message": "Respuestas enviadas exitosamente", "cantidad": len(filas)}, status_code=201)
+    
+    except BufferLlenoError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+@app.get("/metricasRespuestas")
+async def metricas_respuestas():
+    """
+    Métricas del buffer write-behind de respuestas (pendientes, flushes, latencia de flush, dead-letter)
+    """
+    if buffer_respuestas is None:
+        return {"write_behind": False}
+    return {"write_behind": True, **buffer_respuestas.metricas()}
+
 @app.post("/registrarEstudiante", response_model=EstudianteCreateResponse)
 async def registrar_estudiante(estudiante: EstudianteCreate):
     """
     Registra un nuevo estudiante
     """
     try:
-        response = supabase.table("estudiante").insert({
+        response = await ejecutar(supabase.table("estudiante").insert({
             "nombre": estudiante.nombre,
             "sexo": estudiante.sexo.value,
             "grado": estudiante.grado.value
-        }).execute()
+        }))
         
         if response.data:
             nuevo_id = response.data[0]["id"]
@@ -275,62 +520,51 @@ async def registrar_estudiante(estudiante: EstudianteCreate):
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 @app.get("/listarTodosEstudiantes", response_model=List[EstudianteResponse])
-async def listar_todos_estudiantes():
+async def listar_todos_estudiantes(
+    response: Response,
+    despues_de_id: Optional[int] = Query(None, ge=0, description="Cursor: devolver estudiantes con id mayor a este valor"),
+    limite: Optional[int] = Query(None, ge=1, le=LISTADO_LIMITE_MAXIMO, description="Cantidad máxima de estudiantes a devolver"),
+    formato: FormatoListadoEnum = Query(FormatoListadoEnum.JSON, description="json o ndjson (streaming)")
+):
     """
-    Obtiene todos los estudiantes registrados
+    Obtiene todos los estudiantes registrados.
+    Soporta paginación por cursor (`despues_de_id` + `limite`) y streaming NDJSON (`formato=ndjson`)
     """
     try:
-        response = supabase.table("estudiante").select("id, nombre, sexo, grado").execute()
-        
-        if not response.data:
-            return []
-        
-        estudiantes = []
-        for estudiante in response.data:
-            estudiantes.append(EstudianteResponse(
-                id=estudiante["id"],
-                nombre=estudiante["nombre"],
-                sexo=estudiante["sexo"],
-                grado=estudiante["grado"]
-            ))
+        def construir_query():
+            return supabase.table("estudiante").select("id, nombre, sexo, grado")
         
-        return estudiantes
+        return await listar_por_keyset(construir_query, fila_a_estudiante, response, despues_de_id, limite, formato)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 @app.get("/listarEstudiantesFiltrados", response_model=List[EstudianteResponse])
 async def listar_estudiantes_filtrados(
+    response: Response,
     grado: Optional[GradoEnum] = Query(None, description="Filtrar por grado"),
-    sexo: Optional[SexoEnum] = Query(None, description="Filtrar por sexo")
+    sexo: Optional[SexoEnum] = Query(None, description="Filtrar por sexo"),
+    despues_de_id: Optional[int] = Query(None, ge=0, description="Cursor: devolver estudiantes con id mayor a este valor"),
+    limite: Optional[int] = Query(None, ge=1, le=LISTADO_LIMITE_MAXIMO, description="Cantidad máxima de estudiantes a devolver"),
+    formato: FormatoListadoEnum = Query(FormatoListadoEnum.JSON, description="json o ndjson (streaming)")
 ):
     """
-    Obtiene estudiantes filtrados por grado y/o sexo
+    Obtiene estudiantes filtrados por grado y/o sexo.
+    Soporta paginación por cursor (`despues_de_id` + `limite`) y streaming NDJSON (`formato=ndjson`)
     """
     try:
-        query = supabase.table("estudiante").select("id, nombre, sexo, grado")
-        
-        if grado:
-            query = query.eq("grado", grado.value)
-        
-        if sexo:
-            query = query.eq("sexo", sexo.value)
-        
-        response = query.execute()
-        
-        if not response.data:
-            return []
-        
-        estudiantes = []
-        for estudiante in response.data:
-            estudiantes.append(EstudianteResponse(
-                id=estudiante["id"],
-                nombre=estudiante["nombre"],
-                sexo=estudiante["sexo"],
-                grado=estudiante["grado"]
-            ))
+        def construir_query():
+            query = supabase.table("estudiante").select("id, nombre, sexo, grado")
+            
+            if grado:
+                query = query.eq("grado", grado.value)
+            
+            if sexo:
+                query = query.eq("sexo", sexo.value)
+            
+            return query
         
-        return estudiantes
+        return await listar_por_keyset(construir_query, fila_a_estudiante, response, despues_de_id, limite, formato)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
@@ -341,7 +575,7 @@ async def get_datos_estudiante(id_estudiante: int):
     Obtiene los datos de un estudiante específico
     """
     try:
-        response = supabase.table("estudiante").select("id, nombre, sexo, grado").eq("id", id_estudiante).execute()
+        response = await ejecutar(supabase.table("estudiante").select("id, nombre, sexo, grado").eq("id", id_estudiante))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
@@ -367,17 +601,17 @@ async def actualizar_datos_estudiante(id_estudiante: int, estudiante_update: Est
     """
     try:
         # Verificar que el estudiante existe
-        existing_response = supabase.table("estudiante").select("id").eq("id", id_estudiante).execute()
+        existing_response = await ejecutar(supabase.table("estudiante").select("id").eq("id", id_estudiante))
         
         if not existing_response.data:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
         
         # Actualizar datos
-        response = supabase.table("estudiante").update({
+        response = await ejecutar(supabase.table("estudiante").update({
             "nombre": estudiante_update.nombre,
             "sexo": estudiante_update.sexo.value,
             "grado": estudiante_update.grado.value
-        }).eq("id", id_estudiante).execute()
+        }).eq("id", id_estudiante))
         
         if response.data:
             estudiante_actualizado = response.data[0]
@@ -402,13 +636,13 @@ async def eliminar_estudiante(id_estudiante: int):
     """
     try:
         # Verificar que el estudiante existe
-        existing_response = supabase.table("estudiante").select("id").eq("id", id_estudiante).execute()
+        existing_response = await ejecutar(supabase.table("estudiante").select("id").eq("id", id_estudiante))
         
         if not existing_response.data:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
         
         # Eliminar estudiante
-        response = supabase.table("estudiante").delete().eq("id", id_estudiante).execute()
+        response = await ejecutar(supabase.table("estudiante").delete().eq("id", id_estudiante))
         
         if response.data:
             return JSONResponse(content={"message": "Estudiante eliminado exitosamente"}, status_code=200)
@@ -469,7 +703,7 @@ async def health_check():
     """
     try:
         # Intentar una consulta simple para verificar la conexión
-        response = supabase.table("tema").select("count", count="exact").execute()
+        response = await ejecutar(supabase.table("tema").select("count", count="exact"))
         
         return {
             "status": "OK",
@@ -486,6 +720,131 @@ async def health_check():
             "message": "Error de conexión a Supabase"
         }
 
+@app.get("/cacheCatalogo")
+async def cache_catalogo():
+    """
+    Estadísticas del cache en memoria del catálogo (hits, misses, cargas agrupadas, desalojos)
+    """
+    return catalogo_cache.estadisticas()
+
+@app.post("/invalidarCacheCatalogo")
+async def invalidar_cache_catalogo(tabla: Optional[str] = Query(None, description="tema, personaje o investigador; vacío para invalidar todo")):
+    """
+    Invalida las entradas del cache del catálogo tras modificar las tablas en Supabase.
+    Los demás workers del host la aplican en a lo sumo CATALOGO_CACHE_SINCRONIZACION segundos
+    """
+    eliminadas = await catalogo_cache.invalidar(tabla)
+    return {"message": "Cache de catálogo invalidado", "tabla": tabla, "entradas_eliminadas": eliminadas}
+
+async def construir_query_rag(tipo: TipoPreguntaEnum, id_tipo: str, cantidad: int) -> str:
+    """
+    Construye la query de RAG ('<Área> - <Grado> - <Tema> - <N> preguntas') a partir del catálogo.
+    Lanza 404 si el tema, personaje o investigador no existe
+    """
+    # Obtener información del tipo según el enumerador
+    if tipo == TipoPreguntaEnum.TEMA:
+        # Buscar el tema en la base de datos
+        temas_data = await consultar_catalogo(("tema", "id", id_tipo), supabase.table("tema").select("nombre, descripcion, grado").eq("id", id_tipo))
+        if not temas_data:
+            raise HTTPException(status_code=404, detail="Tema no encontrado")
+        
+        tema_data = temas_data[0]
+        query_context = f"Ciencia y Tecnología - {grado_translate[tema_data['grado']]} - {tema_data['nombre']}"
+        
+    elif tipo == TipoPreguntaEnum.PERSONAJE:
+        # Buscar el personaje en la base de datos
+        personajes_data = await consultar_catalogo(("personaje", "id", id_tipo), supabase.table("personaje").select("nombre, descripcion").eq("id", id_tipo))
+        if not personajes_data:
+            raise HTTPException(status_code=404, detail="Personaje no encontrado")
+        
+        personaje_data = personajes_data[0]
+        query_context = f"Personaje - {personaje_data['nombre']} - {personaje_data['descripcion']}"
+        
+    elif tipo == TipoPreguntaEnum.INVESTIGADOR:
+        # Buscar el investigador en la base de datos
+        investigadores_data = await consultar_catalogo(("investigador", "id", id_tipo), supabase.table("investigador").select("nombres, descripcion, area").eq("id", id_tipo))
+        if not investigadores_data:
+            raise HTTPException(status_code=404, detail="Investigador no encontrado")
+        
+        investigador_data = investigadores_data[0]
+        query_context = f"Investigador - {investigador_data['nombres']} - {investigador_data['area']}"
+    
+    # Construir la query para RAG
+    return f"{query_context} - {cantidad} preguntas"
+
+def generar_preguntas_rag(rag_query: str, cantidad: int) -> List[PreguntaTemporal]:
+    """
+    Ejecuta RAG y parsea su salida. Es bloqueante (embedding, Chroma y LLM):
+    se ejecuta en los hilos de la cola de trabajos, nunca en el event loop
+    """
+    print(f"[DEBUG] Ejecutando RAG con query: {rag_query}")
+    
+    # Ejecutar RAG para generar preguntas
+    try:
+        rag_output = execute_rag_for_query(rag_query)
+        print(f"[DEBUG] RAG output recibido: {str(rag_output)[:200]}...")
+    except Exception as rag_error:
+        print(f"[ERROR] Error en execute_rag_for_query: {str(rag_error)}")
+        raise HTTPException(status_code=500, detail=f"Error ejecutando RAG: {str(rag_error)}")
+    
+    if not rag_output:
+        raise HTTPException(status_code=500, detail="RAG no devolvió ningún resultado")
+    
+    # Parsear la salida del RAG para extraer preguntas
+    try:
+        preguntas_temporales = parse_rag_output_to_questions(str(rag_output), cantidad)
+        print(f"[DEBUG] Se parsearon {len(preguntas_temporales)} preguntas")
+    except Exception as parse_error:
+        print(f"[ERROR] Error parseando RAG output: {str(parse_error)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando respuesta RAG: {str(parse_error)}")
+    
+    if not preguntas_temporales:
+        raise HTTPException(status_code=500, detail="No se pudieron extraer preguntas del resultado de RAG")
+    
+    return preguntas_temporales
+
+async def encolar_generacion(tipo: TipoPreguntaEnum, id_tipo: str, cantidad: int, fondo: bool = False, rag_query: str = None) -> Trabajo:
+    """
+    Valida la disponibilidad de RAG, resuelve la query (si no viene ya resuelta) y encola la generación
+    (en el carril de fondo si `fondo`, para no competir con las peticiones de los usuarios)
+    """
+    # Verificar que la función RAG esté disponible
+    if execute_rag_for_query is None:
+        raise HTTPException(status_code=503, detail="Servicio de generación de preguntas no disponible. Verifique que el módulo RAG esté instalado correctamente.")
+    
+    if rag_query is None:
+        rag_query = await construir_query_rag(tipo, id_tipo, cantidad)
+    
+    try:
+        return cola_trabajos.enviar(generar_preguntas_rag, rag_query, cantidad, fondo=fondo)
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def generar_para_pool(tipo: TipoPreguntaEnum, id_tipo: str, cantidad: int) -> List[PreguntaTemporal]:
+    """
+    Genera preguntas para rellenar un pool en el carril de fondo de la cola de trabajos
+    """
+    trabajo = await encolar_generacion(tipo, id_tipo, cantidad, fondo=True)
+    await cola_trabajos.esperar(trabajo)
+    
+    if trabajo.estado == ESTADO_ERROR:
+        raise HTTPException(status_code=500, detail=trabajo.error)
+    
+    return trabajo.resultado
+
+# Pools de preguntas pre-generadas por tema/personaje/investigador (POOL_PREGUNTAS=1)
+pool_preguntas = PoolPreguntas(generar_para_pool) if POOL_PREGUNTAS else None
+
+def trabajo_a_response(trabajo: Trabajo) -> TrabajoResponse:
+    return TrabajoResponse(
+        id_trabajo=trabajo.id,
+        estado=trabajo.estado,
+        creado_en=datetime.fromtimestamp(trabajo.creado_en),
+        finalizado_en=datetime.fromtimestamp(trabajo.finalizado_en) if trabajo.finalizado_en else None,
+        preguntas=trabajo.resultado,
+        error=trabajo.error
+    )
+
 @app.post("/generarNuevasPreguntas", response_model=List[PreguntaTemporal])
 async def generar_nuevas_preguntas(
     tipo: TipoPreguntaEnum,
@@ -493,75 +852,211 @@ async def generar_nuevas_preguntas(
     cantidad: int = Query(..., ge=1, le=10, description="Cantidad de preguntas a generar (máximo 10)")
 ):
     """
-    Genera nuevas preguntas temporales usando RAG (no se almacenan en base de datos)
+    Genera nuevas preguntas temporales usando RAG (no se almacenan en base de datos).
+    Si los pools están activos se sirven desde memoria; si no alcanzan, la generación corre
+    en la cola de trabajos y este endpoint espera su resultado
     """
     try:
-        # Verificar que la función RAG esté disponible
-        if execute_rag_for_query is None:
-            raise HTTPException(status_code=503, detail="Servicio de generación de preguntas no disponible. Verifique que el módulo RAG esté instalado correctamente.")
+        # Resolver la query valida id_tipo (404) antes de tocar los pools
+        rag_query = await construir_query_rag(tipo, id_tipo, cantidad)
         
-        # Obtener información del tipo según el enumerador
-        if tipo == TipoPreguntaEnum.TEMA:
-            # Buscar el tema en la base de datos
-            tema_response = supabase.table("tema").select("nombre, descripcion, grado").eq("id", id_tipo).execute()
-            if not tema_response.data:
-                raise HTTPException(status_code=404, detail="Tema no encontrado")
-            
-            tema_data = tema_response.data[0]
-            query_context = f"Ciencia y Tecnología - {grado_translate[tema_data['grado']]} - {tema_data['nombre']}"
-            
-        elif tipo == TipoPreguntaEnum.PERSONAJE:
-            # Buscar el personaje en la base de datos
-            personaje_response = supabase.table("personaje").select("nombre, descripcion").eq("id", id_tipo).execute()
-            if not personaje_response.data:
-                raise HTTPException(status_code=404, detail="Personaje no encontrado")
-            
-            personaje_data = personaje_response.data[0]
-            query_context = f"Personaje - {personaje_data['nombre']} - {personaje_data['descripcion']}"
-            
-        elif tipo == TipoPreguntaEnum.INVESTIGADOR:
-            # Buscar el investigador en la base de datos
-            investigador_response = supabase.table("investigador").select("nombres, descripcion, area").eq("id", id_tipo).execute()
-            if not investigador_response.data:
-                raise HTTPException(status_code=404, detail="Investigador no encontrado")
-            
-            investigador_data = investigador_response.data[0]
-            query_context = f"Investigador - {investigador_data['nombres']} - {investigador_data['area']}"
+        if pool_preguntas is not None:
+            preguntas = pool_preguntas.tomar(tipo, id_tipo, cantidad)
+            if preguntas is not None:
+                return preguntas
         
-        # Construir la query para RAG
-        rag_query = f"{query_context} - {cantidad} preguntas"
+        trabajo = await encolar_generacion(tipo, id_tipo, cantidad, rag_query=rag_query)
+        await cola_trabajos.esperar(trabajo)
         
-        print(f"[DEBUG] Ejecutando RAG con query: {rag_query}")
+        if trabajo.estado == ESTADO_ERROR:
+            raise HTTPException(status_code=500, detail=trabajo.error)
         
-        # Ejecutar RAG para generar preguntas
-        try:
-            rag_output = execute_rag_for_query(rag_query)
-            print(f"[DEBUG] RAG output recibido: {str(rag_output)[:200]}...")
-        except Exception as rag_error:
-            print(f"[ERROR] Error en execute_rag_for_query: {str(rag_error)}")
-            raise HTTPException(status_code=500, detail=f"Error ejecutando RAG: {str(rag_error)}")
+        return trabajo.resultado
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+def evento_sse(evento: str, data: str) -> str:
+    return f"event: {evento}\ndata: {data}\n\n"
+
+def generar_eventos_preguntas(rag_query: str, cantidad: int):
+    """
+    Generador de eventos SSE: emite cada pregunta apenas el LLM cierra su objeto JSON.
+    Es síncrono porque el streaming del LLM es bloqueante; se recorre en la cola de trabajos (enviar_stream).
+    Al tener las preguntas pedidas se cierra el stream del LLM, que guarda en el cache lo generado
+    """
+    enviadas = 0
+    stream = execute_rag_stream(rag_query)
+    try:
+        parser = ParserArregloJSON()
+        for fragmento in stream:
+            for pregunta_json in parser.agregar(fragmento):
+                yield evento_sse("pregunta", pregunta_desde_json(pregunta_json, enviadas).model_dump_json())
+                enviadas += 1
+                if enviadas >= cantidad:
+                    break
+            if enviadas >= cantidad:
+                break
+        # Cortar el LLM (y guardar en el cache lo generado) antes de avisar el fin
+        stream.close()
         
-        if not rag_output:
-            raise HTTPException(status_code=500, detail="RAG no devolvió ningún resultado")
+        # Si la salida no era un arreglo JSON, usar el parseo completo (patrones de texto) al final
+        if enviadas == 0:
+            for pregunta in parse_rag_output_to_questions(parser.texto_completo(), cantidad):
+                yield evento_sse("pregunta", pregunta.model_dump_json())
+                enviadas += 1
         
-        # Parsear la salida del RAG para extraer preguntas
-        try:
-            preguntas_temporales = parse_rag_output_to_questions(str(rag_output), cantidad)
-            print(f"[DEBUG] Se parsearon {len(preguntas_temporales)} preguntas")
-        except Exception as parse_error:
-            print(f"[ERROR] Error parseando RAG output: {str(parse_error)}")
-            raise HTTPException(status_code=500, detail=f"Error procesando respuesta RAG: {str(parse_error)}")
+        yield evento_sse("fin", json.dumps({"total": enviadas}))
+    
+    except Exception as e:
+        print(f"[ERROR] Error en el streaming de preguntas: {str(e)}")
+        yield evento_sse("error", json.dumps({"detail": f"Error ejecutando RAG: {str(e)}", "total": enviadas}))
+    
+    finally:
+        stream.close()
+
+@app.post("/generarNuevasPreguntasStream")
+async def generar_nuevas_preguntas_stream(
+    tipo: TipoPreguntaEnum,
+    id_tipo: str,
+    cantidad: int = Query(..., ge=1, le=10, description="Cantidad de preguntas a generar (máximo 10)")
+):
+    """
+    Igual que /generarNuevasPreguntas pero en Server-Sent Events: un evento `pregunta` por cada pregunta
+    en cuanto se completa, y un evento final `fin` (o `error`)
+    """
+    try:
+        if execute_rag_stream is None:
+            raise HTTPException(status_code=503, detail="Servicio de generación de preguntas no disponible. Verifique que el módulo RAG esté instalado correctamente.")
         
-        if not preguntas_temporales:
-            raise HTTPException(status_code=500, detail="No se pudieron extraer preguntas del resultado de RAG")
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
         
-        return preguntas_temporales
+        # Resolver la query valida id_tipo (404) antes de tocar los pools
+        rag_query = await construir_query_rag(tipo, id_tipo, cantidad)
+        
+        # Si hay preguntas pre-generadas se envían de inmediato
+        if pool_preguntas is not None:
+            preguntas = pool_preguntas.tomar(tipo, id_tipo, cantidad)
+            if preguntas is not None:
+                eventos = [evento_sse("pregunta", pregunta.model_dump_json()) for pregunta in preguntas]
+                eventos.append(evento_sse("fin", json.dumps({"total": len(preguntas)})))
+                return StreamingResponse(iter(eventos), media_type="text/event-stream", headers=headers)
+        
+        # El stream ocupa un lugar de la cola de trabajos mientras dura (503 si está llena)
+        try:
+            _, eventos = cola_trabajos.enviar_stream(generar_eventos_preguntas, rag_query, cantidad)
+        except ColaLlenaError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return StreamingResponse(eventos, media_type="text/event-stream", headers=headers)
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+@app.post("/trabajos/generarNuevasPreguntas", response_model=TrabajoCreadoResponse, status_code=202)
+async def crear_trabajo_generacion(
+    tipo: TipoPreguntaEnum,
+    id_tipo: str,
+    cantidad: int = Query(..., ge=1, le=10, description="Cantidad de preguntas a generar (máximo 10)")
+):
+    """
+    Encola la generación de preguntas con RAG y devuelve inmediatamente el id del trabajo
+    """
+    try:
+        trabajo = await encolar_generacion(tipo, id_tipo, cantidad)
+        return TrabajoCreadoResponse(id_trabajo=trabajo.id, estado=trabajo.estado)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+@app.get("/trabajos/{id_trabajo}", response_model=TrabajoResponse)
+async def obtener_trabajo(
+    id_trabajo: str,
+    esperar: float = Query(0, ge=0, le=30, description="Segundos a esperar si el trabajo aún no termina (long polling)")
+):
+    """
+    Consulta el estado de un trabajo de generación y, si terminó, sus preguntas
+    """
+    trabajo = await cola_trabajos.obtener(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    
+    if esperar and not trabajo.finalizado:
+        await cola_trabajos.esperar(trabajo, timeout=esperar)
+    
+    return trabajo_a_response(trabajo)
+
+@app.post("/recargarColecciones")
+async def recargar_colecciones_chroma(precalentar: bool = Query(False, description="Cargar además el índice de cada colección en memoria")):
+    """
+    Vuelve a listar las colecciones de Chroma (por ejemplo, después de ejecutar process_data.py)
+    """
+    if recargar_colecciones is None:
+        raise HTTPException(status_code=503, detail="Servicio de generación de preguntas no disponible. Verifique que el módulo RAG esté instalado correctamente.")
+    
+    try:
+        colecciones = await asyncio.to_thread(recargar_colecciones)
+        if precalentar:
+            await asyncio.to_thread(precalentar_colecciones)
+        return {"message": "Colecciones recargadas", "colecciones": colecciones}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+@app.get("/metricasRag")
+async def metricas_rag():
+    """
+    Métricas de los caches de RAG: embeddings de queries (hit rate, tiempo ahorrado) y resultados
+    """
+    if estadisticas_rag is None:
+        raise HTTPException(status_code=503, detail="Servicio de generación de preguntas no disponible. Verifique que el módulo RAG esté instalado correctamente.")
+    return estadisticas_rag()
+
+@app.get("/poolPreguntas")
+async def estadisticas_pool_preguntas():
+    """
+    Estado de los pools de preguntas pre-generadas (tamaño por clave, servidas, faltantes, descartadas)
+    """
+    if pool_preguntas is None:
+        return {"pool_preguntas": False}
+    return {"pool_preguntas": True, **pool_preguntas.estadisticas()}
+
+@app.get("/trabajos")
+async def estadisticas_trabajos():
+    """
+    Estado de la cola de trabajos (profundidad, concurrencia, completados, fallidos, rechazados)
+    """
+    return await cola_trabajos.estadisticas()
+
+def pregunta_desde_json(pregunta_json: dict, i: int) -> PreguntaTemporal:
+    """
+    Convierte un objeto JSON devuelto por el LLM en PreguntaTemporal, completando los campos faltantes
+    """
+    pregunta_texto = pregunta_json.get('pregunta', f'Pregunta {i+1}')
+    alt_a = pregunta_json.get('alternativa_A', 'Opción A')
+    alt_b = pregunta_json.get('alternativa_B', 'Opción B')
+    alt_c = pregunta_json.get('alternativa_C', 'Opción C')
+    alt_d = pregunta_json.get('alternativa_D', 'Opción D')
+    alternativa_correcta = pregunta_json.get('alternativa_correcta', 1)
+    
+    # Validar alternativa_correcta
+    if not isinstance(alternativa_correcta, int) or alternativa_correcta < 1 or alternativa_correcta > 4:
+        alternativa_correcta = 1
+    
+    return PreguntaTemporal(
+        pregunta=pregunta_texto,
+        alternativa_a=alt_a,
+        alternativa_b=alt_b,
+        alternativa_c=alt_c,
+        alternativa_d=alt_d,
+        alternativa_correcta=alternativa_correcta
+    )
+
 def parse_rag_output_to_questions(rag_output: str, cantidad: int) -> List[PreguntaTemporal]:
     """
     Parsea la salida del RAG para extraer preguntas en formato PreguntaTemporal
@@ -587,27 +1082,7 @@ def parse_rag_output_to_questions(rag_output: str, cantidad: int) -> List[Pregun
                     if i >= cantidad:
                         break
                         
-                    pregunta_texto = pregunta_json.get('pregunta', f'Pregunta {i+1}')
-                    alt_a = pregunta_json.get('alternativa_A', 'Opción A')
-                    alt_b = pregunta_json.get('alternativa_B', 'Opción B')
-                    alt_c = pregunta_json.get('alternativa_C', 'Opción C')
-                    alt_d = pregunta_json.get('alternativa_D', 'Opción D')
-                    alternativa_correcta = pregunta_json.get('alternativa_correcta', 1)
-                    
-                    # Validar alternativa_correcta
-                    if not isinstance(alternativa_correcta, int) or alternativa_correcta < 1 or alternativa_correcta > 4:
-                        alternativa_correcta = 1
-                    
-                    pregunta_temporal = PreguntaTemporal(
-                        pregunta=pregunta_texto,
-                        alternativa_a=alt_a,
-                        alternativa_b=alt_b,
-                        alternativa_c=alt_c,
-                        alternativa_d=alt_d,
-                        alternativa_correcta=alternativa_correcta
-                    )
-                    
-                    preguntas.append(pregunta_temporal)
+                    preguntas.append(pregunta_desde_json(pregunta_json, i))
                 
                 if preguntas:
                     print(f"[DEBUG] Extraídas {len(preguntas)} preguntas del JSON")
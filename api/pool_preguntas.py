@@ -0,0 +1,130 @@
+# pool_preguntas.py
+import os
+import re
+import asyncio
+from collections import deque
+
+# === CONFIGURACIÓN ===
+POOL_PREGUNTAS = os.getenv("POOL_PREGUNTAS", "0") == "1"
+POOL_PREGUNTAS_CAPACIDAD = int(os.getenv("POOL_PREGUNTAS_CAPACIDAD", "30"))  # preguntas por tema/personaje/investigador
+POOL_PREGUNTAS_MINIMO = int(os.getenv("POOL_PREGUNTAS_MINIMO", "10"))  # nivel bajo el cual se rellena
+POOL_PREGUNTAS_LOTE = int(os.getenv("POOL_PREGUNTAS_LOTE", "10"))  # preguntas pedidas al LLM por relleno
+POOL_PREGUNTAS_CONCURRENCIA = int(os.getenv("POOL_PREGUNTAS_CONCURRENCIA", "1"))  # generaciones de relleno a la vez
+POOL_PREGUNTAS_PRECALENTAR = os.getenv("POOL_PREGUNTAS_PRECALENTAR", "0") == "1"
+
+# Preguntas de relleno que genera parse_rag_output_to_questions cuando no logra parsear la salida
+PATRON_PREGUNTA_RELLENO = re.compile(r'^Pregunta (temporal )?\d+( sobre el tema solicitado)?$')
+ALTERNATIVAS_RELLENO = {"Opción A", "Opción B", "Opción C", "Opción D"}
+
+def es_pregunta_valida(pregunta) -> bool:
+    """Descarta preguntas de relleno, alternativas vacías o repetidas y respuestas fuera de rango"""
+    if not pregunta.pregunta or PATRON_PREGUNTA_RELLENO.match(pregunta.pregunta.strip()):
+        return False
+    alternativas = [pregunta.alternativa_a, pregunta.alternativa_b, pregunta.alternativa_c, pregunta.alternativa_d]
+    if any(not alternativa or not alternativa.strip() or alternativa in ALTERNATIVAS_RELLENO for alternativa in alternativas):
+        return False
+    if len({alternativa.strip().lower() for alternativa in alternativas}) < 4:
+        return False
+    return 1 <= pregunta.alternativa_correcta <= 4
+
+class PoolPreguntas:
+    """
+    Reservorio de preguntas ya generadas y validadas por (tipo, id_tipo).
+
+    `tomar` sirve preguntas desde memoria sin llamar al LLM; cada pregunta se entrega una sola vez.
+    Cuando un pool baja de `minimo` se lanza en segundo plano un relleno (uno a la vez por clave)
+    que llama a `generar(tipo, id_tipo, cantidad)`, una corrutina que devuelve PreguntaTemporal.
+    A lo sumo `concurrencia` rellenos generan a la vez; el resto espera su turno aquí, fuera de la
+    cola de trabajos.
+    """
+
+    def __init__(self, generar, capacidad: int = POOL_PREGUNTAS_CAPACIDAD, minimo: int = POOL_PREGUNTAS_MINIMO, lote: int = POOL_PREGUNTAS_LOTE,
+                 concurrencia: int = POOL_PREGUNTAS_CONCURRENCIA):
+        self.generar = generar
+        self.capacidad = capacidad
+        self.minimo = minimo
+        self.lote = lote
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self._pools = {}
+        self._rellenos = {}
+        self.servidas = 0
+        self.faltantes = 0
+        self.generadas = 0
+        self.descartadas = 0
+        self.rellenos_fallidos = 0
+
+    def tomar(self, tipo, id_tipo: str, cantidad: int):
+        """
+        Devuelve `cantidad` preguntas del pool o None si no alcanzan. Siempre agenda un relleno si hace falta.
+        `id_tipo` debe estar validado contra el catálogo: cada clave nueva crea un pool
+        """
+        clave = (tipo, id_tipo)
+        pool = self._pools.get(clave, ())
+
+        preguntas = None
+        if len(pool) >= cantidad:
+            preguntas = [pool.popleft() for _ in range(cantidad)]
+            self.servidas += cantidad
+        else:
+            self.faltantes += 1
+
+        if len(pool) < self.minimo:
+            self.rellenar(tipo, id_tipo)
+        return preguntas
+
+    def rellenar(self, tipo, id_tipo: str):
+        """Agenda el relleno en segundo plano si no hay uno en curso para la clave"""
+        clave = (tipo, id_tipo)
+        if clave in self._rellenos:
+            return self._rellenos[clave]
+        tarea = asyncio.create_task(self._rellenar(clave))
+        self._rellenos[clave] = tarea
+        tarea.add_done_callback(lambda _: self._rellenos.pop(clave, None))
+        return tarea
+
+    async def _rellenar(self, clave):
+        tipo, id_tipo = clave
+        pool = self._pools.setdefault(clave, deque())
+        while len(pool) < self.capacidad:
+            try:
+                async with self._semaforo:
+                    nuevas = await self.generar(tipo, id_tipo, min(self.lote, self.capacidad - len(pool)))
+            except Exception as e:
+                self.rellenos_fallidos += 1
+                print(f"[WARNING] No se pudo rellenar el pool de {tipo} {id_tipo}: {str(getattr(e, 'detail', e))}")
+                return
+
+            existentes = {pregunta.pregunta.strip().lower() for pregunta in pool}
+            agregadas = 0
+            for pregunta in nuevas:
+                enunciado = pregunta.pregunta.strip().lower() if pregunta.pregunta else ""
+                if es_pregunta_valida(pregunta) and enunciado not in existentes and len(pool) < self.capacidad:
+                    pool.append(pregunta)
+                    existentes.add(enunciado)
+                    agregadas += 1
+                else:
+                    self.descartadas += 1
+            self.generadas += agregadas
+
+            # Si el LLM no aportó nada nuevo no tiene sentido seguir insistiendo ahora
+            if agregadas == 0:
+                return
+
+    async def detener(self):
+        tareas = list(self._rellenos.values())
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    def estadisticas(self):
+        return {
+            "capacidad": self.capacidad,
+            "minimo": self.minimo,
+            "pools": {f"{getattr(tipo, 'value', tipo)}:{id_tipo}": len(pool) for (tipo, id_tipo), pool in self._pools.items()},
+            "rellenos_en_curso": len(self._rellenos),
+            "servidas": self.servidas,
+            "faltantes": self.faltantes,
+            "generadas": self.generadas,
+            "descartadas": self.descartadas,
+            "rellenos_fallidos": self.rellenos_fallidos,
+        }
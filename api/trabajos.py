@@ -0,0 +1,382 @@
+# trabajos.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# === CONFIGURACIÓN ===
+TRABAJOS_CONCURRENCIA = int(os.getenv("TRABAJOS_CONCURRENCIA", "2"))  # generaciones RAG en paralelo
+TRABAJOS_MAX_PENDIENTES = int(os.getenv("TRABAJOS_MAX_PENDIENTES", "50"))  # profundidad máxima de la cola
+TRABAJOS_MAX_FONDO = int(os.getenv("TRABAJOS_MAX_FONDO", "1"))  # trabajos de fondo (rellenos de pools) en cola o en ejecución
+TRABAJOS_RETENCION = float(os.getenv("TRABAJOS_RETENCION", "600"))  # segundos que se guarda un resultado
+# Registro SQLite compartido por los workers de gunicorn: cualquier worker responde GET /trabajos/{id}
+TRABAJOS_REGISTRO = os.getenv("TRABAJOS_REGISTRO", "1") == "1"
+TRABAJOS_REGISTRO_RUTA = os.getenv("TRABAJOS_REGISTRO_RUTA", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "trabajos.sqlite3"))
+TRABAJOS_REGISTRO_SONDEO = 0.25  # segundos entre lecturas al esperar un trabajo de otro worker
+TRABAJOS_REGISTRO_PURGA = 60.0  # segundos entre borrados de los trabajos expirados del registro
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+# Los trabajadores toman primero los de los usuarios; los de fondo solo cuando no hay otros esperando
+PRIORIDAD_USUARIO = 0
+PRIORIDAD_FONDO = 1
+
+class ColaLlenaError(Exception):
+    """Se alcanzó la profundidad máxima de la cola de trabajos"""
+
+class Trabajo:
+    def __init__(self, funcion, args, fondo: bool = False):
+        self.id = uuid.uuid4().hex
+        self.funcion = funcion
+        self.args = args
+        self.fondo = fondo
+        self.estado = PENDIENTE
+        self.resultado = None
+        self.error = None
+        self.creado_en = time.time()
+        self.iniciado_en = None
+        self.finalizado_en = None
+        self.terminado = asyncio.Event()
+
+    @property
+    def finalizado(self):
+        return self.estado in (COMPLETADO, ERROR)
+
+    @classmethod
+    def desde_registro(cls, id_trabajo, estado, resultado, error, creado_en, finalizado_en):
+        """Copia de solo lectura de un trabajo que ejecuta otro worker"""
+        trabajo = cls(None, None)
+        trabajo.id = id_trabajo
+        trabajo.estado = estado
+        trabajo.resultado = json.loads(resultado) if resultado is not None else None
+        trabajo.error = error
+        trabajo.creado_en = creado_en
+        trabajo.finalizado_en = finalizado_en
+        return trabajo
+
+def serializar_resultado(valor):
+    """Los resultados son listas de modelos pydantic (PreguntaTemporal)"""
+    return valor.model_dump() if hasattr(valor, "model_dump") else str(valor)
+
+class RegistroTrabajos:
+    """
+    Estado de los trabajos en un archivo SQLite compartido por todos los workers del host.
+
+    Cada worker ejecuta sus propios trabajos y escribe aquí su estado (al encolar, al empezar y al
+    terminar, con el resultado en JSON); así un GET /trabajos/{id} que llega a otro worker lo encuentra.
+
+    Los métodos son bloqueantes (SQLite, con hasta 5 s de espera por el lock del archivo): ColaTrabajos
+    los ejecuta en un hilo propio, nunca en el event loop.
+    """
+
+    def __init__(self, ruta: str = TRABAJOS_REGISTRO_RUTA, retencion: float = TRABAJOS_RETENCION):
+        self.ruta = ruta
+        self.retencion = retencion
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=5.0, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                estado TEXT NOT NULL,
+                resultado TEXT,
+                error TEXT,
+                creado_en REAL NOT NULL,
+                finalizado_en REAL
+            )
+        """)
+        self._conexion.commit()
+
+    @staticmethod
+    def fila(trabajo: Trabajo) -> tuple:
+        """Copia del estado del trabajo para `guardar` (el trabajo sigue cambiando en el event loop)"""
+        return (trabajo.id, trabajo.estado, trabajo.resultado, trabajo.error, trabajo.creado_en, trabajo.finalizado_en)
+
+    def guardar(self, fila: tuple):
+        id_trabajo, estado, resultado, error, creado_en, finalizado_en = fila
+        resultado = json.dumps(resultado, ensure_ascii=False, default=serializar_resultado) if resultado is not None else None
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO trabajos (id, estado, resultado, error, creado_en, finalizado_en) VALUES (?, ?, ?, ?, ?, ?)",
+                (id_trabajo, estado, resultado, error, creado_en, finalizado_en)
+            )
+            self._conexion.commit()
+
+    def purgar(self):
+        """Borra los trabajos finalizados cuyo tiempo de retención expiró"""
+        with self._lock:
+            self._conexion.execute("DELETE FROM trabajos WHERE finalizado_en < ?", (time.time() - self.retencion,))
+            self._conexion.commit()
+
+    def obtener(self, id_trabajo: str):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT id, estado, resultado, error, creado_en, finalizado_en FROM trabajos WHERE id = ? AND (finalizado_en IS NULL OR finalizado_en >= ?)",
+                (id_trabajo, time.time() - self.retencion)
+            ).fetchone()
+        return Trabajo.desde_registro(*fila) if fila is not None else None
+
+    def contar_estados(self):
+        with self._lock:
+            return dict(self._conexion.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+
+class ColaTrabajos:
+    """
+    Cola de trabajos en proceso para tareas lentas y bloqueantes (generación de preguntas con RAG).
+
+    Los trabajos se encolan (hasta `max_pendientes`) y un grupo de `concurrencia` trabajadores los
+    ejecuta en un pool de hilos dedicado, de modo que los workers HTTP quedan libres para el resto
+    de endpoints. Los resultados se conservan `retencion` segundos después de finalizar.
+
+    Los trabajos de fondo (`enviar(..., fondo=True)`, p. ej. rellenos de pools) van por un carril aparte:
+    se ejecutan solo cuando no hay trabajos de usuarios esperando, a lo sumo `max_fondo` a la vez
+    (en cola o en ejecución), no cuentan para `max_pendientes` y se rechazan en cuanto la cola de
+    usuarios pasa de la mitad, antes de que un usuario reciba un 503.
+
+    La ejecución es por worker; con `registro` (RegistroTrabajos) el estado se publica para que
+    `obtener` y `esperar` funcionen también con trabajos encolados en otro worker. Las escrituras y
+    lecturas del registro van a un hilo dedicado (en orden, sin bloquear el event loop); las de
+    estado no se esperan y los trabajos expirados se borran del registro cada TRABAJOS_REGISTRO_PURGA s.
+    """
+
+    def __init__(self, concurrencia: int = TRABAJOS_CONCURRENCIA, max_pendientes: int = TRABAJOS_MAX_PENDIENTES, retencion: float = TRABAJOS_RETENCION,
+                 registro: RegistroTrabajos = None, max_fondo: int = TRABAJOS_MAX_FONDO):
+        self.concurrencia = concurrencia
+        self.max_pendientes = max_pendientes
+        self.retencion = retencion
+        self.registro = registro
+        self.max_fondo = max_fondo
+        self._trabajos = {}
+        self._cola = None
+        self._secuencia = 0
+        self._pendientes_usuario = 0
+        self._fondo_activos = 0
+        self._trabajadores = []
+        self._executor = None
+        self._executor_registro = None
+        self._purgado_en = 0.0
+        self.completados = 0
+        self.fallidos = 0
+        self.rechazados = 0
+        self.rechazados_fondo = 0
+
+    def iniciar(self):
+        if self._trabajadores:
+            return
+        # Sin maxsize: los límites por carril se controlan en `enviar`
+        self._cola = asyncio.PriorityQueue()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrencia, thread_name_prefix="trabajo-rag")
+        self._trabajadores = [asyncio.create_task(self._trabajador()) for _ in range(self.concurrencia)]
+        if self.registro is not None:
+            self._executor_registro = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registro-trabajos")
+
+    async def detener(self):
+        for tarea in self._trabajadores:
+            tarea.cancel()
+        await asyncio.gather(*self._trabajadores, return_exceptions=True)
+        self._trabajadores = []
+        # Los trabajos que quedaron sin ejecutar no terminarán nunca: que los demás workers no los esperen
+        for trabajo in self._trabajos.values():
+            if not trabajo.finalizado:
+                trabajo.estado = ERROR
+                trabajo.error = "El servidor se detuvo antes de completar el trabajo"
+                trabajo.finalizado_en = time.time()
+                self._publicar(trabajo)
+                trabajo.terminado.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._executor_registro is not None:
+            # Esperar (fuera del loop) a que se escriban los estados pendientes, incluidos los errores de arriba
+            await asyncio.to_thread(self._executor_registro.shutdown)
+            self._executor_registro = None
+
+    def enviar(self, funcion, *args, fondo: bool = False) -> Trabajo:
+        """Encola `funcion(*args)` y devuelve el trabajo. Lanza ColaLlenaError si la cola (o el carril de fondo) está llena"""
+        if self._cola is None:
+            raise RuntimeError("La cola de trabajos no fue iniciada")
+        self._purgar()
+
+        if fondo:
+            if self._fondo_activos >= self.max_fondo or self._pendientes_usuario >= self.max_pendientes // 2:
+                self.rechazados_fondo += 1
+                raise ColaLlenaError("La cola de trabajos está ocupada; el trabajo de fondo se reintentará más tarde")
+            self._fondo_activos += 1
+        else:
+            if self._pendientes_usuario >= self.max_pendientes:
+                self.rechazados += 1
+                raise ColaLlenaError(f"Hay {self.max_pendientes} trabajos pendientes; intente nuevamente más tarde")
+            self._pendientes_usuario += 1
+
+        trabajo = Trabajo(funcion, args, fondo=fondo)
+        self._secuencia += 1
+        self._cola.put_nowait((PRIORIDAD_FONDO if fondo else PRIORIDAD_USUARIO, self._secuencia, trabajo))
+        self._trabajos[trabajo.id] = trabajo
+        self._publicar(trabajo)
+        return trabajo
+
+    def enviar_stream(self, funcion, *args):
+        """
+        Como `enviar`, para una función generadora bloqueante (p. ej. el stream del LLM): el recorrido
+        ocupa un lugar de la cola y de la concurrencia mientras dura. Devuelve (trabajo, iterador
+        asíncrono de los elementos). Si el consumidor deja de iterar (cliente desconectado) el
+        generador se cierra al producir el siguiente elemento. Lanza ColaLlenaError como `enviar`
+        """
+        loop = asyncio.get_running_loop()
+        elementos = asyncio.Queue()
+        detenido = threading.Event()
+        fin = object()
+
+        def recorrer():
+            if detenido.is_set():
+                return
+            generador = funcion(*args)
+            try:
+                for elemento in generador:
+                    if detenido.is_set():
+                        break
+                    loop.call_soon_threadsafe(elementos.put_nowait, elemento)
+            finally:
+                generador.close()
+                loop.call_soon_threadsafe(elementos.put_nowait, fin)
+
+        trabajo = self.enviar(recorrer)
+
+        async def iterar():
+            try:
+                while (elemento := await elementos.get()) is not fin:
+                    yield elemento
+            finally:
+                detenido.set()
+
+        return trabajo, iterar()
+
+    async def _en_registro(self, metodo, *args):
+        """Ejecuta un método del registro en su hilo dedicado"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor_registro, metodo, *args)
+
+    async def obtener(self, id_trabajo: str):
+        """El trabajo local o, si lo encoló otro worker, su copia en el registro compartido"""
+        self._purgar()
+        trabajo = self._trabajos.get(id_trabajo)
+        if trabajo is None and self.registro is not None:
+            try:
+                trabajo = await self._en_registro(self.registro.obtener, id_trabajo)
+            except Exception as e:
+                print(f"[WARNING] No se pudo leer el registro de trabajos: {e}")
+        return trabajo
+
+    async def esperar(self, trabajo: Trabajo, timeout: float = None) -> Trabajo:
+        """Espera a que el trabajo finalice (o a que pase `timeout`) y lo devuelve"""
+        if trabajo.id not in self._trabajos and self.registro is not None:
+            return await self._esperar_registro(trabajo, timeout)
+        try:
+            await asyncio.wait_for(trabajo.terminado.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return trabajo
+
+    async def _esperar_registro(self, trabajo: Trabajo, timeout: float = None) -> Trabajo:
+        """Long polling de un trabajo de otro worker: se relee el registro hasta que finalice"""
+        limite = time.monotonic() + timeout if timeout is not None else None
+        while not trabajo.finalizado and (limite is None or time.monotonic() < limite):
+            await asyncio.sleep(TRABAJOS_REGISTRO_SONDEO)
+            actual = await self.obtener(trabajo.id)
+            if actual is None:
+                break
+            trabajo = actual
+        return trabajo
+
+    def _publicar(self, trabajo: Trabajo):
+        """
+        Agenda la escritura del estado del trabajo en el registro compartido, sin esperarla.
+        Un fallo no afecta la ejecución
+        """
+        if self.registro is None or self._executor_registro is None:
+            return
+        self._executor_registro.submit(self._guardar_registro, RegistroTrabajos.fila(trabajo))
+        if time.monotonic() - self._purgado_en >= TRABAJOS_REGISTRO_PURGA:
+            self._purgado_en = time.monotonic()
+            self._executor_registro.submit(self._purgar_registro)
+
+    def _guardar_registro(self, fila: tuple):
+        try:
+            self.registro.guardar(fila)
+        except Exception as e:
+            print(f"[WARNING] No se pudo actualizar el registro de trabajos ({fila[0]}): {e}")
+
+    def _purgar_registro(self):
+        try:
+            self.registro.purgar()
+        except Exception as e:
+            print(f"[WARNING] No se pudieron borrar los trabajos expirados del registro: {e}")
+
+    async def _trabajador(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, trabajo = await self._cola.get()
+            if not trabajo.fondo:
+                self._pendientes_usuario -= 1
+            trabajo.estado = EN_PROCESO
+            trabajo.iniciado_en = time.time()
+            self._publicar(trabajo)
+            try:
+                trabajo.resultado = await loop.run_in_executor(self._executor, trabajo.funcion, *trabajo.args)
+                trabajo.estado = COMPLETADO
+                self.completados += 1
+            except Exception as e:
+                # HTTPException trae el mensaje en `detail`
+                trabajo.error = str(getattr(e, "detail", e))
+                trabajo.estado = ERROR
+                self.fallidos += 1
+            finally:
+                trabajo.finalizado_en = time.time()
+                trabajo.funcion = None
+                trabajo.args = None
+                self._publicar(trabajo)
+                trabajo.terminado.set()
+                if trabajo.fondo:
+                    self._fondo_activos -= 1
+                self._cola.task_done()
+
+    def _purgar(self):
+        """Elimina los trabajos finalizados cuyo tiempo de retención expiró"""
+        limite = time.time() - self.retencion
+        expirados = [id_trabajo for id_trabajo, trabajo in self._trabajos.items()
+                     if trabajo.finalizado and trabajo.finalizado_en < limite]
+        for id_trabajo in expirados:
+            del self._trabajos[id_trabajo]
+
+    async def estadisticas(self):
+        estados = {PENDIENTE: 0, EN_PROCESO: 0, COMPLETADO: 0, ERROR: 0}
+        for trabajo in self._trabajos.values():
+            estados[trabajo.estado] += 1
+        estadisticas = {
+            "concurrencia": self.concurrencia,
+            "max_pendientes": self.max_pendientes,
+            "retencion_segundos": self.retencion,
+            "en_cola": self._pendientes_usuario,
+            "max_fondo": self.max_fondo,
+            "fondo_activos": self._fondo_activos,
+            "estados": estados,
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+            "rechazados": self.rechazados,
+            "rechazados_fondo": self.rechazados_fondo,
+        }
+        if self.registro is not None:
+            # Trabajos de todos los workers del host (los contadores de arriba son de este worker)
+            try:
+                estadisticas["estados_compartidos"] = {**{estado: 0 for estado in estados}, **await self._en_registro(self.registro.contar_estados)}
+            except Exception as e:
+                print(f"[WARNING] No se pudo leer el registro de trabajos: {e}")
+        return estadisticas
+
+cola_trabajos = ColaTrabajos(registro=RegistroTrabajos() if TRABAJOS_REGISTRO else None)
@@ -1,7 +1,30 @@
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 url: str = os.environ['SUPABASE_URL']
 key: str = os.environ['SUPABASE_API_KEY']
-supabase: Client = create_client(url, key)
\ No newline at end of file
+supabase: Client = create_client(url, key)
+
+# === ACCESO NO BLOQUEANTE ===
+# El cliente de Supabase es síncrono: cada `.execute()` bloquea durante todo el viaje HTTP.
+# Las consultas se ejecutan en un pool de hilos acotado para no bloquear el event loop de uvicorn.
+# Todas comparten la misma sesión httpx del cliente PostgREST, que mantiene un pool de
+# conexiones keep-alive hacia Supabase, por lo que no se abre una conexión nueva por consulta.
+SUPABASE_MAX_CONEXIONES = int(os.getenv("SUPABASE_MAX_CONEXIONES", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_CONEXIONES, thread_name_prefix="supabase")
+
+async def ejecutar(query):
+    """
+    Ejecuta una consulta de Supabase (request builder) sin bloquear el event loop.
+    Uso: `response = await ejecutar(supabase.table("tema").select("*").eq("id", 1))`
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, query.execute)
+
+def cerrar_executor():
+    """Espera a que terminen las consultas en curso y libera los hilos del pool"""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,52 @@
+# benchmark_concurrencia.py
+# Compara el acceso bloqueante (`.execute()` directo en el event loop) contra la capa
+# no bloqueante `ejecutar()` a distintos niveles de concurrencia.
+# Uso: python -m bd.benchmark_concurrencia [total_consultas]
+import sys
+import time
+import asyncio
+
+from bd.bd_supabase import supabase, ejecutar, SUPABASE_MAX_CONEXIONES
+
+NIVELES_CONCURRENCIA = [1, 5, 10, 20, 50]
+
+def construir_consulta():
+    """Consulta representativa del catálogo (la misma que usa /getTodosTemas)"""
+    return supabase.table("tema").select("nombre, descripcion, imagen").eq("grado", "1er")
+
+async def consulta_bloqueante():
+    # Así se comportaban los handlers antes: bloquea el event loop durante el viaje HTTP
+    return construir_consulta().execute()
+
+async def consulta_no_bloqueante():
+    return await ejecutar(construir_consulta())
+
+async def medir(consulta, total, concurrencia):
+    """Ejecuta `total` consultas con a lo sumo `concurrencia` en vuelo y devuelve (segundos, consultas/s)"""
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with semaforo:
+            await consulta()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(total)))
+    duracion = time.perf_counter() - inicio
+    return duracion, total / duracion
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    # Calentar la conexión keep-alive para no medir el handshake TLS inicial
+    await ejecutar(construir_consulta())
+
+    print(f"Consultas por nivel: {total} | Hilos del pool: {SUPABASE_MAX_CONEXIONES}")
+    print(f"{'concurrencia':>12} | {'bloqueante (q/s)':>17} | {'no bloqueante (q/s)':>20} | {'speedup':>7}")
+    print("-" * 66)
+    for concurrencia in NIVELES_CONCURRENCIA:
+        _, qps_bloqueante = await medir(consulta_bloqueante, total, concurrencia)
+        _, qps_no_bloqueante = await medir(consulta_no_bloqueante, total, concurrencia)
+        print(f"{concurrencia:>12} | {qps_bloqueante:>17.1f} | {qps_no_bloqueante:>20.1f} | {qps_no_bloqueante / qps_bloqueante:>6.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
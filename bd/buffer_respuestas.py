@@ -0,0 +1,228 @@
+# buffer_respuestas.py
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+
+# === CONFIGURACIÓN ===
+RESPUESTAS_WRITE_BEHIND = os.getenv("RESPUESTAS_WRITE_BEHIND", "0") == "1"
+RESPUESTAS_BUFFER_MAX_FILAS = int(os.getenv("RESPUESTAS_BUFFER_MAX_FILAS", "200"))
+RESPUESTAS_BUFFER_MAX_ESPERA = float(os.getenv("RESPUESTAS_BUFFER_MAX_ESPERA", "1.0"))  # segundos
+RESPUESTAS_BUFFER_REINTENTOS_CIERRE = int(os.getenv("RESPUESTAS_BUFFER_REINTENTOS_CIERRE", "3"))
+RESPUESTAS_BUFFER_MAX_PENDIENTES = int(os.getenv("RESPUESTAS_BUFFER_MAX_PENDIENTES", "5000"))  # por encima: 503
+RESPUESTAS_BUFFER_MAX_INTENTOS = int(os.getenv("RESPUESTAS_BUFFER_MAX_INTENTOS", "3"))  # por fila, antes del dead-letter
+RESPUESTAS_DEAD_LETTER = os.getenv("RESPUESTAS_DEAD_LETTER", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "respuestas_fallidas.jsonl"))
+RESPUESTAS_BUFFER_MAX_BACKOFF = 30.0  # segundos entre flushes mientras Supabase rechaza todo
+
+class BufferLlenoError(Exception):
+    """El buffer alcanzó `max_pendientes` y Supabase no pudo vaciarlo a tiempo"""
+
+def es_error_de_filas(e: Exception) -> bool:
+    """
+    True si Supabase rechazó el contenido del lote (datos inválidos, restricción violada, otro 4xx).
+    False para caídas: errores de conexión, timeouts, 5xx, 408/429 o errores sin código reconocible
+    """
+    codigo = str(getattr(e, "code", "") or "")
+    if codigo[:2] in ("22", "23"):  # SQLSTATE de Postgres: datos inválidos / restricción de integridad
+        return True
+    if codigo.startswith("PGRST"):  # PGRST0xx son errores de conexión de PostgREST con la base
+        return not codigo.startswith("PGRST0")
+    estado = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(estado, int) and 400 <= estado < 500 and estado not in (408, 429)
+
+class BufferRespuestas:
+    """
+    Buffer write-behind para las respuestas de los estudiantes.
+
+    Las filas se acumulan en memoria y se escriben con un único insert multi-fila cuando
+    el buffer alcanza `max_filas` o cuando pasan `max_espera` segundos desde la última escritura.
+
+    Durabilidad: las filas se confirman al cliente (202) antes de llegar a Supabase.
+    - Cada flush intenta primero el lote completo. Si Supabase no está disponible (conexión, timeout,
+      5xx) el lote vuelve entero al buffer sin sumar intentos y los flushes siguientes se espacian con
+      backoff; no se divide, para no multiplicar las llamadas que esperan un timeout.
+    - Solo si Supabase rechaza el contenido (`es_error_de_filas`: 4xx, restricción violada) el lote se
+      divide en mitades (bisección) hasta aislar las filas que fallan; el resto se escribe en el mismo
+      flush. Cada fila rechazada suma un intento y vuelve al buffer.
+    - Una fila rechazada `max_intentos` veces (p. ej. una clave foránea inválida) se guarda en el
+      archivo dead-letter (JSON por línea) y sale del buffer, para no bloquear a las demás.
+    - Con `max_pendientes` filas en el buffer, `agregar` hace un flush sincrónico (salvo que Supabase
+      esté caído) y, si sigue lleno, lanza BufferLlenoError (la API responde 503): el cliente sabe que
+      la respuesta no se aceptó.
+    - Al apagar el servidor de forma ordenada (`detener`) se vacía el buffer, con reintentos; lo que
+      no se pudo escribir va al dead-letter.
+    - Si el proceso muere abruptamente (kill -9, OOM) las filas pendientes se pierden.
+    """
+
+    def __init__(self, insertar, max_filas: int = RESPUESTAS_BUFFER_MAX_FILAS, max_espera: float = RESPUESTAS_BUFFER_MAX_ESPERA,
+                 max_pendientes: int = RESPUESTAS_BUFFER_MAX_PENDIENTES, max_intentos: int = RESPUESTAS_BUFFER_MAX_INTENTOS,
+                 dead_letter: str = RESPUESTAS_DEAD_LETTER):
+        # `insertar` es una corrutina que recibe la lista de filas y las escribe en un solo insert
+        self.insertar = insertar
+        self.max_filas = max_filas
+        self.max_espera = max_espera
+        self.max_pendientes = max(max_pendientes, max_filas)
+        self.max_intentos = max_intentos
+        self.dead_letter = dead_letter
+        self._filas = []  # [fila, intentos fallidos]
+        self._lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._lleno = asyncio.Event()
+        self._tarea = None
+        self._backoff = 0.0
+        # Métricas
+        self.flushes = 0
+        self.filas_escritas = 0
+        self.errores = 0
+        self.filas_dead_letter = 0
+        self.rechazadas = 0
+        self.ultimo_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def agregar(self, filas: list):
+        """Encola filas para escritura diferida; solo espera a Supabase si el buffer está lleno"""
+        if len(self._filas) + len(filas) > self.max_pendientes and not self._backoff:
+            # Backpressure: intentar vaciar antes de aceptar más. Con Supabase caído (backoff)
+            # se rechaza de inmediato en vez de esperar un timeout dentro de la petición
+            await self.flush()
+
+        async with self._lock:
+            if len(self._filas) + len(filas) > self.max_pendientes:
+                self.rechazadas += len(filas)
+                raise BufferLlenoError(f"El buffer de respuestas está lleno ({len(self._filas)} pendientes). Intenta más tarde.")
+            self._filas.extend([fila, 0] for fila in filas)
+            if len(self._filas) >= self.max_filas:
+                self._lleno.set()
+
+    async def _bucle(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lleno.wait(), timeout=self.max_espera + self._backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._lleno.clear()
+            await self.flush()
+
+    async def _escribir(self, lote: list):
+        """
+        Escribe `lote` ([fila, intentos]). Devuelve (rechazadas, pendientes, caida):
+        - rechazadas: [(entrada, error)] de las filas que Supabase rechazó, aisladas por bisección
+        - pendientes: entradas que no se intentaron porque Supabase no está disponible
+        - caida: el error de disponibilidad que detuvo la escritura, o None
+        """
+        try:
+            await self.insertar([fila for fila, _ in lote])
+            self.filas_escritas += len(lote)
+            return [], [], None
+        except Exception as e:
+            if not es_error_de_filas(e):
+                return [], lote, e
+            if len(lote) == 1:
+                return [(lote[0], str(e))], [], None
+        mitad = len(lote) // 2
+        rechazadas, pendientes, caida = await self._escribir(lote[:mitad])
+        if caida is not None:
+            return rechazadas, pendientes + lote[mitad:], caida
+        rechazadas_2, pendientes, caida = await self._escribir(lote[mitad:])
+        return rechazadas + rechazadas_2, pendientes, caida
+
+    def _guardar_dead_letter(self, fallidas: list):
+        """Agrega las filas descartadas al archivo dead-letter (una línea JSON por fila)"""
+        try:
+            with open(self.dead_letter, "a", encoding="utf-8") as f:
+                for (fila, intentos), error in fallidas:
+                    f.write(json.dumps({"fecha": datetime.now().isoformat(), "intentos": intentos, "error": error, "fila": fila},
+                                       ensure_ascii=False, default=str) + "\n")
+            self.filas_dead_letter += len(fallidas)
+            print(f"[ERROR] {len(fallidas)} respuestas enviadas a {self.dead_letter} tras {self.max_intentos} intentos fallidos")
+        except Exception as e:
+            print(f"[ERROR] No se pudo escribir el dead-letter de respuestas ({len(fallidas)} filas perdidas): {e}")
+
+    async def flush(self) -> bool:
+        """Escribe las filas pendientes en lotes de hasta `max_filas`. Devuelve False si alguna falló"""
+        async with self._flush_lock:
+            async with self._lock:
+                if not self._filas:
+                    return True
+                lote, self._filas = self._filas[:self.max_filas], self._filas[self.max_filas:]
+
+            inicio = time.perf_counter()
+            rechazadas, pendientes, caida = await self._escribir(lote)
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+
+            escritas = len(lote) - len(rechazadas) - len(pendientes)
+            if escritas:
+                self.flushes += 1
+                self.ultimo_flush_ms = duracion_ms
+                self.max_flush_ms = max(self.max_flush_ms, duracion_ms)
+                self._total_flush_ms += duracion_ms
+
+            if caida is None:
+                self._backoff = 0.0
+            else:
+                # Supabase no está disponible: espaciar los reintentos sin gastar los intentos de las filas
+                self._backoff = min(max(self._backoff * 2, self.max_espera), RESPUESTAS_BUFFER_MAX_BACKOFF)
+            if not rechazadas and not pendientes:
+                return True
+
+            self.errores += 1
+            reintentar, descartar = [], []
+            for entrada, error in rechazadas:
+                entrada[1] += 1
+                if entrada[1] >= self.max_intentos:
+                    descartar.append((entrada, error))
+                else:
+                    reintentar.append(entrada)
+            if descartar:
+                self._guardar_dead_letter(descartar)
+            ultimo_error = caida if caida is not None else rechazadas[-1][1]
+            print(f"[ERROR] Flush de respuestas: {escritas} de {len(lote)} filas escritas, "
+                  f"{len(reintentar) + len(pendientes)} se reintentarán. Último error: {ultimo_error}")
+            async with self._lock:
+                self._filas = reintentar + pendientes + self._filas
+            return False
+
+    async def detener(self):
+        """Detiene el bucle y vacía el buffer antes de apagar el servidor"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+        for intento in range(1, RESPUESTAS_BUFFER_REINTENTOS_CIERRE + 1):
+            while self._filas:
+                if not await self.flush():
+                    break
+            if not self._filas:
+                return
+            await asyncio.sleep(0.5 * intento)
+
+        # Lo que no se pudo escribir se conserva en el dead-letter en lugar de perderse
+        pendientes, self._filas = self._filas, []
+        self._guardar_dead_letter([(entrada, "pendiente al apagar el servidor") for entrada in pendientes])
+
+    def metricas(self):
+        return {
+            "pendientes": len(self._filas),
+            "max_pendientes": self.max_pendientes,
+            "max_filas": self.max_filas,
+            "max_espera_segundos": self.max_espera,
+            "flushes": self.flushes,
+            "filas_escritas": self.filas_escritas,
+            "errores": self.errores,
+            "filas_dead_letter": self.filas_dead_letter,
+            "rechazadas": self.rechazadas,
+            "backoff_segundos": self._backoff,
+            "ultimo_flush_ms": round(self.ultimo_flush_ms, 2),
+            "promedio_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
@@ -0,0 +1,215 @@
+# cache.py
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+# === CONFIGURACIÓN ===
+CATALOGO_CACHE_TTL = float(os.getenv("CATALOGO_CACHE_TTL", "600"))  # segundos
+CATALOGO_CACHE_MAX = int(os.getenv("CATALOGO_CACHE_MAX", "512"))  # entradas
+# Invalidaciones compartidas por los workers de gunicorn del host (SQLite); 0 para que sean por proceso
+CATALOGO_CACHE_COMPARTIDO = os.getenv("CATALOGO_CACHE_COMPARTIDO", "1") == "1"
+CATALOGO_CACHE_RUTA = os.getenv("CATALOGO_CACHE_RUTA", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "catalogo_cache.sqlite3"))
+CATALOGO_CACHE_SINCRONIZACION = float(os.getenv("CATALOGO_CACHE_SINCRONIZACION", "1.0"))  # segundos entre lecturas
+
+TODAS = "*"  # invalidación de todas las tablas
+
+class InvalidacionesCompartidas:
+    """
+    Última invalidación de cada tabla (o de todas, con la clave '*') en un SQLite que comparten los
+    workers del host. Un worker que invalida la publica aquí; los demás la leen y descartan las
+    entradas que cargaron antes.
+    """
+
+    def __init__(self, ruta: str = CATALOGO_CACHE_RUTA):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=5.0, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("CREATE TABLE IF NOT EXISTS invalidaciones (tabla TEXT PRIMARY KEY, invalidado_en REAL NOT NULL)")
+        self._conexion.commit()
+
+    def publicar(self, tabla: str, invalidado_en: float):
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO invalidaciones (tabla, invalidado_en) VALUES (?, ?) "
+                "ON CONFLICT(tabla) DO UPDATE SET invalidado_en = MAX(invalidado_en, excluded.invalidado_en)",
+                (tabla, invalidado_en)
+            )
+            self._conexion.commit()
+
+    def leer(self) -> dict:
+        with self._lock:
+            return dict(self._conexion.execute("SELECT tabla, invalidado_en FROM invalidaciones").fetchall())
+
+class CatalogoCache:
+    """
+    Cache en memoria (read-through) para las tablas casi estáticas del catálogo:
+    tema, personaje e investigador.
+
+    - Cada entrada expira a los `ttl` segundos.
+    - Como máximo `max_entradas`; al superarlo se desaloja la menos usada (LRU).
+    - Las cargas concurrentes de una misma clave se agrupan en una sola consulta; las peticiones
+      que esperan una carga en curso se cuentan aparte (`agrupadas`), no como misses. Si la carga
+      se cancela (p. ej. el cliente que la inició se desconectó) las que esperaban la reintentan.
+    - Las claves son tuplas cuyo primer elemento es el nombre de la tabla, lo que permite
+      invalidar todas las entradas de una tabla con `await invalidar("tema")`.
+    - Con `compartidas` (InvalidacionesCompartidas) una invalidación llega a los demás workers del
+      host en a lo sumo `sincronizacion` segundos. Entre hosts distintos el límite es el TTL.
+      Las lecturas y escrituras del SQLite se hacen en un hilo, fuera del event loop.
+    """
+
+    def __init__(self, ttl: float = CATALOGO_CACHE_TTL, max_entradas: int = CATALOGO_CACHE_MAX,
+                 compartidas: InvalidacionesCompartidas = None, sincronizacion: float = CATALOGO_CACHE_SINCRONIZACION):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.compartidas = compartidas
+        self.sincronizacion = sincronizacion
+        self._entradas = OrderedDict()  # clave -> (expira_en, cargado_en, valor)
+        self._en_vuelo = {}  # clave -> asyncio.Future de la carga en curso
+        self._invalidaciones = {}  # tabla (o '*') -> time.time() de la última invalidación conocida
+        self._sincronizado_en = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.agrupadas = 0
+        self.desalojos = 0
+        self.expiradas = 0
+        self.invalidadas = 0
+
+    async def _sincronizar(self):
+        """Trae las invalidaciones de los demás workers, como mucho cada `sincronizacion` segundos"""
+        if self.compartidas is None or time.monotonic() - self._sincronizado_en < self.sincronizacion:
+            return
+        self._sincronizado_en = time.monotonic()
+        try:
+            invalidaciones = await asyncio.to_thread(self.compartidas.leer)
+        except Exception as e:
+            print(f"[WARNING] No se pudieron leer las invalidaciones del cache de catálogo: {e}")
+            return
+        with self._lock:
+            for tabla, invalidado_en in invalidaciones.items():
+                if invalidado_en > self._invalidaciones.get(tabla, 0.0):
+                    self._invalidaciones[tabla] = invalidado_en
+
+    def _vigente(self, clave, cargado_en):
+        """False si la tabla de la clave se invalidó después de cargar la entrada"""
+        ultima = max(self._invalidaciones.get(clave[0], 0.0), self._invalidaciones.get(TODAS, 0.0))
+        return cargado_en > ultima
+
+    def _leer(self, clave):
+        """Devuelve (encontrado, valor) y actualiza el orden LRU"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                expira_en, cargado_en, valor = entrada
+                if expira_en > time.monotonic() and self._vigente(clave, cargado_en):
+                    self._entradas.move_to_end(clave)
+                    return True, valor
+                del self._entradas[clave]
+                if expira_en > time.monotonic():
+                    self.invalidadas += 1
+                else:
+                    self.expiradas += 1
+            return False, None
+
+    def guardar(self, clave, valor, cargado_en: float = None):
+        """`cargado_en` es el time.time() de inicio de la carga (por defecto, ahora)"""
+        cargado_en = time.time() if cargado_en is None else cargado_en
+        with self._lock:
+            if not self._vigente(clave, cargado_en):
+                return  # se invalidó mientras se cargaba
+            self._entradas[clave] = (time.monotonic() + self.ttl, cargado_en, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    async def obtener(self, clave, cargador):
+        """
+        Devuelve el valor cacheado para `clave` o lo carga con `await cargador()`.
+        Si otra petición ya está cargando la misma clave, espera su resultado.
+        """
+        await self._sincronizar()
+        encontrado, valor = self._leer(clave)
+        if encontrado:
+            self.hits += 1
+            return valor
+
+        futuro = self._en_vuelo.get(clave)
+        if futuro is not None:
+            self.agrupadas += 1
+            try:
+                return await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise  # se canceló esta petición, no la carga
+            # Se canceló la carga que se esperaba: intentarla de nuevo
+            return await self.obtener(clave, cargador)
+
+        self.misses += 1
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_vuelo[clave] = futuro
+        try:
+            cargado_en = time.time()
+            valor = await cargador()
+            self.guardar(clave, valor, cargado_en)
+            futuro.set_result(valor)
+            return valor
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evitar el aviso de "exception was never retrieved" si nadie más esperaba
+            futuro.exception()
+            raise
+        finally:
+            # Carga cancelada (CancelledError no es Exception): liberar a los que esperan
+            if not futuro.done():
+                futuro.cancel()
+            if self._en_vuelo.get(clave) is futuro:
+                del self._en_vuelo[clave]
+
+    async def invalidar(self, tabla: str = None):
+        """
+        Elimina las entradas de una tabla, o todo el cache si no se indica tabla, y publica la
+        invalidación para los demás workers
+        """
+        invalidado_en = time.time()
+        with self._lock:
+            self._invalidaciones[tabla or TODAS] = invalidado_en
+            if tabla is None:
+                eliminadas = len(self._entradas)
+                self._entradas.clear()
+            else:
+                claves = [clave for clave in self._entradas if clave[0] == tabla]
+                for clave in claves:
+                    del self._entradas[clave]
+                eliminadas = len(claves)
+
+        if self.compartidas is not None:
+            try:
+                await asyncio.to_thread(self.compartidas.publicar, tabla or TODAS, invalidado_en)
+            except Exception as e:
+                print(f"[WARNING] No se pudo publicar la invalidación del cache de catálogo; los demás workers la verán al expirar el TTL: {e}")
+        return eliminadas
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses + self.agrupadas
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "invalidaciones_compartidas": self.compartidas is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "agrupadas": self.agrupadas,
+                # Lecturas que no consultaron Supabase (hits y esperas de una carga en curso)
+                "hit_rate": round((self.hits + self.agrupadas) / total, 4) if total else 0.0,
+                "desalojos": self.desalojos,
+                "expiradas": self.expiradas,
+                "invalidadas": self.invalidadas,
+            }
+
+catalogo_cache = CatalogoCache(compartidas=InvalidacionesCompartidas() if CATALOGO_CACHE_COMPARTIDO else None)
@@ -25,6 +25,16 @@ class GradoEnum(str, Enum):
     QUINTO = "5to"
     SEXTO = "6to"
 
+class EstadoTrabajoEnum(str, Enum):
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    COMPLETADO = "completado"
+    ERROR = "error"
+
+class FormatoListadoEnum(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+
 # DTOs de entrada (requests)
 class EstudianteCreate(BaseModel):
     nombre: str
@@ -103,6 +113,19 @@ class PreguntaTemporal(BaseModel):
     alternativa_d: Optional[str]
     alternativa_correcta: int
 
+class TrabajoCreadoResponse(BaseModel):
+    id_trabajo: str
+    estado: EstadoTrabajoEnum
+    message: str = "Trabajo de generación encolado"
+
+class TrabajoResponse(BaseModel):
+    id_trabajo: str
+    estado: EstadoTrabajoEnum
+    creado_en: datetime
+    finalizado_en: Optional[datetime] = None
+    preguntas: Optional[List[PreguntaTemporal]] = None  # Solo cuando estado = completado
+    error: Optional[str] = None  # Solo cuando estado = error
+
 # DTOs para respuestas de API
 class ApiResponse(BaseModel):
     data: Optional[List | Dict] = None
@@ -0,0 +1,91 @@
+# benchmark_almacenamiento.py
+# Compara los dos esquemas de almacenamiento de Chroma (ver colecciones.py):
+# - por_coleccion: una colección por área y grado
+# - unificada: una sola colección con metadata y filtros `where`
+# Cada modo se mide en un proceso nuevo: tiempo de apertura del registro, latencia de recuperación
+# por query y memoria máxima (RSS). Requiere haber ejecutado process_data.py en ambos modos.
+# Uso (desde la raíz del proyecto): python rag/benchmark_almacenamiento.py [repeticiones]
+import os
+import sys
+import json
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODOS = ["por_coleccion", "unificada"]
+
+QUERIES = [
+    "Ciencia y Tecnologia - Primer Grado - Reconocemos las plantas como seres vivos - 5 preguntas",
+    "Ciencia y Tecnologia - Cuarto Grado - El sistema digestivo - 5 preguntas",
+    "Matematicas - Segundo Grado - Sumas y restas hasta 100 - 5 preguntas",
+    "Matematicas - Sexto Grado - Fracciones y decimales - 5 preguntas",
+]
+# Solo aplica al modo unificado
+QUERY_ENTRE_GRADOS = "Matematicas - Quinto Grado, Sexto Grado - Repaso de fracciones - 5 preguntas"
+
+# Se ejecuta en el proceso hijo con RAG_ALMACENAMIENTO ya fijado; imprime un JSON con las mediciones
+CODIGO_HIJO = """
+import sys, json, time, resource
+sys.path.insert(0, 'rag')
+import execute_rag
+
+repeticiones, queries = int(sys.argv[1]), json.loads(sys.argv[2])
+execute_rag.obtener_componentes_rag()
+
+inicio = time.perf_counter()
+colecciones = execute_rag.recargar_colecciones()
+apertura_ms = (time.perf_counter() - inicio) * 1000
+
+# Primera consulta por separado: incluye la carga del índice HNSW
+inicio = time.perf_counter()
+execute_rag.recuperar_documentos_batch(queries[:1])
+primera_ms = (time.perf_counter() - inicio) * 1000
+
+latencias, errores = [], 0
+for _ in range(repeticiones):
+    for query in queries:
+        # Se vacía el cache de embeddings para medir también el costo del embedding en cada consulta
+        execute_rag.obtener_componentes_rag().cache_embeddings.limpiar()
+        inicio = time.perf_counter()
+        resultado = execute_rag.recuperar_documentos_batch([query])[0]
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        errores += isinstance(resultado, Exception)
+
+latencias.sort()
+print(json.dumps({
+    "colecciones": len(colecciones),
+    "apertura_ms": apertura_ms,
+    "primera_ms": primera_ms,
+    "p50_ms": latencias[len(latencias) // 2],
+    "p95_ms": latencias[int(len(latencias) * 0.95) - 1],
+    "errores": errores,
+    "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+def medir_modo(modo, repeticiones, queries):
+    entorno = dict(os.environ, RAG_ALMACENAMIENTO=modo, RAG_CACHE="0")
+    proceso = subprocess.run(
+        [sys.executable, "-c", CODIGO_HIJO, str(repeticiones), json.dumps(queries)],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        print(proceso.stderr[-2000:])
+        raise SystemExit(f"Falló la medición del modo {modo}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    resultados = {}
+    for modo in MODOS:
+        queries = QUERIES + [QUERY_ENTRE_GRADOS] if modo == "unificada" else QUERIES
+        print(f"Midiendo modo '{modo}' ({repeticiones} x {len(queries)} queries)...")
+        resultados[modo] = medir_modo(modo, repeticiones, queries)
+
+    print(f"\n{'modo':<15}{'colecciones':>12}{'apertura ms':>13}{'1ra query ms':>14}{'p50 ms':>9}{'p95 ms':>9}{'errores':>9}{'RSS máx MB':>12}")
+    for modo, r in resultados.items():
+        print(f"{modo:<15}{r['colecciones']:>12}{r['apertura_ms']:>13.1f}{r['primera_ms']:>14.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['errores']:>9}{r['rss_max_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
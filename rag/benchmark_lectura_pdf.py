@@ -0,0 +1,65 @@
+# benchmark_lectura_pdf.py
+# Compara los modos de lectura de CustomPDFLoader ("memory", "path", "mmap") sobre los PDFs del currículo:
+# tiempo de parseo y RSS máximo. Cada PDF y modo se mide en un proceso nuevo para que el RSS no se contamine.
+# Uso (desde rag/): python benchmark_lectura_pdf.py [directorio_pdfs]
+import os
+import sys
+import json
+import subprocess
+
+from loaders import READ_MODES
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Se ejecuta en el proceso hijo: mide el RSS antes y después de recorrer todas las páginas
+CODIGO_HIJO = """
+import sys, json, time, resource
+from loaders import CustomPDFLoader
+
+ruta, modo = sys.argv[1], sys.argv[2]
+rss_base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+inicio = time.perf_counter()
+paginas = caracteres = 0
+for doc in CustomPDFLoader(ruta, read_mode=modo).lazy_load():
+    paginas += 1
+    caracteres += len(doc.page_content)
+print(json.dumps({
+    "segundos": time.perf_counter() - inicio,
+    "paginas": paginas,
+    "caracteres": caracteres,
+    "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "rss_base_mb": rss_base,
+}))
+"""
+
+def medir(ruta, modo):
+    proceso = subprocess.run([sys.executable, "-c", CODIGO_HIJO, ruta, modo], cwd=DIRECTORIO, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        print(proceso.stderr[-2000:])
+        raise SystemExit(f"Falló la medición de {ruta} en modo {modo}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+def main():
+    directorio_pdfs = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DIRECTORIO, "..", "files")
+    pdfs = sorted(os.path.join(directorio_pdfs, nombre) for nombre in os.listdir(directorio_pdfs) if nombre.lower().endswith(".pdf"))
+    if not pdfs:
+        raise SystemExit(f"No hay PDFs en {directorio_pdfs}")
+
+    print(f"{'pdf':<42}{'MB':>7}" + "".join(f"{modo + ' s':>11}{modo + ' ΔRSS':>13}" for modo in READ_MODES))
+    totales = {modo: {"segundos": 0.0, "delta_max_mb": 0.0} for modo in READ_MODES}
+    for ruta in pdfs:
+        fila = f"{os.path.basename(ruta)[:41]:<42}{os.path.getsize(ruta) / (1024 * 1024):>7.1f}"
+        for modo in READ_MODES:
+            r = medir(ruta, modo)
+            delta = r["rss_max_mb"] - r["rss_base_mb"]
+            totales[modo]["segundos"] += r["segundos"]
+            totales[modo]["delta_max_mb"] = max(totales[modo]["delta_max_mb"], delta)
+            fila += f"{r['segundos']:>11.2f}{delta:>13.1f}"
+        print(fila)
+
+    print("\n=== Resumen ===")
+    for modo, t in totales.items():
+        print(f"{modo:<8} parseo total {t['segundos']:.1f} s, mayor aumento de RSS por PDF {t['delta_max_mb']:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# benchmark_splitter.py
+# Compara la fragmentación original (RecursiveCharacterTextSplitter + SentenceTransformersTokenTextSplitter,
+# dos tokenizaciones) con el divisor de una sola pasada de splitter.py sobre las páginas ya extraídas.
+# Uso (desde rag/): python benchmark_splitter.py [pdf ...]
+import os
+import sys
+import glob
+import time
+
+from process_data import extract_pdf_pages, fragmentar_paginas_legacy, obtener_token_splitter
+from splitter import DivisorTokens
+
+def medir(nombre, fragmentar, pages, tokenizer):
+    inicio = time.perf_counter()
+    chunks = [chunk for chunk, _ in fragmentar(pages)]
+    segundos = time.perf_counter() - inicio
+
+    caracteres = sum(len(texto) for _, texto in pages)
+    tokens = [len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]] if chunks else [0]
+    print(f"{nombre:<10}{len(chunks):>8}{segundos:>10.2f}{caracteres / segundos / 1e6 if segundos else 0.0:>10.2f}"
+          f"{sum(tokens) / len(tokens):>12.1f}{max(tokens):>12}")
+    return segundos
+
+def main():
+    pdfs = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "*.pdf")))
+    if not pdfs:
+        raise SystemExit("No hay PDFs para medir")
+
+    # Ambos fragmentadores reciben las mismas páginas; la extracción no se mide
+    pages = []
+    for pdf_path in pdfs:
+        pages += extract_pdf_pages(pdf_path)
+
+    # Cargar los tokenizers fuera de la medición
+    obtener_token_splitter()
+    divisor = DivisorTokens(max_tokens=256)
+
+    print(f"\n{len(pdfs)} PDFs, {len(pages)} páginas")
+    print(f"{'splitter':<10}{'chunks':>8}{'segundos':>10}{'MB/s':>10}{'tokens/chunk':>12}{'max tokens':>12}")
+    legacy = medir("legacy", fragmentar_paginas_legacy, pages, divisor.tokenizer)
+    tokens = medir("tokens", lambda p: ((f.texto, f.pagina) for f in divisor.dividir_paginas(p)), pages, divisor.tokenizer)
+    if tokens:
+        print(f"\nAceleración: {legacy / tokens:.2f}x")
+
+if __name__ == "__main__":
+    main()
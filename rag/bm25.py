@@ -0,0 +1,108 @@
+# bm25.py
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter
+
+# Palabras vacías del español que no aportan al ranking léxico
+STOPWORDS = {
+    "a", "al", "algo", "ante", "antes", "como", "con", "contra", "cual", "cuando", "de", "del", "desde",
+    "donde", "durante", "e", "el", "ella", "ellas", "ellos", "en", "entre", "era", "es", "esa", "ese",
+    "eso", "esta", "este", "esto", "estos", "estas", "fue", "ha", "hay", "la", "las", "le", "les", "lo",
+    "los", "mas", "me", "mi", "muy", "no", "nos", "o", "para", "pero", "por", "que", "se", "sin", "sobre",
+    "son", "su", "sus", "te", "tu", "u", "un", "una", "uno", "unos", "unas", "y", "ya", "yo",
+}
+
+def tokenizar(texto):
+    """Minúsculas, sin tildes, solo palabras de 2+ caracteres que no sean stopwords"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [token for token in re.findall(r'\w+', texto) if len(token) > 1 and token not in STOPWORDS]
+
+class IndiceBM25:
+    """
+    Índice invertido en memoria con ranking BM25 sobre los chunks de una colección.
+    Se construye en process_data.py junto a la colección de Chroma y se persiste como JSON.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.longitudes = []
+        self.postings = {}  # término -> [[posición_doc, frecuencia], ...]
+        self.promedio_longitud = 0.0
+        self._total_longitud = 0
+
+    @classmethod
+    def construir(cls, ids, documentos, **kwargs):
+        indice = cls(**kwargs)
+        for id_chunk, documento in zip(ids, documentos):
+            indice.agregar(id_chunk, documento)
+        return indice
+
+    def agregar(self, id_chunk, documento):
+        """Agrega un chunk al final del índice; permite construirlo a medida que llegan los chunks"""
+        tokens = tokenizar(documento)
+        posicion = len(self.ids)
+        self.ids.append(id_chunk)
+        self.longitudes.append(len(tokens))
+        for termino, frecuencia in Counter(tokens).items():
+            self.postings.setdefault(termino, []).append([posicion, frecuencia])
+        self._total_longitud += len(tokens)
+        self.promedio_longitud = self._total_longitud / len(self.ids)
+
+    def buscar(self, query, k=10):
+        """Devuelve [(id_chunk, score)] de los k chunks con mayor puntaje BM25"""
+        total_docs = len(self.ids)
+        if not total_docs:
+            return []
+
+        puntajes = {}
+        for termino in set(tokenizar(query)):
+            postings = self.postings.get(termino)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for posicion, frecuencia in postings:
+                norma = self.k1 * (1 - self.b + self.b * self.longitudes[posicion] / self.promedio_longitud)
+                puntajes[posicion] = puntajes.get(posicion, 0.0) + idf * frecuencia * (self.k1 + 1) / (frecuencia + norma)
+
+        mejores = sorted(puntajes.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[posicion], puntaje) for posicion, puntaje in mejores]
+
+    def guardar(self, ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": self.k1, "b": self.b, "ids": self.ids, "longitudes": self.longitudes,
+                "postings": self.postings, "promedio_longitud": self.promedio_longitud,
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        indice = cls(k1=data["k1"], b=data["b"])
+        indice.ids = data["ids"]
+        indice.longitudes = data["longitudes"]
+        indice.postings = data["postings"]
+        indice.promedio_longitud = data["promedio_longitud"]
+        indice._total_longitud = sum(indice.longitudes)
+        return indice
+
+def ruta_indice(directorio, collection_name):
+    return os.path.join(directorio, f"{collection_name}.json")
+
+def fusion_rrf(rankings, k=60):
+    """
+    Reciprocal Rank Fusion: combina varias listas ordenadas de ids en una sola.
+    Cada id suma 1 / (k + posición) por cada lista en la que aparece.
+    """
+    puntajes = {}
+    for ranking in rankings:
+        for posicion, id_chunk in enumerate(ranking, start=1):
+            puntajes[id_chunk] = puntajes.get(id_chunk, 0.0) + 1.0 / (k + posicion)
+    return sorted(puntajes, key=puntajes.get, reverse=True)
@@ -0,0 +1,109 @@
+# cache_embeddings.py
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+# === CONFIGURACIÓN ===
+RAG_CACHE_EMBEDDINGS_MB = float(os.getenv("RAG_CACHE_EMBEDDINGS_MB", "32"))
+
+def normalizar_texto(texto):
+    """Clave del cache: NFC, sin espacios repetidos y en minúsculas (el modelo por defecto es uncased)"""
+    texto = unicodedata.normalize('NFC', texto)
+    return re.sub(r'\s+', ' ', texto).strip().lower()
+
+class CacheEmbeddings:
+    """
+    Cache LRU delante de la función de embeddings, acotado por memoria.
+
+    Se usa como la propia función: `cache(["texto", ...])` devuelve un embedding (np.float32) por texto.
+    Los textos que no están en el cache se embeben juntos en una sola llamada al modelo.
+    """
+
+    def __init__(self, embedding_function, max_mb: float = RAG_CACHE_EMBEDDINGS_MB):
+        self.embedding_function = embedding_function
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entradas = OrderedDict()  # clave -> np.ndarray
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+        self.segundos_embebiendo = 0.0
+
+    @staticmethod
+    def _tamano(clave, embedding):
+        return embedding.nbytes + len(clave.encode('utf-8'))
+
+    def _segundos_por_texto(self):
+        return self.segundos_embebiendo / self.misses if self.misses else 0.0
+
+    def __call__(self, textos):
+        claves = [normalizar_texto(texto) for texto in textos]
+        resultados = [None] * len(claves)
+        faltantes = {}  # clave -> posiciones
+
+        with self._lock:
+            for i, clave in enumerate(claves):
+                embedding = self._entradas.get(clave)
+                if embedding is not None:
+                    self._entradas.move_to_end(clave)
+                    self.hits += 1
+                    resultados[i] = embedding
+                else:
+                    faltantes.setdefault(clave, []).append(i)
+
+        if faltantes:
+            inicio = time.perf_counter()
+            nuevos = self.embedding_function(list(faltantes))
+            duracion = time.perf_counter() - inicio
+
+            with self._lock:
+                self.misses += len(faltantes)
+                self.segundos_embebiendo += duracion
+                for clave, embedding in zip(faltantes, nuevos):
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    for i in faltantes[clave]:
+                        resultados[i] = embedding
+                    self._guardar(clave, embedding)
+
+        return resultados
+
+    def _guardar(self, clave, embedding):
+        tamano = self._tamano(clave, embedding)
+        if tamano > self.max_bytes:
+            return
+        anterior = self._entradas.pop(clave, None)
+        if anterior is not None:
+            self._bytes -= self._tamano(clave, anterior)
+        self._entradas[clave] = embedding
+        self._bytes += tamano
+        while self._bytes > self.max_bytes:
+            clave_vieja, embedding_viejo = self._entradas.popitem(last=False)
+            self._bytes -= self._tamano(clave_vieja, embedding_viejo)
+            self.desalojos += 1
+
+    def limpiar(self):
+        """Vacía el cache (entradas y memoria contabilizada); los contadores se conservan"""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "memoria_mb": round(self._bytes / (1024 * 1024), 3),
+                "max_memoria_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "desalojos": self.desalojos,
+                "ms_por_embedding": round(self._segundos_por_texto() * 1000, 3),
+                # Estimación: cada hit evita un embedding del costo promedio observado en los misses
+                "segundos_ahorrados": round(self.hits * self._segundos_por_texto(), 3),
+            }
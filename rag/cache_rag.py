@@ -0,0 +1,239 @@
+# cache_rag.py
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+
+# === CONFIGURACIÓN ===
+RAG_CACHE = os.getenv("RAG_CACHE", "0") == "1"
+RAG_CACHE_RUTA = os.getenv("RAG_CACHE_RUTA", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_cache.sqlite3"))
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", str(7 * 24 * 3600)))  # segundos
+RAG_CACHE_MAX_ENTRADAS = int(os.getenv("RAG_CACHE_MAX_ENTRADAS", "1000"))
+RAG_CACHE_MAX_PREGUNTAS = int(os.getenv("RAG_CACHE_MAX_PREGUNTAS", "50"))  # preguntas acumuladas por entrada
+RAG_CACHE_TIMEOUT = float(os.getenv("RAG_CACHE_TIMEOUT", "5"))  # segundos esperando el lock de SQLite (otros workers)
+RAG_CACHE_SEMANTICO = os.getenv("RAG_CACHE_SEMANTICO", "0") == "1"
+RAG_CACHE_UMBRAL = float(os.getenv("RAG_CACHE_UMBRAL", "0.92"))  # similitud coseno mínima para un hit semántico
+# Variedad: el cache solo responde si tiene al menos `cantidad * variedad` preguntas acumuladas.
+# Con 1.0 responde en cuanto hay suficientes; con 3.0 sigue generando hasta juntar el triple
+# y luego devuelve subconjuntos aleatorios distintos en cada llamada.
+RAG_CACHE_VARIEDAD = float(os.getenv("RAG_CACHE_VARIEDAD", "1.0"))
+
+CAMPOS_PREGUNTA = ['pregunta', 'alternativa_A', 'alternativa_B', 'alternativa_C', 'alternativa_D', 'alternativa_correcta']
+
+def normalizar_query(query):
+    """
+    Normaliza 'Área - Grado - Tema - N preguntas' a 'área - grado - tema' en minúsculas y sin tildes.
+    La cantidad se descarta: la misma entrada sirve para pedir 3 o 10 preguntas del mismo tema.
+    """
+    partes = [parte.strip() for parte in query.split(' - ')]
+    if partes and re.fullmatch(r'\d+\s*preguntas?', partes[-1], re.IGNORECASE):
+        partes = partes[:-1]
+    texto = ' - '.join(partes).lower()
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', texto)
+
+def extraer_cantidad(query, por_defecto=5):
+    match = re.search(r'(\d+)\s*preguntas?\s*$', query.strip(), re.IGNORECASE)
+    return int(match.group(1)) if match else por_defecto
+
+def extraer_preguntas(output):
+    """Extrae la lista de preguntas válidas del JSON devuelto por el LLM (o [] si no es JSON)"""
+    texto = str(output)
+    inicio, fin = texto.find('['), texto.rfind(']') + 1
+    if inicio == -1 or fin <= inicio:
+        return []
+    try:
+        data = json.loads(texto[inicio:fin])
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(data, list):
+        return []
+    return [p for p in data if isinstance(p, dict) and all(campo in p for campo in CAMPOS_PREGUNTA)]
+
+class CacheResultadosRAG:
+    """
+    Cache persistente (SQLite) de las preguntas generadas por RAG.
+
+    - Clave exacta: colección + query normalizada + ids de los chunks recuperados.
+    - Modo semántico opcional: si no hay hit exacto, se busca en la misma colección una query
+      cuyo embedding tenga similitud coseno >= `umbral`.
+    - Cada entrada acumula preguntas de sucesivas generaciones (hasta RAG_CACHE_MAX_PREGUNTAS)
+      y en cada hit devuelve un subconjunto aleatorio del tamaño pedido.
+    - Las entradas expiran a los `ttl` segundos; por encima de `max_entradas` se desalojan
+      las usadas hace más tiempo (LRU).
+    - El archivo lo comparten los workers de gunicorn (modo WAL, espera de `timeout` segundos por
+      el lock). Un error de SQLite nunca llega al endpoint: la lectura cuenta como miss y la
+      escritura se descarta, con un aviso en el log.
+    """
+
+    def __init__(self, ruta=RAG_CACHE_RUTA, ttl=RAG_CACHE_TTL, max_entradas=RAG_CACHE_MAX_ENTRADAS,
+                 semantico=RAG_CACHE_SEMANTICO, umbral=RAG_CACHE_UMBRAL, variedad=RAG_CACHE_VARIEDAD, timeout=RAG_CACHE_TIMEOUT):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.semantico = semantico
+        self.umbral = umbral
+        self.variedad = max(1.0, variedad)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=timeout, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                clave TEXT PRIMARY KEY,
+                coleccion TEXT NOT NULL,
+                query_norm TEXT NOT NULL,
+                embedding BLOB,
+                preguntas TEXT NOT NULL,
+                creado_en REAL NOT NULL,
+                usado_en REAL NOT NULL
+            )
+        """)
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_entradas_coleccion ON entradas (coleccion)")
+        self._conexion.commit()
+        self.hits_exactos = 0
+        self.hits_semanticos = 0
+        self.misses = 0
+        self.errores = 0
+
+    @staticmethod
+    def _clave(coleccion, query_norm, ids_chunks):
+        base = f"{coleccion}|{query_norm}|{','.join(sorted(ids_chunks))}"
+        return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _normalizar_embedding(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vector)
+        return vector / norma if norma else vector
+
+    def _muestra(self, preguntas, cantidad):
+        """Devuelve `cantidad` preguntas al azar como el JSON que devolvería el LLM, o None si no alcanzan"""
+        if len(preguntas) < cantidad * self.variedad:
+            return None
+        return json.dumps(random.sample(preguntas, cantidad), ensure_ascii=False)
+
+    def buscar(self, query, coleccion, ids_chunks, embedding=None):
+        """Devuelve la salida cacheada (JSON de preguntas) o None (también si SQLite falla)"""
+        try:
+            return self._buscar(query, coleccion, ids_chunks, embedding)
+        except Exception as e:
+            with self._lock:
+                self._deshacer()
+                self.errores += 1
+                self.misses += 1
+            print(f"[WARNING] Error leyendo el cache de RAG, se trata como miss: {e}")
+            return None
+
+    def guardar(self, query, coleccion, ids_chunks, output, embedding=None):
+        """Agrega las preguntas válidas de `output` a la entrada de la query; si SQLite falla no se guarda"""
+        try:
+            self._guardar(query, coleccion, ids_chunks, output, embedding)
+        except Exception as e:
+            with self._lock:
+                self._deshacer()
+                self.errores += 1
+            print(f"[WARNING] Error escribiendo el cache de RAG, la salida no se guardó: {e}")
+
+    def _deshacer(self):
+        """Descarta una transacción a medias para que la conexión siga usable"""
+        try:
+            self._conexion.rollback()
+        except Exception:
+            pass
+
+    def _buscar(self, query, coleccion, ids_chunks, embedding=None):
+        query_norm = normalizar_query(query)
+        cantidad = extraer_cantidad(query)
+        clave = self._clave(coleccion, query_norm, ids_chunks)
+        ahora = time.time()
+
+        with self._lock:
+            self._conexion.execute("DELETE FROM entradas WHERE creado_en < ?", (ahora - self.ttl,))
+
+            fila = self._conexion.execute("SELECT preguntas FROM entradas WHERE clave = ?", (clave,)).fetchone()
+            if fila is not None:
+                salida = self._muestra(json.loads(fila[0]), cantidad)
+                if salida is not None:
+                    self._conexion.execute("UPDATE entradas SET usado_en = ? WHERE clave = ?", (ahora, clave))
+                    self._conexion.commit()
+                    self.hits_exactos += 1
+                    print(f"[CACHE RAG] Hit exacto para '{query_norm}'")
+                    return salida
+
+            if self.semantico and embedding is not None:
+                vector = self._normalizar_embedding(embedding)
+                mejor_clave, mejor_similitud, mejores_preguntas = None, -1.0, None
+                for clave_candidata, embedding_blob, preguntas_json in self._conexion.execute(
+                        "SELECT clave, embedding, preguntas FROM entradas WHERE coleccion = ? AND embedding IS NOT NULL", (coleccion,)):
+                    similitud = float(np.dot(vector, np.frombuffer(embedding_blob, dtype=np.float32)))
+                    if similitud > mejor_similitud:
+                        mejor_clave, mejor_similitud, mejores_preguntas = clave_candidata, similitud, preguntas_json
+
+                if mejor_clave is not None and mejor_similitud >= self.umbral:
+                    salida = self._muestra(json.loads(mejores_preguntas), cantidad)
+                    if salida is not None:
+                        self._conexion.execute("UPDATE entradas SET usado_en = ? WHERE clave = ?", (ahora, mejor_clave))
+                        self._conexion.commit()
+                        self.hits_semanticos += 1
+                        print(f"[CACHE RAG] Hit semántico para '{query_norm}' (similitud {mejor_similitud:.3f})")
+                        return salida
+
+            self._conexion.commit()
+            self.misses += 1
+            return None
+
+    def _guardar(self, query, coleccion, ids_chunks, output, embedding=None):
+        nuevas = extraer_preguntas(output)
+        if not nuevas:
+            return
+
+        query_norm = normalizar_query(query)
+        clave = self._clave(coleccion, query_norm, ids_chunks)
+        embedding_blob = self._normalizar_embedding(embedding).tobytes() if embedding is not None else None
+        ahora = time.time()
+
+        with self._lock:
+            fila = self._conexion.execute("SELECT preguntas, creado_en FROM entradas WHERE clave = ?", (clave,)).fetchone()
+            preguntas = json.loads(fila[0]) if fila else []
+            creado_en = fila[1] if fila else ahora
+
+            # Acumular sin duplicar enunciados; se conservan las más recientes
+            enunciados = {p['pregunta'] for p in preguntas}
+            preguntas += [p for p in nuevas if p['pregunta'] not in enunciados]
+            preguntas = preguntas[-RAG_CACHE_MAX_PREGUNTAS:]
+
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO entradas (clave, coleccion, query_norm, embedding, preguntas, creado_en, usado_en) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, coleccion, query_norm, embedding_blob, json.dumps(preguntas, ensure_ascii=False), creado_en, ahora)
+            )
+
+            # Desalojo LRU por encima del máximo de entradas
+            self._conexion.execute(
+                "DELETE FROM entradas WHERE clave IN (SELECT clave FROM entradas ORDER BY usado_en DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,)
+            )
+            self._conexion.commit()
+
+    def estadisticas(self):
+        try:
+            with self._lock:
+                entradas = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+        except Exception as e:
+            print(f"[WARNING] Error leyendo el cache de RAG: {e}")
+            entradas = None
+        total = self.hits_exactos + self.hits_semanticos + self.misses
+        return {
+            "entradas": entradas,
+            "hits_exactos": self.hits_exactos,
+            "hits_semanticos": self.hits_semanticos,
+            "misses": self.misses,
+            "errores": self.errores,
+            "hit_rate": round((self.hits_exactos + self.hits_semanticos) / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,39 @@
+# colecciones.py
+# Nombres de colección y metadata compartidos por process_data.py (escritura) y execute_rag.py (lectura),
+# para que ambos lados normalicen área y grado exactamente igual.
+import os
+import re
+import unicodedata
+
+# === CONFIGURACIÓN ===
+# "por_coleccion": una colección por área y grado (data_<area>_<grado>), el esquema original.
+# "unificada": una sola colección con metadata area/grado/source/pagina en cada chunk y filtros `where`.
+RAG_ALMACENAMIENTO = os.getenv("RAG_ALMACENAMIENTO", "por_coleccion")
+COLECCION_UNIFICADA = "data_curriculo"
+
+def normalizar(texto):
+    """'Ciencia y Tecnología' -> 'ciencia_y_tecnologia' (minúsculas, sin tildes, espacios a '_')"""
+    texto = unicodedata.normalize('NFKD', texto.strip().lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', '_', texto)
+
+def generate_collection_name(area, grado):
+    """Genera un nombre de colección basado en área y grado"""
+    return f"data_{normalizar(area)}_{normalizar(grado)}"
+
+def extraer_grados(grado):
+    """
+    Un grado o varios separados por ',' o '+' (repasos entre grados),
+    p. ej. 'Primer Grado, Segundo Grado' -> ['Primer Grado', 'Segundo Grado']
+    """
+    return [parte.strip() for parte in re.split(r'[,+]', grado) if parte.strip()]
+
+def metadata_chunk(area, grado, source, pagina):
+    """Metadata guardada en cada chunk de la colección unificada"""
+    return {"area": normalizar(area), "grado": normalizar(grado), "source": source, "pagina": pagina}
+
+def filtro_where(area, grados):
+    """Filtro `where` de Chroma para un área y uno o más grados"""
+    grados = [normalizar(grado) for grado in grados]
+    filtro_grado = {"grado": grados[0]} if len(grados) == 1 else {"grado": {"$in": grados}}
+    return {"$and": [{"area": normalizar(area)}, filtro_grado]}
@@ -0,0 +1,92 @@
+# contexto.py
+import os
+import threading
+
+# === CONFIGURACIÓN ===
+RAG_CONTEXTO = os.getenv("RAG_CONTEXTO", "0") == "1"
+RAG_CONTEXTO_MAX_TOKENS = int(os.getenv("RAG_CONTEXTO_MAX_TOKENS", "1024"))
+# Fracción de n-gramas del chunk más corto presentes en otro ya elegido a partir de la cual se descarta
+RAG_CONTEXTO_UMBRAL_DUPLICADO = float(os.getenv("RAG_CONTEXTO_UMBRAL_DUPLICADO", "0.8"))
+# El mismo modelo que usa SentenceTransformersTokenTextSplitter en process_data.py para los chunks de 256 tokens
+RAG_CONTEXTO_TOKENIZER = os.getenv("RAG_CONTEXTO_TOKENIZER", "sentence-transformers/all-mpnet-base-v2")
+
+def _ngramas(ids, n=3):
+    if len(ids) < n:
+        return {tuple(ids)}
+    return {tuple(ids[i:i + n]) for i in range(len(ids) - n + 1)}
+
+class ConstructorContexto:
+    """
+    Arma la sección 'Information' del prompt a partir de los chunks recuperados (ya ordenados por relevancia):
+    - descarta los chunks casi idénticos o contenidos en otro más relevante (solapamiento de n-gramas de tokens),
+    - los agrega en orden hasta `max_tokens`; el más relevante entra siempre,
+    - registra cuántos tokens se ahorraron respecto de enviar todos los chunks.
+    """
+
+    def __init__(self, max_tokens=RAG_CONTEXTO_MAX_TOKENS, umbral_duplicado=RAG_CONTEXTO_UMBRAL_DUPLICADO,
+                 tokenizer=RAG_CONTEXTO_TOKENIZER):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+        self.max_tokens = max_tokens
+        self.umbral_duplicado = umbral_duplicado
+        self._lock = threading.Lock()
+        self.solicitudes = 0
+        self.tokens_originales = 0
+        self.tokens_enviados = 0
+        self.descartados_duplicados = 0
+        self.descartados_presupuesto = 0
+
+    def construir(self, documentos):
+        """Devuelve (texto del contexto, reporte de la solicitud)"""
+        ids_por_documento = self.tokenizer(list(documentos), add_special_tokens=False)["input_ids"] if documentos else []
+        separador = len(self.tokenizer("\n\n", add_special_tokens=False)["input_ids"])
+
+        elegidos, ngramas_elegidos = [], []
+        usados = duplicados = fuera_presupuesto = 0
+        for documento, ids in zip(documentos, ids_por_documento):
+            ngramas = _ngramas(ids)
+            if any(len(ngramas & otros) / min(len(ngramas), len(otros)) >= self.umbral_duplicado for otros in ngramas_elegidos):
+                duplicados += 1
+                continue
+
+            costo = len(ids) + (separador if elegidos else 0)
+            if elegidos and usados + costo > self.max_tokens:
+                fuera_presupuesto += 1
+                continue
+
+            elegidos.append(documento)
+            ngramas_elegidos.append(ngramas)
+            usados += costo
+
+        # Lo que se hubiera enviado antes: todos los chunks unidos con líneas en blanco
+        originales = sum(len(ids) for ids in ids_por_documento) + separador * max(len(documentos) - 1, 0)
+        reporte = {
+            "chunks": len(documentos),
+            "chunks_enviados": len(elegidos),
+            "descartados_duplicados": duplicados,
+            "descartados_presupuesto": fuera_presupuesto,
+            "tokens_originales": originales,
+            "tokens_enviados": usados,
+            "tokens_ahorrados": originales - usados,
+        }
+        with self._lock:
+            self.solicitudes += 1
+            self.tokens_originales += originales
+            self.tokens_enviados += usados
+            self.descartados_duplicados += duplicados
+            self.descartados_presupuesto += fuera_presupuesto
+
+        return "\n\n".join(elegidos), reporte
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "solicitudes": self.solicitudes,
+                "tokens_originales": self.tokens_originales,
+                "tokens_enviados": self.tokens_enviados,
+                "tokens_ahorrados": self.tokens_originales - self.tokens_enviados,
+                "descartados_duplicados": self.descartados_duplicados,
+                "descartados_presupuesto": self.descartados_presupuesto,
+            }
@@ -1,9 +1,13 @@
 # execute_rag.py
-import chromadb
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
+# Las dependencias pesadas (chromadb, sentence-transformers, langchain) se importan de forma diferida
+# dentro de obtener_componentes_rag(): importar este módulo no carga modelos ni abre Chroma.
 from dotenv import load_dotenv, find_dotenv
 import os
+import json
+import time
+import threading
+from json_incremental import ParserArregloJSON
+from colecciones import RAG_ALMACENAMIENTO, COLECCION_UNIFICADA, generate_collection_name, extraer_grados, filtro_where
 
 # Cargar las variables de entorno
 load_dotenv(find_dotenv())
@@ -24,15 +28,85 @@ def word_wrap(text, width=87):
 
 # === CONFIGURACIÓN ===
 # Usar path absoluto para chroma_storage
-import os
 CHROMA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chroma_storage")  
+BM25_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "bm25_storage")
+
+# Cantidad de chunks enviados al LLM por query
+RAG_N_RESULTADOS = int(os.getenv("RAG_N_RESULTADOS", "5"))
+# Búsqueda híbrida: vectorial + BM25 fusionadas con Reciprocal Rank Fusion (RAG_HIBRIDO=1)
+RAG_HIBRIDO = os.getenv("RAG_HIBRIDO", "0") == "1"
+RAG_HIBRIDO_CANDIDATOS = int(os.getenv("RAG_HIBRIDO_CANDIDATOS", "20"))  # candidatos por cada ranking antes de fusionar
+# Segundos que se recuerda que una colección no existe (p. ej. data_personaje_*) antes de volver a buscarla
+RAG_COLECCIONES_TTL_AUSENTES = float(os.getenv("RAG_COLECCIONES_TTL_AUSENTES", "60"))
+
+# === COMPONENTES RAG (inicialización diferida) ===
+
+class ComponentesRAG:
+    """Cliente de Chroma, función de embeddings, LLM y cache de resultados, creados una sola vez por proceso"""
+
+    def __init__(self):
+        import chromadb
+        from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+        from langchain_google_genai import GoogleGenerativeAI
+        from cache_rag import CacheResultadosRAG, RAG_CACHE
+        from cache_embeddings import CacheEmbeddings
+        from rerank import Reranker, RAG_RERANK
+        from contexto import ConstructorContexto, RAG_CONTEXTO
+
+        inicio = time.perf_counter()
+        self.chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+        self.embedding_function = SentenceTransformerEmbeddingFunction()
+        # Cache LRU de embeddings de queries: el espacio de queries (temas x grados) es pequeño
+        self.cache_embeddings = CacheEmbeddings(self.embedding_function)
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-embedding_function = chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction()
+        # Aplying Langchain & Google Generative AI
+        google_api_key = os.environ['GOOGLE_API_KEY']
+        self.llm = GoogleGenerativeAI(model="gemini-2.5-flash-lite", google_api_key=google_api_key)
 
-# Aplying Langchain & Google Generative AI
-google_api_key = os.environ['GOOGLE_API_KEY']
-llm = GoogleGenerativeAI(model="gemini-2.5-flash-lite", google_api_key=google_api_key)
+        # Cache persistente de resultados (RAG_CACHE=1); ver cache_rag.py
+        self.cache_rag = CacheResultadosRAG() if RAG_CACHE else None
+        # Reordenamiento opcional con cross-encoder (RAG_RERANK=1); ver rerank.py
+        self.reranker = Reranker() if RAG_RERANK else None
+        # Deduplicación y presupuesto de tokens del contexto (RAG_CONTEXTO=1); ver contexto.py
+        self.contexto = ConstructorContexto() if RAG_CONTEXTO else None
+        print(f"Componentes RAG inicializados en {time.perf_counter() - inicio:.2f} s.")
+
+_componentes = None
+_componentes_lock = threading.Lock()
+
+def obtener_componentes_rag():
+    """Único punto de acceso a los componentes RAG; los crea en el primer uso"""
+    global _componentes
+    if _componentes is None:
+        with _componentes_lock:
+            if _componentes is None:
+                _componentes = ComponentesRAG()
+    return _componentes
+
+def estadisticas_rag():
+    """Métricas de los caches de RAG; no inicializa los componentes si aún no se usaron"""
+    if _componentes is None:
+        return {"inicializado": False}
+    return {
+        "inicializado": True,
+        "cache_embeddings": _componentes.cache_embeddings.estadisticas(),
+        "cache_resultados": _componentes.cache_rag.estadisticas() if _componentes.cache_rag is not None else None,
+        "rerank": _componentes.reranker.estadisticas() if _componentes.reranker is not None else None,
+        "contexto": _componentes.contexto.estadisticas() if _componentes.contexto is not None else None,
+    }
+
+def precalentar_rag():
+    """
+    Inicializa los componentes y precalienta las colecciones. Pensado para ejecutarse en segundo plano
+    una vez que el servidor ya está atendiendo, de modo que la primera generación no pague la carga
+    """
+    inicio = time.perf_counter()
+    try:
+        obtener_componentes_rag()
+        precalentar_colecciones()
+        print(f"RAG precalentado en {time.perf_counter() - inicio:.2f} s.")
+    except Exception as e:
+        print(f"No se pudo precalentar RAG: {str(e)}")
 
 # === FUNCIONES AUXILIARES ===
 
@@ -47,40 +121,157 @@ def extract_area_and_grade_from_query(query):
     else:
         raise ValueError(f"Formato de query no válido. Esperado: 'Área - Grado - Tema - Cantidad'. Recibido: {query}")
 
-def generate_collection_name(area, grado):
-    """Genera un nombre de colección basado en área y grado"""
-    # Convertir a formato válido para nombres de colección (igual que en process_data.py)
-    area_clean = area.lower().replace(' ', '_').replace('í', 'i').replace('á', 'a')
-    grado_clean = grado.lower().replace(' ', '_')
-    return f"data_{area_clean}_{grado_clean}"
+# === REGISTRO DE COLECCIONES ===
+# Handles abiertos por nombre de colección (por área y grado vía generate_collection_name, o la colección unificada).
+# Se construye con list_collections() y se reemplaza completo (una asignación) en cada recarga: los lectores
+# no toman lock y siempre ven un registro entero. Un miss abre solo esa colección con get_collection; si no
+# existe se recuerda durante RAG_COLECCIONES_TTL_AUSENTES segundos.
+_colecciones = {}
+_colecciones_lock = threading.Lock()
+_colecciones_ausentes = {}  # nombre -> time.monotonic() hasta el que se considera inexistente
+_indices_bm25 = {}  # ruta -> IndiceBM25 (o None si la colección no tiene índice)
+
+def obtener_indice_bm25(collection_name, directorio=BM25_DIR):
+    """Índice BM25 persistido por process_data.py para el área y grado; se carga una vez"""
+    from bm25 import IndiceBM25, ruta_indice
+    ruta = ruta_indice(directorio, collection_name)
+    indices = _indices_bm25  # recargar_colecciones puede reemplazar el dict mientras tanto
+    if ruta not in indices:
+        indices[ruta] = IndiceBM25.cargar(ruta) if os.path.exists(ruta) else None
+        if indices[ruta] is None:
+            print(f"'{collection_name}' no tiene índice BM25; se usa solo búsqueda vectorial.")
+    return indices[ruta]
+
+def texto_lexico(query):
+    """Parte temática de 'Área - Grado - Tema - N preguntas' para la búsqueda léxica"""
+    parts = [part.strip() for part in query.split(' - ')]
+    return ' '.join(parts[2:-1]) if len(parts) >= 4 else query
+
+def recargar_colecciones():
+    """Lista las colecciones de Chroma y abre un handle para cada una"""
+    global _colecciones, _colecciones_ausentes, _indices_bm25
+    componentes = obtener_componentes_rag()
+    nuevas = {}
+    for col in componentes.chroma_client.list_collections():
+        # Según la versión de chromadb, list_collections devuelve objetos o solo nombres
+        nombre = getattr(col, "name", col)
+        if RAG_ALMACENAMIENTO == "unificada" and nombre != COLECCION_UNIFICADA:
+            continue  # en modo unificado no se abren las colecciones por área y grado
+        nuevas[nombre] = componentes.chroma_client.get_collection(name=nombre, embedding_function=componentes.embedding_function)
+    with _colecciones_lock:
+        _colecciones = nuevas
+        _colecciones_ausentes = {}
+        _indices_bm25 = {}
+    print(f"Registro de colecciones cargado: {len(nuevas)} colecciones.")
+    return list(nuevas)
+
+def obtener_coleccion(area, grado):
+    """Devuelve el handle de la colección de un área y grado; si no está en el registro la abre"""
+    return obtener_coleccion_por_nombre(generate_collection_name(area, grado))
+
+def es_coleccion_inexistente(error):
+    """Error de get_collection por una colección que no existe; el tipo depende de la versión de chromadb"""
+    if type(error).__name__ in ("NotFoundError", "InvalidCollectionException"):
+        return True
+    return isinstance(error, ValueError) and "does not exist" in str(error)
+
+def abrir_coleccion(collection_name):
+    """
+    Abre una colección que no está en el registro y la agrega; None si no existe (se recuerda un rato).
+    Otros errores (SQLite bloqueado, E/S) se propagan sin recordarse: la consulta siguiente reintenta
+    """
+    global _colecciones
+    if _colecciones_ausentes.get(collection_name, 0.0) > time.monotonic():
+        return None
+    if RAG_ALMACENAMIENTO == "unificada" and collection_name != COLECCION_UNIFICADA:
+        return None  # en modo unificado no se abren las colecciones por área y grado
+
+    componentes = obtener_componentes_rag()
+    try:
+        chroma_collection = componentes.chroma_client.get_collection(name=collection_name, embedding_function=componentes.embedding_function)
+    except Exception as e:
+        if not es_coleccion_inexistente(e):
+            print(f"[WARNING] No se pudo abrir la colección '{collection_name}': {e}")
+            raise
+        with _colecciones_lock:
+            _colecciones_ausentes[collection_name] = time.monotonic() + RAG_COLECCIONES_TTL_AUSENTES
+        return None
+
+    with _colecciones_lock:
+        _colecciones = {**_colecciones, collection_name: chroma_collection}
+    return chroma_collection
+
+def obtener_coleccion_por_nombre(collection_name):
+    chroma_collection = _colecciones.get(collection_name)
+    if chroma_collection is None:
+        chroma_collection = abrir_coleccion(collection_name)
+
+    if chroma_collection is None:
+        available_collections = ', '.join(_colecciones)
+        raise Exception(f"La colección '{collection_name}' no se encuentra en Chroma. "
+                       f"Colecciones disponibles: {available_collections}. "
+                       f"Asegúrate de ejecutar 'process_data.py' primero para crear las colecciones.")
+    return chroma_collection
+
+def precalentar_colecciones():
+    """
+    Ejecuta una consulta mínima en cada colección para que Chroma cargue su índice HNSW en memoria
+    (y de paso el modelo de embeddings), así la primera consulta real de cada grado no paga la carga
+    """
+    if not _colecciones:
+        recargar_colecciones()
+    for nombre, chroma_collection in list(_colecciones.items()):
+        inicio = time.perf_counter()
+        try:
+            chroma_collection.query(query_texts=["precalentamiento"], n_results=1)
+            print(f"Colección '{nombre}' precalentada en {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+        except Exception as e:
+            print(f"No se pudo precalentar la colección '{nombre}': {str(e)}")
+
+def resolver_destino(query):
+    """
+    Dónde buscar los chunks de la query según RAG_ALMACENAMIENTO.
+
+    Devuelve (clave, colección, where, nombres de índices BM25, directorio BM25). Las queries con la
+    misma clave se resuelven con una sola consulta a Chroma. En modo unificado el grado puede listar
+    varios grados ('Primer Grado, Segundo Grado') para repasos entre grados.
+    """
+    area, grado = extract_area_and_grade_from_query(query)
+    grados = extraer_grados(grado)
+    nombres = [generate_collection_name(area, g) for g in grados]
+
+    if RAG_ALMACENAMIENTO == "unificada":
+        chroma_collection = obtener_coleccion_por_nombre(COLECCION_UNIFICADA)
+        clave = f"{COLECCION_UNIFICADA}:{'+'.join(sorted(nombres))}"
+        return clave, chroma_collection, filtro_where(area, grados), nombres, os.path.join(BM25_DIR, COLECCION_UNIFICADA)
+
+    if len(grados) > 1:
+        raise ValueError(f"La recuperación entre varios grados requiere RAG_ALMACENAMIENTO=unificada. Recibido: {grado}")
+    return nombres[0], obtener_coleccion(area, grado), None, nombres, BM25_DIR
 
 def get_collection_for_query(query):
     """Obtiene la colección de ChromaDB correspondiente a la query"""
     # Extraer área y grado de la query
     area, grado = extract_area_and_grade_from_query(query)
-    collection_name = generate_collection_name(area, grado)
     
     print(f"Área extraída: {area}")
     print(f"Grado extraído: {grado}")
-    print(f"Nombre de colección: {collection_name}")
-    
-    # Verificar si la colección existe
-    collection_names = [col.name for col in chroma_client.list_collections()]
-    
-    if collection_name not in collection_names:
-        available_collections = ', '.join(collection_names)
-        raise Exception(f"La colección '{collection_name}' no se encuentra en Chroma. "
-                       f"Colecciones disponibles: {available_collections}. "
-                       f"Asegúrate de ejecutar 'process_data.py' primero para crear las colecciones.")
-    
-    # Obtener la colección
-    chroma_collection = chroma_client.get_collection(name=collection_name, embedding_function=embedding_function)
-    print(f"Colección '{collection_name}' cargada exitosamente.\n")
+    clave, chroma_collection, _, _, _ = resolver_destino(query)
+    print(f"Colección consultada: {clave}")
     
     return chroma_collection
 
-def rag(query, retrieved_documents):
-    information = "\n\n".join(retrieved_documents)
+def construir_mensajes(query, retrieved_documents):
+    """Arma los mensajes (system + human) que se envían al LLM"""
+    from langchain_core.messages import SystemMessage, HumanMessage
+
+    contexto = obtener_componentes_rag().contexto
+    if contexto is not None:
+        information, reporte = contexto.construir(retrieved_documents)
+        print(f"[CONTEXTO] {reporte['chunks_enviados']}/{reporte['chunks']} chunks, "
+              f"{reporte['tokens_enviados']} tokens ({reporte['tokens_ahorrados']} ahorrados)")
+    else:
+        information = "\n\n".join(retrieved_documents)
 
     # Construimos los mensajes
     messages = [
@@ -116,11 +307,120 @@ def rag(query, retrieved_documents):
         )
     ]
 
+    return messages
+
+def rag(query, retrieved_documents):
+    messages = construir_mensajes(query, retrieved_documents)
+
     # Ejecuta el modelo con los mensajes
-    response = llm.invoke(messages)
+    response = obtener_componentes_rag().llm.invoke(messages)
 
     return response
 
+def recuperar_documentos_batch(queries, n_results=None):
+    """
+    Recupera los documentos de varias queries a la vez:
+    - agrupa las queries por colección (o por filtro de área y grados en modo unificado),
+    - calcula todos los embeddings faltantes en una sola pasada del modelo,
+    - hace una sola consulta multi-query a Chroma por grupo,
+    - en modo híbrido fusiona el ranking vectorial con el de BM25 (RRF),
+    - con rerank activo sobre-recupera candidatos y los reordena con el cross-encoder en una sola pasada.
+
+    Devuelve una lista en el mismo orden que `queries`. Cada elemento es un dict con
+    `coleccion`, `ids`, `documentos` y `embedding`, o la excepción que impidió recuperarla.
+    """
+    componentes = obtener_componentes_rag()
+    n_results = n_results or RAG_N_RESULTADOS
+    n_candidatos = n_results
+    if componentes.reranker is not None:
+        from rerank import RAG_RERANK_CANDIDATOS
+        n_candidatos = max(n_results, RAG_RERANK_CANDIDATOS)
+    resultados = [None] * len(queries)
+
+    # Agrupar por colección; las queries con formato inválido o sin colección fallan individualmente
+    grupos = {}  # clave -> (colección, where, nombres BM25, directorio BM25, [posiciones])
+    for i, query in enumerate(queries):
+        try:
+            clave, *destino = resolver_destino(query)
+        except Exception as e:
+            resultados[i] = e
+            continue
+        grupos.setdefault(clave, (*destino, []))[-1].append(i)
+
+    # Un solo forward del modelo para todas las queries válidas (las ya cacheadas no se recalculan)
+    validas = [i for *_, posiciones in grupos.values() for i in posiciones]
+    embeddings = dict(zip(validas, componentes.cache_embeddings([queries[i] for i in validas])))
+
+    for nombre, (chroma_collection, where, nombres_bm25, directorio_bm25, posiciones) in grupos.items():
+        indices_bm25 = []
+        if RAG_HIBRIDO:
+            indices_bm25 = [indice for indice in (obtener_indice_bm25(n, directorio_bm25) for n in nombres_bm25) if indice is not None]
+        try:
+            results = chroma_collection.query(
+                query_embeddings=[embeddings[i].tolist() for i in posiciones],
+                n_results=max(n_candidatos, RAG_HIBRIDO_CANDIDATOS) if indices_bm25 else n_candidatos,
+                where=where
+            )
+            ids_por_query = results['ids']
+            documentos_por_id = {id_chunk: documento
+                                 for ids, documentos in zip(results['ids'], results['documents'])
+                                 for id_chunk, documento in zip(ids, documentos)}
+
+            if indices_bm25:
+                from bm25 import fusion_rrf
+                # Un ranking léxico por grado (varios en repasos entre grados) más el vectorial
+                ids_por_query = [
+                    fusion_rrf([ids_vectoriales] + [
+                        [id_chunk for id_chunk, _ in indice.buscar(texto_lexico(queries[i]), RAG_HIBRIDO_CANDIDATOS)]
+                        for indice in indices_bm25
+                    ])[:n_candidatos]
+                    for ids_vectoriales, i in zip(ids_por_query, posiciones)
+                ]
+                # Los chunks que solo encontró BM25 se leen de Chroma en una sola llamada
+                faltantes = sorted({id_chunk for ids in ids_por_query for id_chunk in ids} - documentos_por_id.keys())
+                if faltantes:
+                    extra = chroma_collection.get(ids=faltantes, include=["documents"])
+                    documentos_por_id.update(zip(extra['ids'], extra['documents']))
+        except Exception as e:
+            for i in posiciones:
+                resultados[i] = e
+            continue
+
+        for ids, i in zip(ids_por_query, posiciones):
+            ids = [id_chunk for id_chunk in ids if id_chunk in documentos_por_id]
+            resultados[i] = {
+                "coleccion": nombre,
+                "ids": ids,
+                "documentos": [documentos_por_id[id_chunk] for id_chunk in ids],
+                "embedding": embeddings[i],
+            }
+
+    recuperadas = [i for i, resultado in enumerate(resultados) if isinstance(resultado, dict)]
+    ordenes = None
+    if componentes.reranker is not None and recuperadas:
+        ordenes = componentes.reranker.reordenar_lote([(texto_lexico(queries[i]), resultados[i]["documentos"]) for i in recuperadas])
+
+    # Sin rerank (o si se omitió por el presupuesto) se conserva el orden de la recuperación
+    for k, i in enumerate(recuperadas):
+        orden = ordenes[k] if ordenes is not None else range(len(resultados[i]["ids"]))
+        orden = list(orden)[:n_results]
+        resultados[i]["ids"] = [resultados[i]["ids"][j] for j in orden]
+        resultados[i]["documentos"] = [resultados[i]["documentos"][j] for j in orden]
+
+    return resultados
+
+def buscar_en_cache(query, recuperacion):
+    """Salida cacheada para la query y su contexto recuperado, o None"""
+    cache_rag = obtener_componentes_rag().cache_rag
+    if cache_rag is None:
+        return None
+    return cache_rag.buscar(query, recuperacion["coleccion"], recuperacion["ids"], recuperacion["embedding"])
+
+def guardar_en_cache(query, recuperacion, output):
+    cache_rag = obtener_componentes_rag().cache_rag
+    if cache_rag is not None:
+        cache_rag.guardar(query, recuperacion["coleccion"], recuperacion["ids"], output, recuperacion["embedding"])
+
 def execute_rag_for_query(query):
     """
     Ejecuta el pipeline RAG completo para una query específica
@@ -128,17 +428,21 @@ def execute_rag_for_query(query):
     try:
         print(f"Procesando query: {query}")
         
-        # Obtener la colección correspondiente basada en la query
-        chroma_collection = get_collection_for_query(query)
-
-        # Realizar la búsqueda en la colección específica
-        results = chroma_collection.query(query_texts=[query], n_results=5)
+        # Recuperar los documentos (embedding desde el cache LRU y consulta a la colección del área y grado)
+        recuperacion = recuperar_documentos_batch([query])[0]
+        if isinstance(recuperacion, Exception):
+            raise recuperacion
+        print(f"Colección consultada: {recuperacion['coleccion']}")
 
-        # Obtener todos los documentos de la consulta
-        retrieved_documents = results['documents'][0]
+        # Responder desde el cache si ya se generaron preguntas para esta query y contexto
+        cached_output = buscar_en_cache(query, recuperacion)
+        if cached_output is not None:
+            return cached_output
 
         # Ejecutar la consulta RAG
-        output = rag(query=query, retrieved_documents=retrieved_documents)
+        output = rag(query=query, retrieved_documents=recuperacion["documentos"])
+
+        guardar_en_cache(query, recuperacion, output)
         
         return output
         
@@ -146,6 +450,90 @@ def execute_rag_for_query(query):
         print(f"Error procesando query '{query}': {str(e)}")
         return None
 
+def execute_rag_stream(query):
+    """
+    Variante en streaming de execute_rag_for_query: genera los fragmentos de texto del LLM a medida
+    que llegan (`llm.stream`). Si la respuesta está en el cache se emite completa en un solo fragmento.
+    Lanza la excepción si la recuperación o el LLM fallan.
+
+    Quien lo consume puede cerrarlo antes del final (`close()`, p. ej. al tener las preguntas pedidas):
+    el stream del LLM se corta y se guardan en el cache las preguntas que alcanzaron a completarse.
+    Si el LLM falla a mitad de camino no se guarda nada: una salida truncada no debe servirse como hit.
+    """
+    print(f"Procesando query (streaming): {query}")
+
+    recuperacion = recuperar_documentos_batch([query])[0]
+    if isinstance(recuperacion, Exception):
+        raise recuperacion
+
+    cached_output = buscar_en_cache(query, recuperacion)
+    if cached_output is not None:
+        yield cached_output
+        return
+
+    def guardar(output):
+        try:
+            guardar_en_cache(query, recuperacion, output)
+        except Exception as e:
+            print(f"[WARNING] No se pudo guardar la salida en el cache de RAG: {e}")
+
+    llm = obtener_componentes_rag().llm
+    fragmentos = []
+    try:
+        for fragmento in llm.stream(construir_mensajes(query, recuperacion["documentos"])):
+            fragmento = str(fragmento)
+            fragmentos.append(fragmento)
+            yield fragmento
+    except GeneratorExit:
+        # Cerrado por quien lo consume: el arreglo quedó abierto, guardar solo los objetos completos
+        completos = ParserArregloJSON().agregar(''.join(fragmentos))
+        if completos:
+            guardar(json.dumps(completos, ensure_ascii=False))
+        raise
+    guardar(''.join(fragmentos))
+
+def execute_rag_for_queries(queries, max_concurrencia=4):
+    """
+    Versión por lotes de execute_rag_for_query: una pasada de embeddings y una consulta a Chroma
+    por colección para todas las queries, y las llamadas al LLM con `llm.batch` (hasta
+    `max_concurrencia` en paralelo). Devuelve las salidas en el orden de `queries` (None si falló).
+    """
+    print(f"Procesando {len(queries)} queries en lote")
+    salidas = [None] * len(queries)
+
+    try:
+        recuperaciones = recuperar_documentos_batch(queries)
+    except Exception as e:
+        print(f"Error recuperando documentos en lote: {str(e)}")
+        return salidas
+
+    pendientes = []  # posiciones que necesitan el LLM
+    for i, (query, recuperacion) in enumerate(zip(queries, recuperaciones)):
+        if isinstance(recuperacion, Exception):
+            print(f"Error procesando query '{query}': {str(recuperacion)}")
+            continue
+        cached_output = buscar_en_cache(query, recuperacion)
+        if cached_output is not None:
+            salidas[i] = cached_output
+        else:
+            pendientes.append(i)
+
+    if not pendientes:
+        return salidas
+
+    llm = obtener_componentes_rag().llm
+    mensajes = [construir_mensajes(queries[i], recuperaciones[i]["documentos"]) for i in pendientes]
+    respuestas = llm.batch(mensajes, config={"max_concurrency": max_concurrencia}, return_exceptions=True)
+
+    for i, respuesta in zip(pendientes, respuestas):
+        if isinstance(respuesta, Exception):
+            print(f"Error procesando query '{queries[i]}': {str(respuesta)}")
+            continue
+        salidas[i] = respuesta
+        guardar_en_cache(queries[i], recuperaciones[i], respuesta)
+
+    return salidas
+
 # Función principal que permite entrada dinámica
 def main():
     import sys
@@ -3,12 +3,23 @@ import sys
 import os
 import json
 import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 # Agregar el directorio rag al path para importar execute_rag
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from execute_rag import execute_rag_for_query
+from execute_rag import recuperar_documentos_batch, buscar_en_cache, guardar_en_cache, rag
+
+# === CONFIGURACIÓN DE LA GENERACIÓN CONCURRENTE ===
+GENERACION_CONCURRENCIA = int(os.getenv("GENERACION_CONCURRENCIA", "4"))  # llamadas al LLM en paralelo
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))  # cuota de requests por minuto del modelo
+GEMINI_RAFAGA = int(os.getenv("GEMINI_RAFAGA", "4"))  # requests que pueden salir juntas si hay cupo acumulado
+GENERACION_REINTENTOS = int(os.getenv("GENERACION_REINTENTOS", "5"))
+GENERACION_BACKOFF_BASE = float(os.getenv("GENERACION_BACKOFF_BASE", "2.0"))  # segundos
 
 # Definir todos los temas por grado para Ciencia y Tecnología
 TEMAS_CIENCIA_TECNOLOGIA = {
@@ -103,6 +114,116 @@ def extract_json_from_response(response_text):
         print(f"Respuesta recibida: {response_text[:500]}...")
         return None
 
+class TokenBucket:
+    """Limitador de tasa token-bucket: `tasa_por_minuto` tokens por minuto con ráfagas de hasta `capacidad`"""
+
+    def __init__(self, tasa_por_minuto, capacidad):
+        self.tasa_por_segundo = tasa_por_minuto / 60.0
+        self.capacidad = capacidad
+        self.tokens = float(capacidad)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea hasta obtener un token"""
+        while True:
+            with self.lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa_por_segundo)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa_por_segundo
+            time.sleep(espera)
+
+# Errores sin código HTTP que también son transitorios (google.api_core, httpx)
+ERRORES_TRANSITORIOS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                        "DeadlineExceeded", "GatewayTimeout", "ConnectError", "ConnectTimeout", "ReadTimeout"}
+
+def es_error_transitorio(e):
+    """
+    True para cuota agotada (429), errores del servidor (5xx), timeouts y errores de conexión.
+    Una clave inválida, un request mal formado o un contenido rechazado no se arreglan reintentando
+    """
+    while e is not None:  # langchain a veces envuelve el error original
+        if isinstance(e, (TimeoutError, ConnectionError)) or type(e).__name__ in ERRORES_TRANSITORIOS:
+            return True
+        codigo = getattr(e, "code", None) or getattr(e, "status_code", None)
+        if isinstance(codigo, int) and (codigo in (408, 429) or codigo >= 500):
+            return True
+        e = e.__cause__
+    return False
+
+def generar_con_reintentos(query, documentos, limitador, estadisticas):
+    """Llama al LLM respetando el limitador; reintenta los errores transitorios con backoff exponencial y jitter"""
+    for intento in range(1, GENERACION_REINTENTOS + 1):
+        limitador.adquirir()
+        try:
+            return rag(query=query, retrieved_documents=documentos)
+        except Exception as e:
+            if intento == GENERACION_REINTENTOS or not es_error_transitorio(e):
+                raise
+            espera = GENERACION_BACKOFF_BASE * (2 ** (intento - 1)) * (1 + random.random())
+            with estadisticas["lock"]:
+                estadisticas["reintentos"] += 1
+            print(f"⏳ Reintento {intento}/{GENERACION_REINTENTOS - 1} en {espera:.1f}s para '{query}': {str(e)[:120]}")
+            time.sleep(espera)
+
+def generar_respuestas_concurrente(queries):
+    """
+    Genera las respuestas de todas las queries de forma concurrente y limitada por la cuota de Gemini.
+    La recuperación se hace en lote; el resultado mantiene el orden de `queries` (None si falló),
+    de modo que el id_tipo asignado a cada tema es determinista.
+    """
+    inicio = time.perf_counter()
+    respuestas = [None] * len(queries)
+    estadisticas = {"reintentos": 0, "fallidas": 0, "cache": 0, "lock": threading.Lock()}
+
+    recuperaciones = recuperar_documentos_batch(queries)
+    print(f"🔎 Recuperación en lote completada en {time.perf_counter() - inicio:.1f}s")
+
+    pendientes = []
+    for i, (query, recuperacion) in enumerate(zip(queries, recuperaciones)):
+        if isinstance(recuperacion, Exception):
+            print(f"❌ Error recuperando documentos para '{query}': {str(recuperacion)}")
+            estadisticas["fallidas"] += 1
+            continue
+        cached_output = buscar_en_cache(query, recuperacion)
+        if cached_output is not None:
+            respuestas[i] = cached_output
+            estadisticas["cache"] += 1
+        else:
+            pendientes.append(i)
+
+    limitador = TokenBucket(GEMINI_RPM, GEMINI_RAFAGA)
+    completadas = 0
+    with ThreadPoolExecutor(max_workers=GENERACION_CONCURRENCIA) as executor:
+        futuros = {
+            executor.submit(generar_con_reintentos, queries[i], recuperaciones[i]["documentos"], limitador, estadisticas): i
+            for i in pendientes
+        }
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            completadas += 1
+            try:
+                respuestas[i] = futuro.result()
+                guardar_en_cache(queries[i], recuperaciones[i], respuestas[i])
+                estado = "✅"
+            except Exception as e:
+                estadisticas["fallidas"] += 1
+                estado = f"❌ {str(e)[:120]}"
+            transcurrido = time.perf_counter() - inicio
+            print(f"[{completadas}/{len(pendientes)}] {estado} {queries[i]} "
+                  f"({transcurrido:.1f}s, {completadas / transcurrido * 60:.1f} temas/min)")
+
+    duracion = time.perf_counter() - inicio
+    print(f"\n📈 Generación: {len(queries)} temas en {duracion:.1f}s "
+          f"({len(queries) / duracion * 60:.1f} temas/min) | desde cache: {estadisticas['cache']} | "
+          f"reintentos: {estadisticas['reintentos']} | fallidas: {estadisticas['fallidas']} | "
+          f"concurrencia: {GENERACION_CONCURRENCIA} | cuota: {GEMINI_RPM:g} RPM")
+    return respuestas
+
 def generate_questions_for_all_topics():
     """Genera preguntas para todos los temas y crea el archivo SQL"""
     
@@ -115,18 +236,24 @@ def generate_questions_for_all_topics():
     id_tipo = 1  # Contador para id_tipo
     total_questions = 0
     
+    # Construir todas las queries y generarlas de forma concurrente; las respuestas vuelven
+    # en el mismo orden, así que el id_tipo de cada tema no depende de qué termina primero
+    queries = [
+        f"Ciencia y Tecnología - {grado} - {tema} - 5 preguntas"
+        for grado, temas in TEMAS_CIENCIA_TECNOLOGIA.items()
+        for tema in temas
+    ]
+    responses = iter(generar_respuestas_concurrente(queries))
+    
     for grado, temas in TEMAS_CIENCIA_TECNOLOGIA.items():
         print(f"\n=== Procesando {grado} ===")
         
         for tema in temas:
             print(f"\nGenerando preguntas para: {tema}")
             
-            # Construir la query para el RAG
-            query = f"Ciencia y Tecnología - {grado} - {tema} - 5 preguntas"
-            
             try:
-                # Ejecutar RAG para obtener las preguntas
-                response = execute_rag_for_query(query)
+                # Respuesta del RAG para este tema (mismo orden que las queries)
+                response = next(responses)
                 
                 if response:
                     # Extraer JSON de la respuesta
@@ -188,6 +315,7 @@ def main():
     print("📚 Área: Ciencia y Tecnología")
     print("🎯 Grados: 1º a 6º")
     print("❓ Preguntas por tema: 5")
+    print(f"⚡ Concurrencia: {GENERACION_CONCURRENCIA} | Cuota: {GEMINI_RPM:g} RPM")
     print("=" * 50)
     
     generate_questions_for_all_topics()
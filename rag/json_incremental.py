@@ -0,0 +1,70 @@
+# json_incremental.py
+import json
+
+class ParserArregloJSON:
+    """
+    Parser incremental para un arreglo JSON de objetos que llega por fragmentos (streaming del LLM).
+
+    `agregar(fragmento)` devuelve los objetos del arreglo que se completaron con ese fragmento,
+    sin esperar al cierre del arreglo. Se ignora todo lo anterior al primer '[' (por ejemplo el
+    bloque ```json que suele anteponer el modelo) y los objetos que no son JSON válido.
+    """
+
+    def __init__(self):
+        self.dentro_arreglo = False
+        self.terminado = False
+        self.profundidad = 0  # nivel de llaves dentro del objeto actual
+        self.en_string = False
+        self.escape = False
+        self.actual = []  # caracteres del objeto en construcción
+        self.texto = []  # todo lo recibido, por si hace falta un parseo completo al final
+
+    def agregar(self, fragmento):
+        self.texto.append(fragmento)
+        completos = []
+        if self.terminado:
+            return completos
+
+        for caracter in fragmento:
+            if not self.dentro_arreglo:
+                if caracter == '[':
+                    self.dentro_arreglo = True
+                continue
+
+            if self.profundidad == 0:
+                # Entre objetos: solo interesan el inicio de un objeto y el cierre del arreglo
+                if caracter == '{':
+                    self.profundidad = 1
+                    self.actual = [caracter]
+                elif caracter == ']':
+                    self.terminado = True
+                    break
+                continue
+
+            self.actual.append(caracter)
+            if self.en_string:
+                if self.escape:
+                    self.escape = False
+                elif caracter == '\\':
+                    self.escape = True
+                elif caracter == '"':
+                    self.en_string = False
+            elif caracter == '"':
+                self.en_string = True
+            elif caracter == '{':
+                self.profundidad += 1
+            elif caracter == '}':
+                self.profundidad -= 1
+                if self.profundidad == 0:
+                    try:
+                        objeto = json.loads(''.join(self.actual))
+                        if isinstance(objeto, dict):
+                            completos.append(objeto)
+                    except json.JSONDecodeError:
+                        pass
+                    self.actual = []
+
+        return completos
+
+    def texto_completo(self):
+        return ''.join(self.texto)
@@ -1,32 +1,59 @@
 # loaders.py
+import mmap
+from contextlib import contextmanager
 from langchain_core.documents import Document
 from langchain_community.document_loaders.parsers.pdf import PyPDFParser
 from langchain_core.document_loaders.blob_loaders import Blob
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 from langchain_core.document_loaders.base import BaseLoader
 
+READ_MODES = ("memory", "path", "mmap")
+
+class MmapBlob(Blob):
+    """Path-backed blob whose byte stream is a read-only memory map of the file"""
+
+    @contextmanager
+    def as_bytes_io(self):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
 class CustomPDFLoader(BaseLoader):
     def __init__(self, filepath: str, password: Optional[Union[str, bytes]] = None,
-                 extract_images: bool = False):
-        # Initialize with a file path, optional password, and an image extraction flag
+                 extract_images: bool = False, read_mode: str = "memory"):
+        # Initialize with a file path, optional password, an image extraction flag and how to read the file:
+        # "memory" copies the whole file into a bytes object, "path" lets the parser read from the open file
+        # and "mmap" memory-maps it, so pages are read lazily without a full in-memory copy
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Invalid read_mode '{read_mode}'. Options: {', '.join(READ_MODES)}")
         self.filepath = filepath
         self.filename = filepath.split('/')[-1]  # Get just the filename
+        self.read_mode = read_mode
         self.parser = PyPDFParser(password=password, extract_images=extract_images)
 
-    def load(self) -> List[Document]:
+    def _blob(self) -> Blob:
+        if self.read_mode == "path":
+            return Blob.from_path(self.filepath)
+        if self.read_mode == "mmap":
+            return MmapBlob.from_path(self.filepath)
+
         # Read the file from disk as binary
         with open(self.filepath, 'rb') as f:
             file_data = f.read()
 
         # Convert the binary data into a Blob object required by the parser
-        blob = Blob.from_data(file_data)
-        documents = list(self.parser.parse(blob))
+        return Blob.from_data(file_data)
+
+    def lazy_load(self) -> Iterator[Document]:
+        blob = self._blob()
 
-        # Add the filename as metadata to each document for identification
-        for doc in documents:
+        # Yield one page at a time so callers never hold every page's text at once
+        for doc in self.parser.lazy_parse(blob):
+            # Add the filename as metadata to each document for identification
             doc.metadata.update({'source': self.filename})
+            yield doc
 
-        return documents
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
 
 class CustomTextLoader:
     def __init__(self, file_path):
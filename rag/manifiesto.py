@@ -0,0 +1,50 @@
+# manifiesto.py
+# Ids de chunks derivados del contenido y manifiesto por PDF fuente, para que process_data.py
+# reindexe solo lo que cambió entre ejecuciones.
+import os
+import json
+import hashlib
+
+def hash_archivo(ruta, tamano_bloque=1024 * 1024):
+    """SHA-256 del archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+def digest_chunk(chunk):
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:24]
+
+def ids_por_contenido(prefijo, chunks, vistos=None):
+    """
+    Un id por chunk a partir del hash de su texto: '<prefijo>_<hash>'. Si el mismo texto aparece varias
+    veces en el PDF (encabezados repetidos, por ejemplo) las repeticiones llevan el sufijo '-<n>'.
+    Un chunk que no cambia conserva su id aunque cambie su posición en el libro.
+    Para calcular los ids de un PDF por lotes se pasa el mismo dict `vistos` en cada llamada.
+    """
+    ids, vistos = [], {} if vistos is None else vistos
+    for chunk in chunks:
+        digest = digest_chunk(chunk)
+        n = vistos.get(digest, 0)
+        vistos[digest] = n + 1
+        ids.append(f"{prefijo}_{digest}" if n == 0 else f"{prefijo}_{digest}-{n}")
+    return ids
+
+def ruta_manifiesto(directorio, source):
+    return os.path.join(directorio, f"{source}.json")
+
+def cargar_manifiesto(ruta):
+    """Manifiesto guardado en la última indexación del PDF, o None si nunca se indexó con manifiesto"""
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_manifiesto(ruta, source, sha256, coleccion, ids):
+    # Se escribe a un temporal y se renombra: un manifiesto a medio escribir forzaría una reindexación completa
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump({"source": source, "sha256": sha256, "coleccion": coleccion, "ids": ids}, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
@@ -0,0 +1,152 @@
+# motor_embeddings.py
+# Motor de embeddings para la ingesta (process_data.py): lotes y hilos configurables, tokenización
+# del lote siguiente solapada con la inferencia del actual, y backend ONNX cuantizado (int8) opcional.
+# Uso como benchmark (desde rag/): python motor_embeddings.py [pdf] [cantidad_chunks]
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# === CONFIGURACIÓN ===
+# El mismo modelo que SentenceTransformerEmbeddingFunction usa por defecto (y con el que se consultan las colecciones)
+EMBEDDINGS_MODELO = os.getenv("EMBEDDINGS_MODELO", "all-MiniLM-L6-v2")
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")  # "torch" o "onnx"
+EMBEDDINGS_LOTE = int(os.getenv("EMBEDDINGS_LOTE", "32"))
+EMBEDDINGS_HILOS = int(os.getenv("EMBEDDINGS_HILOS", "0"))  # 0: lo que decida la librería
+EMBEDDINGS_ONNX_ARCHIVO = os.getenv("EMBEDDINGS_ONNX_ARCHIVO", "onnx/model_qint8_avx2.onnx")
+# Similitud coseno mínima (chunk a chunk) entre el backend ONNX y el modelo original
+EMBEDDINGS_UMBRAL_PARIDAD = float(os.getenv("EMBEDDINGS_UMBRAL_PARIDAD", "0.99"))
+
+class MotorEmbeddings:
+    """
+    Se usa como una función de embeddings: `motor(["texto", ...])` devuelve un np.float32 por texto.
+
+    Internamente ordena los textos por longitud (menos padding por lote), los parte en lotes de `lote`
+    y tokeniza el lote siguiente en un hilo mientras el modelo procesa el actual.
+
+    `cargado` es un SentenceTransformer ya cargado (torch) que se usa en lugar de cargar `modelo`,
+    p. ej. la `referencia` que dejó `verificar_paridad` al fallar.
+    """
+
+    def __init__(self, modelo=EMBEDDINGS_MODELO, backend=EMBEDDINGS_BACKEND, lote=EMBEDDINGS_LOTE,
+                 hilos=EMBEDDINGS_HILOS, archivo_onnx=EMBEDDINGS_ONNX_ARCHIVO, cargado=None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if hilos:
+            torch.set_num_threads(hilos)
+
+        kwargs = {}
+        if backend == "onnx":
+            import onnxruntime
+            opciones = onnxruntime.SessionOptions()
+            if hilos:
+                opciones.intra_op_num_threads = hilos
+            kwargs = {"backend": "onnx", "model_kwargs": {
+                "file_name": archivo_onnx, "provider": "CPUExecutionProvider", "session_options": opciones,
+            }}
+        elif backend != "torch":
+            raise ValueError(f"Backend de embeddings no válido: {backend}. Opciones: torch, onnx")
+
+        if cargado is not None and backend == "torch":
+            self.modelo = cargado
+        else:
+            inicio = time.perf_counter()
+            self.modelo = SentenceTransformer(modelo, device="cpu", **kwargs)
+            print(f"Motor de embeddings '{modelo}' ({backend}) cargado en {time.perf_counter() - inicio:.2f} s.")
+        self.nombre_modelo = modelo
+        self.backend = backend
+        self.lote = lote
+        self.referencia = None
+        self._tokenizador = ThreadPoolExecutor(max_workers=1)
+        self.textos = 0
+        self.segundos = 0.0
+
+    def _inferir(self, features):
+        import torch
+        with torch.inference_mode():
+            return self.modelo(features)["sentence_embedding"].float().cpu().numpy()
+
+    def __call__(self, textos):
+        textos = list(textos)
+        if not textos:
+            return []
+        inicio = time.perf_counter()
+
+        orden = sorted(range(len(textos)), key=lambda i: len(textos[i]))
+        lotes = [[textos[i] for i in orden[desde:desde + self.lote]] for desde in range(0, len(orden), self.lote)]
+
+        vectores = []
+        futuro = self._tokenizador.submit(self.modelo.tokenize, lotes[0])
+        for k in range(len(lotes)):
+            features = futuro.result()
+            if k + 1 < len(lotes):
+                futuro = self._tokenizador.submit(self.modelo.tokenize, lotes[k + 1])
+            vectores.extend(self._inferir(features))
+
+        resultados = [None] * len(textos)
+        for posicion, vector in zip(orden, vectores):
+            resultados[posicion] = np.asarray(vector, dtype=np.float32)
+
+        self.textos += len(textos)
+        self.segundos += time.perf_counter() - inicio
+        return resultados
+
+    def verificar_paridad(self, textos, umbral=EMBEDDINGS_UMBRAL_PARIDAD, referencia=None):
+        """
+        Compara contra el modelo original (el de las consultas) la similitud coseno de cada texto.
+        `referencia` es ese modelo si ya está cargado; si no, se carga aquí y, solo si la paridad falla,
+        queda en `self.referencia` para crear el motor torch sin volver a cargarlo
+        """
+        from sentence_transformers import SentenceTransformer
+
+        if referencia is None:
+            referencia = self.modelo if self.backend == "torch" else SentenceTransformer(self.nombre_modelo, device="cpu")
+        esperados = referencia.encode(list(textos), convert_to_numpy=True)
+        obtenidos = np.stack(self(textos))
+        similitudes = np.sum(esperados * obtenidos, axis=1) / (
+            np.linalg.norm(esperados, axis=1) * np.linalg.norm(obtenidos, axis=1))
+        ok = bool(similitudes.min() >= umbral)
+        self.referencia = None if ok else referencia
+        return {
+            "textos": len(textos),
+            "similitud_min": round(float(similitudes.min()), 5),
+            "similitud_media": round(float(similitudes.mean()), 5),
+            "umbral": umbral,
+            "ok": ok,
+        }
+
+    def estadisticas(self):
+        return {
+            "backend": self.backend,
+            "textos": self.textos,
+            "textos_por_segundo": round(self.textos / self.segundos, 1) if self.segundos else 0.0,
+        }
+
+def main():
+    """Compara el rendimiento de ambos backends y la paridad del ONNX cuantizado"""
+    if len(sys.argv) > 1:
+        from process_data import extract_pdf_texts, token_split
+        textos = token_split(extract_pdf_texts(sys.argv[1]))
+    else:
+        textos = [f"Las plantas son seres vivos que necesitan agua, luz y aire para crecer. Ejemplo {i}." * (1 + i % 4)
+                  for i in range(512)]
+    cantidad = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    textos = textos[:cantidad]
+    print(f"{len(textos)} textos, lote {EMBEDDINGS_LOTE}, hilos {EMBEDDINGS_HILOS or 'por defecto'}")
+
+    referencia = None
+    for backend in ["torch", "onnx"]:
+        motor = MotorEmbeddings(backend=backend)
+        motor(textos[:EMBEDDINGS_LOTE])  # calentamiento
+        motor.textos, motor.segundos = 0, 0.0
+        motor(textos)
+        print(f"[{backend}] {motor.estadisticas()['textos_por_segundo']} textos/s")
+        if backend == "torch":
+            referencia = motor.modelo
+        else:
+            print(f"[{backend}] paridad: {motor.verificar_paridad(textos[:128], referencia=referencia)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# perfil_arranque.py
+# Mide el costo de arranque de la API: el import de api.api (lo que paga cada worker de gunicorn
+# antes de atender) y, por separado, la inicialización de los componentes RAG, que ahora es diferida.
+# Uso (desde la raíz del proyecto): python rag/perfil_arranque.py [top_n]
+import os
+import sys
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def medir_importtime(codigo):
+    """Ejecuta `codigo` con -X importtime en un proceso nuevo y devuelve [(cumulativo_us, modulo)]"""
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        print(proceso.stderr[-2000:])
+        raise SystemExit(f"Falló la ejecución de: {codigo}")
+
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, _, datos = linea.partition(":")
+        _, cumulativo, modulo = datos.split("|")
+        # La indentación del nombre indica el nivel de anidamiento; se conserva (sin el espacio separador)
+        modulos.append((int(cumulativo), modulo[1:].rstrip()))
+    return modulos
+
+def medir_segundos(codigo):
+    """Tiempo total (s) de un proceso nuevo que ejecuta `codigo` e imprime su propio cronómetro"""
+    proceso = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        print(proceso.stderr[-2000:])
+        raise SystemExit(f"Falló la ejecución de: {codigo}")
+    return float(proceso.stdout.strip().splitlines()[-1])
+
+def main():
+    top_n = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+
+    print("=== Import de api.api (arranque de cada worker) ===")
+    modulos = medir_importtime("import api.api")
+    total_api = max(cumulativo for cumulativo, _ in modulos)
+    print(f"Tiempo total de import: {total_api / 1e6:.2f} s")
+    print(f"Top {top_n} módulos de primer nivel por tiempo acumulado:")
+    primer_nivel = [(c, m) for c, m in modulos if not m.startswith(" ")]
+    for cumulativo, modulo in sorted(primer_nivel, reverse=True)[:top_n]:
+        print(f"  {cumulativo / 1e6:8.3f} s  {modulo}")
+
+    print("\n=== Inicialización diferida de RAG (primer uso o precalentamiento) ===")
+    tiempo_rag = medir_segundos(
+        "import sys, time; sys.path.insert(0, 'rag'); "
+        "import execute_rag; inicio = time.perf_counter(); "
+        "execute_rag.obtener_componentes_rag(); execute_rag.recargar_colecciones(); "
+        "print(time.perf_counter() - inicio)"
+    )
+    print(f"Tiempo de obtener_componentes_rag() + registro de colecciones: {tiempo_rag:.2f} s")
+
+    print("\n=== Resumen ===")
+    print(f"Arranque del worker ahora:                {total_api / 1e6:.2f} s")
+    print(f"Arranque con inicialización eager previa: {total_api / 1e6 + tiempo_rag:.2f} s")
+    print(f"Ahorro en el arranque de cada worker:     {tiempo_rag:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 # process_data.py
 import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from langchain.text_splitter import RecursiveCharacterTextSplitter, SentenceTransformersTokenTextSplitter
 from dotenv import load_dotenv, find_dotenv
 import os
+import time
+import queue
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from loaders import CustomPDFLoader
+from bm25 import IndiceBM25, ruta_indice
+from colecciones import RAG_ALMACENAMIENTO, COLECCION_UNIFICADA, generate_collection_name, metadata_chunk
+from motor_embeddings import MotorEmbeddings, EMBEDDINGS_UMBRAL_PARIDAD
+from manifiesto import hash_archivo, digest_chunk, ids_por_contenido, ruta_manifiesto, cargar_manifiesto, guardar_manifiesto
+from splitter import fragmentar_caracteres_por_ventana
 
 # Cargar las variables de entorno
 load_dotenv(find_dotenv())
@@ -21,6 +30,23 @@ for area in AREAS:
         PDF_PATHS.append(pdf_path)
 
 CHROMA_DIR = "../chroma_storage"  
+BM25_DIR = "../bm25_storage"  # índices léxicos, uno por colección
+MANIFIESTOS_DIR = "../manifiestos"  # ids de chunks y hash de cada PDF indexado
+
+# Ingesta paralela: parseo y fragmentación en procesos, embeddings en lotes en el proceso principal
+INGESTA_PROCESOS = int(os.getenv("INGESTA_PROCESOS", str(os.cpu_count() or 1)))
+INGESTA_LOTE_EMBEDDINGS = int(os.getenv("INGESTA_LOTE_EMBEDDINGS", "256"))  # el motor lo parte en lotes de EMBEDDINGS_LOTE
+# Lotes de chunks ya fragmentados que esperan los embeddings; con la cola llena los procesos se detienen
+INGESTA_LOTES_EN_VUELO = int(os.getenv("INGESTA_LOTES_EN_VUELO", str(2 * max(INGESTA_PROCESOS, 1))))
+# Lectura de los PDF: "memory" (copia completa en memoria), "path" o "mmap" (lectura perezosa); ver loaders.py
+INGESTA_LECTURA_PDF = os.getenv("INGESTA_LECTURA_PDF", "memory")
+# "legacy": caracteres y luego tokens (dos tokenizaciones); "tokens": una sola pasada por tokens (splitter.py).
+# Cambiar de fragmentador cambia el texto de los chunks y, con él, sus ids: la siguiente ejecución reindexa todo
+INGESTA_SPLITTER = os.getenv("INGESTA_SPLITTER", "legacy")
+INGESTA_SOLAPAMIENTO_TOKENS = int(os.getenv("INGESTA_SOLAPAMIENTO_TOKENS", "0"))  # solo con INGESTA_SPLITTER=tokens
+# Caracteres de páginas acumulados antes de fragmentar (la fragmentación avanza página a página)
+VENTANA_FRAGMENTACION = int(os.getenv("INGESTA_VENTANA_FRAGMENTACION", "20000"))
+INGESTA_LOTE_ESCRITURA = int(os.getenv("INGESTA_LOTE_ESCRITURA", "1000"))  # filas por llamada a Chroma
 
 # === FUNCIONES AUXILIARES ===
 
@@ -40,119 +66,480 @@ def extract_area_and_grade_from_path(pdf_path):
     else:
         raise ValueError(f"Formato de nombre de archivo no válido: {filename}")
 
-def generate_collection_name(area, grado):
-    """Genera un nombre de colección basado en área y grado"""
-    # Convertir a formato válido para nombres de colección
-    area_clean = area.lower().replace(' ', '_').replace('í', 'i').replace('á', 'a')
-    grado_clean = grado.lower().replace(' ', '_')
-    return f"data_{area_clean}_{grado_clean}"
-
-def extract_pdf_texts(pdf_path):
-    """Extrae texto de un solo archivo PDF"""
-    texts = []
+def iterar_paginas_pdf(pdf_path):
+    """Genera las páginas no vacías de un PDF como (número de página, texto), de a una"""
     if not os.path.exists(pdf_path):
         print(f"Advertencia: El archivo {pdf_path} no existe. Saltando...")
-        return texts
+        return
     
     print(f"Procesando PDF: {pdf_path}")
+    total = 0
     try:
-        loader = CustomPDFLoader(pdf_path)
-        documents = loader.load()
+        loader = CustomPDFLoader(pdf_path, read_mode=INGESTA_LECTURA_PDF)
         
         # Extraer el contenido de texto de cada documento
-        for doc in documents:
+        for i, doc in enumerate(loader.lazy_load()):
             if doc.page_content.strip():  # Verificar que el contenido no esté vacío
-                texts.append(doc.page_content.strip())
+                total += 1
+                yield doc.metadata.get('page', i) + 1, doc.page_content.strip()
             else:
                 print(f"Advertencia: Página vacía encontrada en {pdf_path}")
         
-        print(f"Total de páginas extraídas de {pdf_path}: {len(texts)}")
+        print(f"Total de páginas extraídas de {pdf_path}: {total}")
     except Exception as e:
         print(f"Error procesando {pdf_path}: {str(e)}")
-    
-    return texts
 
-def token_split(texts):
-    if not texts:
-        raise ValueError("La lista de textos está vacía, no se puede continuar con la fragmentación.")
-    
+def extract_pdf_pages(pdf_path):
+    """Extrae las páginas no vacías de un PDF como [(número de página, texto)]"""
+    return list(iterar_paginas_pdf(pdf_path))
+
+def extract_pdf_texts(pdf_path):
+    """Extrae texto de un solo archivo PDF"""
+    return [text for _, text in iterar_paginas_pdf(pdf_path)]
+
+_token_splitter = None
+
+def obtener_token_splitter():
+    """Un splitter por proceso: crearlo carga el tokenizer del modelo de embeddings"""
+    global _token_splitter
+    if _token_splitter is None:
+        _token_splitter = SentenceTransformersTokenTextSplitter(chunk_overlap=0, tokens_per_chunk=256)
+    return _token_splitter
+
+_divisor_tokens = None
+
+def obtener_divisor_tokens():
+    """Un divisor por proceso (INGESTA_SPLITTER=tokens); ver splitter.py"""
+    global _divisor_tokens
+    if _divisor_tokens is None:
+        from splitter import DivisorTokens
+        _divisor_tokens = DivisorTokens(max_tokens=256, solapamiento=INGESTA_SOLAPAMIENTO_TOKENS)
+    return _divisor_tokens
+
+def fragmentar_paginas(pages):
+    """Genera (chunk, página en la que empieza) a medida que llegan las páginas (número, texto)"""
+    if INGESTA_SPLITTER == "tokens":
+        for fragmento in obtener_divisor_tokens().dividir_paginas(pages):
+            yield fragmento.texto, fragmento.pagina
+    else:
+        yield from fragmentar_paginas_legacy(pages)
+
+def fragmentar_paginas_legacy(pages, ventana=VENTANA_FRAGMENTACION):
+    """
+    Fragmenta por caracteres (1000) y luego por tokens (256), como la fragmentación original.
+
+    En lugar de unir el libro completo en un solo string, la fragmentación por caracteres avanza
+    en ventanas de `ventana` caracteres (ver splitter.fragmentar_caracteres_por_ventana) con el
+    mismo resultado. La memoria queda acotada por la ventana, no por el libro.
+    """
     splitter = RecursiveCharacterTextSplitter(
         separators=["\n\n", "\n", ". ", " ", ""],
         chunk_size=1000,
-        chunk_overlap=0
+        chunk_overlap=0,
+        add_start_index=True
     )
-    joined_text = '\n\n'.join(texts)
-    character_split_texts = splitter.split_text(joined_text)
+    token_splitter = obtener_token_splitter()
+    for texto, pagina in fragmentar_caracteres_por_ventana(splitter, pages, ventana):
+        for chunk in token_splitter.split_text(texto):
+            yield chunk, pagina
 
-    if not character_split_texts:
-        raise ValueError("La fragmentación por caracteres produjo una lista vacía.")
-    
-    token_splitter = SentenceTransformersTokenTextSplitter(chunk_overlap=0, tokens_per_chunk=256)
-    token_split_texts = []
-    for t in character_split_texts:
-        token_split_texts += token_splitter.split_text(t)
+def token_split(texts):
+    token_split_texts, _ = token_split_con_paginas(enumerate(texts, start=1))
+    return token_split_texts
+
+def token_split_con_paginas(pages):
+    """Como token_split, pero devuelve también la página en la que empieza cada chunk"""
+    token_split_texts, paginas = [], []
+    for chunk, pagina in fragmentar_paginas(pages):
+        token_split_texts.append(chunk)
+        paginas.append(pagina)
 
     if not token_split_texts:
-        raise ValueError("La fragmentación por tokens produjo una lista vacía.")
+        raise ValueError("La fragmentación no produjo fragmentos: no hay texto para procesar.")
     
-    return token_split_texts
+    return token_split_texts, paginas
 
-# === INICIALIZAR CLIENTE CHROMA PERSISTENTE ===
+def construir_indice_bm25(collection_name, ids, documentos, directorio=BM25_DIR):
+    """Construye y persiste el índice BM25 de una colección a partir de sus chunks"""
+    indice = IndiceBM25.construir(ids, documentos)
+    indice.guardar(ruta_indice(directorio, collection_name))
+    print(f"Índice BM25 de {collection_name} guardado ({len(ids)} chunks, {len(indice.postings)} términos).")
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-embedding_function = SentenceTransformerEmbeddingFunction()
+def rss_max_mb(quien=resource.RUSAGE_SELF):
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(quien).ru_maxrss / 1024
 
-# === PROCESAMIENTO PRINCIPAL ===
+# === ETAPA 1: PARSEO Y FRAGMENTACIÓN (en el pool de procesos) ===
 
-def process_pdf_collection(pdf_path):
-    """Procesa un PDF individual y crea/actualiza su colección correspondiente"""
+def mensajes_pdf(pdf_path):
+    """
+    Extrae y fragmenta un PDF y genera sus chunks en lotes de hasta INGESTA_LOTE_EMBEDDINGS a medida que
+    se producen: ("lote", pdf_path, [(chunk, página)]) y al terminar ("fin", pdf_path, segundos de
+    preparación) o ("error", pdf_path, mensaje). No toca Chroma ni el modelo de embeddings
+    """
+    segundos, lote = 0.0, []
+    inicio = time.perf_counter()
     try:
-        # Extraer área y grado del nombre del archivo
-        area, grado = extract_area_and_grade_from_path(pdf_path)
-        collection_name = generate_collection_name(area, grado)
-        
-        print(f"\n=== Procesando {area} - {grado} ===")
-        print(f"Nombre de colección: {collection_name}")
-        
-        # Verificar si la colección ya existe
-        collection_names = [col.name for col in chroma_client.list_collections()]
-        
-        if collection_name in collection_names:
-            print(f"Colección existente encontrada: {collection_name}")
-            chroma_collection = chroma_client.get_collection(name=collection_name, embedding_function=embedding_function)
-            return chroma_collection
-        else:
-            print(f"Colección no encontrada. Procesando archivo PDF: {pdf_path}")
-            pdf_texts = extract_pdf_texts(pdf_path)
-            
-            if not pdf_texts:
-                print(f"No se extrajo texto del archivo {pdf_path}. Saltando...")
-                return None
-            
-            token_split_texts = token_split(pdf_texts)
-            ids = [str(i) for i in range(len(token_split_texts))]
-
-            chroma_collection = chroma_client.create_collection(name=collection_name, embedding_function=embedding_function)
-            chroma_collection.add(ids=ids, documents=token_split_texts)
-            print(f"Colección {collection_name} creada y almacenada persistentemente.")
-            return chroma_collection
-            
+        for chunk, pagina in fragmentar_paginas(iterar_paginas_pdf(pdf_path)):
+            lote.append((chunk, pagina))
+            if len(lote) >= INGESTA_LOTE_EMBEDDINGS:
+                segundos += time.perf_counter() - inicio
+                yield "lote", pdf_path, lote
+                inicio, lote = time.perf_counter(), []
+        segundos += time.perf_counter() - inicio
+        if lote:
+            yield "lote", pdf_path, lote
+        yield "fin", pdf_path, segundos
     except Exception as e:
-        print(f"Error procesando {pdf_path}: {str(e)}")
+        yield "error", pdf_path, str(e)
+
+def preparar_pdf(pdf_path, cola):
+    """Etapa 1 en un proceso del pool: envía los mensajes de `mensajes_pdf` por `cola`, que es acotada"""
+    for mensaje in mensajes_pdf(pdf_path):
+        # Si el proceso principal va atrasado (embeddings), el proceso espera aquí en vez de acumular chunks
+        cola.put(mensaje)
+
+def mensajes_pdfs(pendientes):
+    """
+    Mensajes de la etapa 1 de todos los PDFs pendientes, en el orden en que se producen. Con varios procesos
+    los lotes llegan por una cola de a lo sumo INGESTA_LOTES_EN_VUELO lotes
+    """
+    if INGESTA_PROCESOS <= 1 or len(pendientes) <= 1:
+        for pdf_path in pendientes:
+            yield from mensajes_pdf(pdf_path)
+        return
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=min(INGESTA_PROCESOS, len(pendientes))) as pool:
+        cola = manager.Queue(maxsize=INGESTA_LOTES_EN_VUELO)
+        futuros = {pool.submit(preparar_pdf, pdf_path, cola): pdf_path for pdf_path in pendientes}
+        activos = set(pendientes)
+        while activos:
+            try:
+                mensaje = cola.get(timeout=1.0)
+            except queue.Empty:
+                # Un proceso que terminó con error (p. ej. sin memoria) no enviará su "fin"
+                for futuro, pdf_path in futuros.items():
+                    if pdf_path in activos and futuro.done() and futuro.exception() is not None:
+                        activos.discard(pdf_path)
+                        yield "error", pdf_path, str(futuro.exception())
+                continue
+            if mensaje[0] != "lote":
+                activos.discard(mensaje[1])
+            yield mensaje
+
+# === DESTINO Y DIFERENCIAS CON LO YA INDEXADO ===
+
+def destino_pdf(chroma_client, collection_name, crear=False):
+    """
+    (colección de Chroma o None si no existe, directorio BM25, directorio de manifiestos) según el modo.
+    La colección se abre sin función de embeddings: la ingesta calcula los vectores con el motor y
+    las consultas (execute_rag.py) la abren con la suya
+    """
+    if RAG_ALMACENAMIENTO == "unificada":
+        nombre = COLECCION_UNIFICADA
+        directorio_bm25 = os.path.join(BM25_DIR, COLECCION_UNIFICADA)
+        directorio_manifiestos = os.path.join(MANIFIESTOS_DIR, COLECCION_UNIFICADA)
+    else:
+        nombre = collection_name
+        directorio_bm25 = BM25_DIR
+        directorio_manifiestos = MANIFIESTOS_DIR
+
+    if crear:
+        chroma_collection = chroma_client.get_or_create_collection(name=nombre, embedding_function=None)
+    elif nombre in [getattr(col, "name", col) for col in chroma_client.list_collections()]:
+        chroma_collection = chroma_client.get_collection(name=nombre, embedding_function=None)
+    else:
+        chroma_collection = None
+    return chroma_collection, directorio_bm25, directorio_manifiestos
+
+def pdf_pendiente(chroma_client, pdf_path):
+    """
+    Devuelve el SHA-256 del PDF si hay que (re)indexarlo, o None si no cambió desde la última
+    indexación según su manifiesto. Para los que no cambiaron y no tienen índice BM25
+    (creados antes de la búsqueda híbrida) lo construye desde Chroma
+    """
+    if not os.path.exists(pdf_path):
+        print(f"Advertencia: El archivo {pdf_path} no existe. Saltando...")
         return None
 
-# Procesar todos los PDFs
-print("=== INICIANDO PROCESAMIENTO DE TODOS LOS PDFs ===")
-collections_created = []
+    area, grado = extract_area_and_grade_from_path(pdf_path)
+    collection_name = generate_collection_name(area, grado)
+    sha256 = hash_archivo(pdf_path)
+    chroma_collection, directorio_bm25, directorio_manifiestos = destino_pdf(chroma_client, collection_name)
+    manifiesto = cargar_manifiesto(ruta_manifiesto(directorio_manifiestos, os.path.basename(pdf_path)))
+
+    if chroma_collection is None or manifiesto is None or manifiesto["sha256"] != sha256:
+        return sha256
+
+    print(f"{pdf_path} sin cambios desde la última indexación ({len(manifiesto['ids'])} chunks en {chroma_collection.name}).")
+    if not os.path.exists(ruta_indice(directorio_bm25, collection_name)):
+        contenido = chroma_collection.get(ids=manifiesto["ids"], include=["documents"])
+        construir_indice_bm25(collection_name, contenido["ids"], contenido["documents"], directorio_bm25)
+    return None
+
+def iniciar_documento(chroma_client, pdf_path, sha256):
+    """
+    Estado de la ingesta de un PDF, creado al llegar su primer lote. `anteriores` son los ids indexados
+    para el PDF en la ejecución anterior; los que no vuelvan a aparecer se borran al final
+    """
+    area, grado = extract_area_and_grade_from_path(pdf_path)
+    collection_name = generate_collection_name(area, grado)
+    source = os.path.basename(pdf_path)
+    chroma_collection, directorio_bm25, directorio_manifiestos = destino_pdf(chroma_client, collection_name, crear=True)
+    manifiesto = cargar_manifiesto(ruta_manifiesto(directorio_manifiestos, source))
+
+    if manifiesto is not None:
+        anteriores = manifiesto["ids"]
+    elif RAG_ALMACENAMIENTO == "unificada":
+        anteriores = chroma_collection.get(where={"source": source}, include=[])["ids"]
+    else:
+        anteriores = chroma_collection.get(include=[])["ids"]
+
+    return {
+        "pdf_path": pdf_path, "sha256": sha256, "area": area, "grado": grado, "source": source,
+        "collection_name": collection_name, "coleccion": chroma_collection,
+        "directorio_bm25": directorio_bm25, "directorio_manifiestos": directorio_manifiestos,
+        "anteriores": anteriores,
+        "por_hash": None,  # hash del texto -> id indexado, para reutilizar embeddings (se arma al necesitarlo)
+        # Lo único que crece con el libro: los ids (para el manifiesto y los borrados) y el índice BM25
+        "ids": [], "vistos": {}, "indice": IndiceBM25(),
+        "faltantes": 0, "preparado": False,
+        "nuevos": 0, "reutilizados": 0, "sin_cambios": 0, "eliminados": 0,
+    }
+
+def reutilizar_embeddings(doc, chunks):
+    """
+    Embeddings ya indexados para textos iguales a `chunks` (None donde no hay), p. ej. de colecciones
+    antiguas con ids posicionales. La primera vez recorre lo indexado para el PDF por páginas de
+    INGESTA_LOTE_ESCRITURA y guarda solo el hash de cada texto
+    """
+    if not chunks or not doc["anteriores"]:
+        return [None] * len(chunks)
+    if doc["por_hash"] is None:
+        doc["por_hash"] = {}
+        for desde in range(0, len(doc["anteriores"]), INGESTA_LOTE_ESCRITURA):
+            contenido = doc["coleccion"].get(ids=doc["anteriores"][desde:desde + INGESTA_LOTE_ESCRITURA], include=["documents"])
+            for id_chunk, texto in zip(contenido["ids"], contenido["documents"]):
+                doc["por_hash"].setdefault(digest_chunk(texto), id_chunk)
+
+    ids_anteriores = [doc["por_hash"].get(digest_chunk(chunk)) for chunk in chunks]
+    buscados = [id_chunk for id_chunk in ids_anteriores if id_chunk is not None]
+    if not buscados:
+        return [None] * len(chunks)
+    contenido = doc["coleccion"].get(ids=buscados, include=["embeddings"])
+    por_id = dict(zip(contenido["ids"], contenido["embeddings"]))
+    return [por_id.get(id_chunk) if id_chunk is not None else None for id_chunk in ids_anteriores]
+
+def procesar_lote(doc, lote):
+    """
+    Compara un lote de chunks con lo indexado: actualiza la metadata de los que ya están (su página puede
+    haberse movido), escribe los nuevos cuyo embedding se puede reutilizar y devuelve el resto, que hay
+    que embeber, como [(id, chunk, metadata)]
+    """
+    chunks = [chunk for chunk, _ in lote]
+    ids = ids_por_contenido(doc["collection_name"], chunks, doc["vistos"])
+    metadatas = [metadata_chunk(doc["area"], doc["grado"], doc["source"], pagina) for _, pagina in lote]
+    doc["ids"].extend(ids)
+    for id_chunk, chunk in zip(ids, chunks):
+        doc["indice"].agregar(id_chunk, chunk)
+
+    chroma_collection = doc["coleccion"]
+    presentes = set(chroma_collection.get(ids=ids, include=[])["ids"])
+    sin_cambios = [j for j, id_chunk in enumerate(ids) if id_chunk in presentes]
+    nuevos = [j for j, id_chunk in enumerate(ids) if id_chunk not in presentes]
+    if sin_cambios:
+        chroma_collection.update(ids=[ids[j] for j in sin_cambios], metadatas=[metadatas[j] for j in sin_cambios])
+    doc["sin_cambios"] += len(sin_cambios)
+    doc["nuevos"] += len(nuevos)
+
+    embeddings = reutilizar_embeddings(doc, [chunks[j] for j in nuevos])
+    reutilizados = [(j, embedding) for j, embedding in zip(nuevos, embeddings) if embedding is not None]
+    if reutilizados:
+        chroma_collection.upsert(ids=[ids[j] for j, _ in reutilizados], documents=[chunks[j] for j, _ in reutilizados],
+                                 embeddings=[embedding for _, embedding in reutilizados], metadatas=[metadatas[j] for j, _ in reutilizados])
+        doc["reutilizados"] += len(reutilizados)
+    return [(ids[j], chunks[j], metadatas[j]) for j, embedding in zip(nuevos, embeddings) if embedding is None]
+
+# === ETAPA 3: ESCRITURA EN CHROMA (serializada en el proceso principal) ===
+
+def escribir_embebidos(doc, filas, vectores):
+    """Upsert de chunks nuevos [(id, chunk, metadata)] con sus embeddings"""
+    doc["coleccion"].upsert(ids=[id_chunk for id_chunk, _, _ in filas], documents=[chunk for _, chunk, _ in filas],
+                            embeddings=list(vectores), metadatas=[metadata for _, _, metadata in filas])
+
+def finalizar_documento(doc):
+    """
+    Con todos los chunks del PDF escritos: borra los que ya no aparecen, guarda el índice BM25 y el
+    manifiesto. Devuelve el nombre procesado
+    """
+    actuales = set(doc["ids"])
+    eliminados = [id_chunk for id_chunk in doc["anteriores"] if id_chunk not in actuales]
+    for desde in range(0, len(eliminados), INGESTA_LOTE_ESCRITURA):
+        doc["coleccion"].delete(ids=eliminados[desde:desde + INGESTA_LOTE_ESCRITURA])
+    doc["eliminados"] = len(eliminados)
+
+    print(f"{doc['source']} -> {doc['coleccion'].name}: {doc['nuevos']} chunks nuevos "
+          f"({doc['reutilizados']} con embedding reutilizado), {doc['sin_cambios']} sin cambios, {len(eliminados)} eliminados.")
+    indice = doc["indice"]
+    indice.guardar(ruta_indice(doc["directorio_bm25"], doc["collection_name"]))
+    print(f"Índice BM25 de {doc['collection_name']} guardado ({len(indice.ids)} chunks, {len(indice.postings)} términos).")
+    # El manifiesto va al final: si algo falla antes, la próxima ejecución vuelve a comparar
+    guardar_manifiesto(ruta_manifiesto(doc["directorio_manifiestos"], doc["source"]), doc["source"], doc["sha256"], doc["coleccion"].name, doc["ids"])
+    return doc["collection_name"]
+
+# === PROCESAMIENTO PRINCIPAL ===
+
+def main():
+    inicio_total = time.perf_counter()
+    chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+    # Los embeddings de la ingesta los calcula el motor (ver motor_embeddings.py): es el único modelo cargado
+    motor = {"actual": MotorEmbeddings(), "paridad_verificada": False}
+
+    print("=== INICIANDO PROCESAMIENTO DE TODOS LOS PDFs ===")
+    print(f"Modo de almacenamiento: {RAG_ALMACENAMIENTO}, procesos: {INGESTA_PROCESOS}, lote de embeddings: {INGESTA_LOTE_EMBEDDINGS}")
+    collections_created = []
+    pendientes = {}  # pdf_path -> sha256
+    for pdf_path in PDF_PATHS:
+        try:
+            sha256 = pdf_pendiente(chroma_client, pdf_path)
+            if sha256 is not None:
+                pendientes[pdf_path] = sha256
+            elif os.path.exists(pdf_path):
+                collections_created.append(generate_collection_name(*extract_area_and_grade_from_path(pdf_path)))
+        except Exception as e:
+            print(f"Error procesando {pdf_path}: {str(e)}")
+
+    # Los chunks llegan en lotes desde la etapa 1 y se embeben en lotes compartidos por todos los PDFs;
+    # cada lote embebido se escribe enseguida. En memoria quedan a lo sumo los lotes en vuelo y la cola
+    # de embeddings, no el libro completo. Un documento se cierra (borrados, BM25, manifiesto) cuando
+    # llegó su último lote y todos sus chunks nuevos están escritos
+    documentos = {}  # pdf_path -> estado de la ingesta (ver iniciar_documento)
+    fallidos = set()
+    cola = []  # (documento, (id, chunk, metadata)) pendientes de embedding
+    segundos = {"preparacion": 0.0, "embeddings": 0.0, "escritura": 0.0}
+    conteos = {"embebidos": 0, "reutilizados": 0, "sin_cambios": 0, "eliminados": 0}
+
+    def descartar(pdf_path, error):
+        """Un PDF con error no se cierra: sin borrados ni manifiesto, la próxima ejecución lo vuelve a comparar"""
+        print(f"Error procesando {pdf_path}: {error}")
+        fallidos.add(pdf_path)
+        documentos.pop(pdf_path, None)
+        cola[:] = [(doc, fila) for doc, fila in cola if doc["pdf_path"] != pdf_path]
+
+    def finalizar(doc):
+        inicio = time.perf_counter()
+        try:
+            collections_created.append(finalizar_documento(doc))
+            conteos["reutilizados"] += doc["reutilizados"]
+            conteos["sin_cambios"] += doc["sin_cambios"]
+            conteos["eliminados"] += doc["eliminados"]
+            documentos.pop(doc["pdf_path"], None)
+        except Exception as e:
+            descartar(doc["pdf_path"], f"al almacenar: {str(e)}")
+        segundos["escritura"] += time.perf_counter() - inicio
+
+    def embeber(forzar=False):
+        while len(cola) >= INGESTA_LOTE_EMBEDDINGS or (forzar and cola):
+            lote, cola[:] = cola[:INGESTA_LOTE_EMBEDDINGS], cola[INGESTA_LOTE_EMBEDDINGS:]
+            textos = [chunk for _, (_, chunk, _) in lote]
+
+            # El backend ONNX cuantizado se valida con los primeros chunks reales; si no alcanza
+            # la paridad con el modelo de las consultas se vuelve al backend original
+            if not motor["paridad_verificada"]:
+                motor["paridad_verificada"] = True
+                if motor["actual"].backend != "torch":
+                    paridad = motor["actual"].verificar_paridad(textos[:128])
+                    print(f"Paridad del backend {motor['actual'].backend}: {paridad}")
+                    if not paridad["ok"]:
+                        print(f"Similitud mínima por debajo de {EMBEDDINGS_UMBRAL_PARIDAD}; se usa el backend torch.")
+                        # El modelo de referencia de la verificación pasa a ser el motor: no se carga otra vez
+                        motor["actual"] = MotorEmbeddings(backend="torch", cargado=motor["actual"].referencia)
+
+            inicio = time.perf_counter()
+            vectores = motor["actual"](textos)
+            segundos["embeddings"] += time.perf_counter() - inicio
+            conteos["embebidos"] += len(lote)
+
+            por_documento = {}
+            for (doc, fila), vector in zip(lote, vectores):
+                por_documento.setdefault(doc["pdf_path"], (doc, [], []))
+                por_documento[doc["pdf_path"]][1].append(fila)
+                por_documento[doc["pdf_path"]][2].append(vector)
+
+            inicio = time.perf_counter()
+            for pdf_path, (doc, filas, vectores_doc) in por_documento.items():
+                if pdf_path in fallidos:
+                    continue
+                try:
+                    escribir_embebidos(doc, filas, vectores_doc)
+                except Exception as e:
+                    descartar(pdf_path, f"al almacenar: {str(e)}")
+                    continue
+                doc["faltantes"] -= len(filas)
+            segundos["escritura"] += time.perf_counter() - inicio
+
+            for doc, _, _ in por_documento.values():
+                if doc["pdf_path"] not in fallidos and doc["preparado"] and doc["faltantes"] == 0:
+                    finalizar(doc)
+
+    def recibir(mensaje):
+        tipo, pdf_path, contenido = mensaje
+        if pdf_path in fallidos:
+            return
+        if tipo == "error":
+            descartar(pdf_path, contenido)
+            return
+
+        doc = documentos.get(pdf_path)
+        if tipo == "fin":
+            segundos["preparacion"] += contenido
+            if doc is None:
+                print(f"No se extrajo texto del archivo {pdf_path}. Saltando...")
+                return
+            doc["preparado"] = True
+            if doc["faltantes"] == 0:
+                finalizar(doc)
+            return
+
+        inicio = time.perf_counter()
+        try:
+            if doc is None:
+                doc = documentos[pdf_path] = iniciar_documento(chroma_client, pdf_path, pendientes[pdf_path])
+            por_embeber = procesar_lote(doc, contenido)
+        except Exception as e:
+            descartar(pdf_path, str(e))
+            return
+        finally:
+            segundos["escritura"] += time.perf_counter() - inicio
+        doc["faltantes"] += len(por_embeber)
+        cola.extend((doc, fila) for fila in por_embeber)
+        embeber()
+
+    inicio_pipeline = time.perf_counter()
+    for mensaje in mensajes_pdfs(list(pendientes)):
+        recibir(mensaje)
+    embeber(forzar=True)
+    segundos_pipeline = time.perf_counter() - inicio_pipeline
+
+    print(f"\n=== RESUMEN ===")
+    print(f"Colecciones procesadas/creadas: {len(collections_created)}")
+    for collection_name in collections_created:
+        print(f"- {collection_name}")
 
-for pdf_path in PDF_PATHS:
-    collection = process_pdf_collection(pdf_path)
-    if collection:
-        collections_created.append(collection.name)
+    print(f"\nPDFs nuevos o modificados en esta ejecución: {len(pendientes)}")
+    print(f"Chunks embebidos: {conteos['embebidos']}, con embedding reutilizado: {conteos['reutilizados']}, "
+          f"sin cambios: {conteos['sin_cambios']}, eliminados: {conteos['eliminados']}")
+    print(f"Tiempo total: {time.perf_counter() - inicio_total:.1f} s (pipeline {segundos_pipeline:.1f} s)")
+    print(f"  Parseo y fragmentación (suma de los procesos): {segundos['preparacion']:.1f} s")
+    print(f"  Embeddings: {segundos['embeddings']:.1f} s ({motor['actual'].estadisticas()})")
+    print(f"  Escritura en Chroma y BM25: {segundos['escritura']:.1f} s")
+    if segundos_pipeline > 0:
+        # Con INGESTA_PROCESOS=1 todas las etapas se ejecutan una tras otra
+        secuencial = sum(segundos.values())
+        print(f"  Aceleración estimada frente a la ejecución secuencial: {secuencial / segundos_pipeline:.2f}x")
+    print(f"RSS máximo: proceso principal {rss_max_mb():.0f} MB, procesos del pool {rss_max_mb(resource.RUSAGE_CHILDREN):.0f} MB")
 
-print(f"\n=== RESUMEN ===")
-print(f"Colecciones procesadas/creadas: {len(collections_created)}")
-for collection_name in collections_created:
-    print(f"- {collection_name}")
+    print("\nProcesamiento completado.")
 
-print("\nProcesamiento completado.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# rerank.py
+import os
+import time
+import threading
+
+# === CONFIGURACIÓN ===
+RAG_RERANK = os.getenv("RAG_RERANK", "0") == "1"
+# Multilingüe: los libros y las queries están en español
+RAG_RERANK_MODELO = os.getenv("RAG_RERANK_MODELO", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RAG_RERANK_CANDIDATOS = int(os.getenv("RAG_RERANK_CANDIDATOS", "30"))  # chunks recuperados antes de reordenar
+RAG_RERANK_PRESUPUESTO_MS = float(os.getenv("RAG_RERANK_PRESUPUESTO_MS", "400"))  # por llamada (todas las queries del lote)
+
+class Reranker:
+    """
+    Reordena candidatos con un cross-encoder en CPU, en una sola pasada por lote de queries.
+
+    El costo se estima con un promedio móvil exponencial de los ms por par (query, chunk) observados;
+    si la estimación supera `presupuesto_ms`, se omite el reordenamiento y se conserva el orden original.
+    La primera llamada siempre se ejecuta, porque aún no hay estimación. Cada omisión rebaja la estimación
+    un poco, de modo que un pico pasajero (p. ej. CPU saturada) no deje el reordenamiento apagado para siempre.
+    """
+
+    def __init__(self, modelo=RAG_RERANK_MODELO, presupuesto_ms=RAG_RERANK_PRESUPUESTO_MS, alfa=0.2):
+        from sentence_transformers import CrossEncoder
+
+        inicio = time.perf_counter()
+        self.nombre_modelo = modelo
+        self.modelo = CrossEncoder(modelo, device="cpu")
+        print(f"Cross-encoder '{modelo}' cargado en {time.perf_counter() - inicio:.2f} s.")
+        self.presupuesto_ms = presupuesto_ms
+        self.alfa = alfa
+        self.ms_por_par = None
+        self._lock = threading.Lock()
+        self.reordenados = 0
+        self.omitidos = 0
+
+    def estimar_ms(self, pares):
+        return None if self.ms_por_par is None else pares * self.ms_por_par
+
+    def reordenar_lote(self, consultas):
+        """
+        `consultas` es una lista de (query, [documentos]). Devuelve, para cada consulta, las posiciones
+        de sus documentos ordenadas por relevancia, o None si se omitió por el presupuesto
+        """
+        pares = [(query, documento) for query, documentos in consultas for documento in documentos]
+        if not pares:
+            return [list(range(len(documentos))) for _, documentos in consultas]
+
+        estimado = self.estimar_ms(len(pares))
+        if estimado is not None and estimado > self.presupuesto_ms:
+            with self._lock:
+                self.omitidos += 1
+                self.ms_por_par *= (1 - self.alfa)
+            print(f"[RERANK] Omitido: {len(pares)} pares estimados en {estimado:.0f} ms (presupuesto {self.presupuesto_ms:.0f} ms)")
+            return None
+
+        inicio = time.perf_counter()
+        puntajes = self.modelo.predict(pares)
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        with self._lock:
+            observado = duracion_ms / len(pares)
+            self.ms_por_par = observado if self.ms_por_par is None else self.alfa * observado + (1 - self.alfa) * self.ms_por_par
+            self.reordenados += 1
+
+        ordenes, desde = [], 0
+        for _, documentos in consultas:
+            propios = puntajes[desde:desde + len(documentos)]
+            ordenes.append(sorted(range(len(documentos)), key=lambda j: propios[j], reverse=True))
+            desde += len(documentos)
+        return ordenes
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "modelo": self.nombre_modelo,
+                "reordenados": self.reordenados,
+                "omitidos": self.omitidos,
+                "ms_por_par": round(self.ms_por_par, 3) if self.ms_por_par is not None else None,
+                "presupuesto_ms": self.presupuesto_ms,
+            }
@@ -0,0 +1,200 @@
+# splitter.py
+# Fragmentación por tokens en una sola pasada: cada página se tokeniza una vez (en lotes) con el
+# tokenizer del modelo de chunks, y los cortes se buscan sobre el texto original con los offsets de
+# cada token, respetando la misma jerarquía de separadores que RecursiveCharacterTextSplitter.
+# También la fragmentación por caracteres en ventanas que usa el fragmentador "legacy" de process_data.py.
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+# El tokenizer de SentenceTransformersTokenTextSplitter (chunks de 256 tokens en process_data.py)
+TOKENIZER_CHUNKS = "sentence-transformers/all-mpnet-base-v2"
+SEPARADORES = ["\n\n", "\n", ". ", " "]
+
+# Offsets de caracteres en el texto del PDF (páginas unidas con '\n\n') y de tokens en la secuencia completa
+Fragmento = namedtuple("Fragmento", ["texto", "pagina", "inicio_char", "fin_char", "inicio_token", "fin_token"])
+
+class DivisorTokens:
+    """
+    Genera chunks de a lo sumo `max_tokens` tokens a partir de páginas (número, texto) que llegan en streaming.
+
+    Para cada ventana de `max_tokens` tokens se corta en la última aparición del separador de mayor
+    jerarquía ('\\n\\n', luego '\\n', '. ', ' '); si no hay ninguno se corta en el límite de tokens.
+    Con `solapamiento` > 0 cada chunk repite los últimos tokens del anterior (si el chunk anterior es
+    más corto que el solapamiento, no se repite nada) y siempre aporta al menos un token nuevo. Los
+    chunks son porciones del texto original (no texto decodificado), sin espacios en los extremos, con
+    sus offsets de caracteres y de tokens.
+
+    `tokenizer` es el nombre de un modelo de Hugging Face o un tokenizer ya cargado (cualquier objeto
+    que, como los de transformers, devuelva `offset_mapping` al llamarlo con `return_offsets_mapping=True`).
+    """
+
+    def __init__(self, max_tokens=256, solapamiento=0, separadores=SEPARADORES, lote_paginas=32, tokenizer=TOKENIZER_CHUNKS):
+        if solapamiento >= max_tokens:
+            raise ValueError("El solapamiento debe ser menor que max_tokens.")
+        if isinstance(tokenizer, str):
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.solapamiento = solapamiento
+        self.separadores = separadores
+        self.lote_paginas = lote_paginas
+
+    def dividir_paginas(self, pages):
+        """Genera un Fragmento por chunk; la página es aquella en la que empieza el chunk"""
+        estado = {
+            "texto": "",       # texto pendiente; su primer carácter está en el offset global `base`
+            "base": 0,
+            "largo": 0,        # largo total del documento recibido hasta ahora
+            "inicios": [],     # offsets globales (inicio, fin) de los tokens pendientes
+            "fines": [],
+            "token_base": 0,   # índice global del primer token pendiente
+            "solapados": 0,    # tokens pendientes que ya salieron en el chunk anterior
+            "paginas_inicio": [],
+            "paginas_numero": [],
+        }
+
+        lote = []
+        for pagina in pages:
+            lote.append(pagina)
+            if len(lote) >= self.lote_paginas:
+                self._agregar(estado, lote)
+                lote = []
+                yield from self._emitir(estado, final=False)
+        if lote:
+            self._agregar(estado, lote)
+        yield from self._emitir(estado, final=True)
+
+    def dividir_textos(self, texts):
+        """Como dividir_paginas para una lista de textos (numerados desde 1)"""
+        return self.dividir_paginas(enumerate(texts, start=1))
+
+    def _agregar(self, estado, lote):
+        """Tokeniza un lote de páginas en una sola llamada y las agrega al estado"""
+        codificado = self.tokenizer([texto for _, texto in lote], add_special_tokens=False,
+                                    return_offsets_mapping=True, return_attention_mask=False)
+        partes = [estado["texto"]]
+        for (numero, texto), offsets in zip(lote, codificado["offset_mapping"]):
+            separador = "\n\n" if estado["paginas_inicio"] else ""
+            inicio_pagina = estado["largo"] + len(separador)
+            partes += [separador, texto]
+            estado["largo"] = inicio_pagina + len(texto)
+            estado["paginas_inicio"].append(inicio_pagina)
+            estado["paginas_numero"].append(numero)
+            for inicio, fin in offsets:
+                estado["inicios"].append(inicio_pagina + inicio)
+                estado["fines"].append(inicio_pagina + fin)
+        estado["texto"] = "".join(partes)
+
+    def _corte(self, estado, ventana):
+        """
+        Offset global donde cortar la ventana de tokens [0, ventana) de los pendientes. El corte queda
+        después del primer token nuevo: un separador dentro del solapamiento repetiría el chunk anterior
+        """
+        inicio_char = estado["inicios"][0]
+        limite_char = estado["inicios"][ventana]  # primer token que no entra
+        minimo_char = estado["inicios"][estado["solapados"]]  # primer token nuevo
+        base = estado["base"]
+        texto_ventana = estado["texto"][inicio_char - base:limite_char - base]
+        for separador in self.separadores:
+            posicion = texto_ventana.rfind(separador)
+            if posicion > 0 and inicio_char + posicion + len(separador) > minimo_char:
+                return inicio_char + posicion + len(separador)
+        return limite_char
+
+    def _emitir(self, estado, final):
+        inicios, fines = estado["inicios"], estado["fines"]
+        while inicios:
+            if len(inicios) <= self.max_tokens:
+                if not final:
+                    return  # la ventana todavía puede completarse con las páginas siguientes
+                corte_token = len(inicios)
+            else:
+                corte_char = self._corte(estado, self.max_tokens)
+                corte_token = bisect_left(inicios, corte_char)  # tokens que empiezan antes del corte
+                if corte_token == 0:
+                    corte_token = self.max_tokens
+
+            inicio_char, fin_char = inicios[0], fines[corte_token - 1]
+            crudo = estado["texto"][inicio_char - estado["base"]:fin_char - estado["base"]]
+            texto = crudo.strip()
+            if texto:
+                # Offsets del texto emitido, sin los espacios de los extremos
+                inicio_char += len(crudo) - len(crudo.lstrip())
+                fin_char -= len(crudo) - len(crudo.rstrip())
+                pagina = estado["paginas_numero"][bisect_right(estado["paginas_inicio"], inicio_char) - 1]
+                yield Fragmento(texto, pagina, inicio_char, fin_char,
+                                estado["token_base"], estado["token_base"] + corte_token)
+
+            # El siguiente chunk empieza siempre después del inicio de este
+            if corte_token == len(inicios) or corte_token <= self.solapamiento:
+                siguiente = corte_token
+            else:
+                siguiente = corte_token - self.solapamiento
+            del inicios[:siguiente], fines[:siguiente]
+            estado["token_base"] += siguiente
+            estado["solapados"] = corte_token - siguiente
+
+            # Descartar el texto ya consumido
+            nueva_base = inicios[0] if inicios else estado["largo"]
+            estado["texto"] = estado["texto"][nueva_base - estado["base"]:]
+            estado["base"] = nueva_base
+
+def fragmentar_caracteres_por_ventana(splitter, pages, ventana):
+    """
+    Genera (chunk, página en la que empieza) con `splitter` (RecursiveCharacterTextSplitter con
+    separador principal '\\n\\n', chunk_overlap=0 y add_start_index=True) sobre las páginas unidas con
+    '\\n\\n', sin armar el libro completo: acumula páginas hasta `ventana` caracteres y fragmenta.
+
+    El resultado es idéntico a fragmentar el texto completo. Los fragmentos son bloques de '\\n\\n'
+    agrupados de izquierda a derecha, así que se emite todo lo anterior al bloque donde empieza el
+    último chunk (ahí la agrupación arranca de cero) y ese bloque se arrastra a la ventana siguiente.
+    Un bloque precedido por otro vacío (solo saltos de línea) no sirve de corte: el vacío pudo
+    agruparse con él, y se busca un chunk anterior.
+    """
+    buffer = ""
+    inicios, numeros = [], []  # offset de cada página dentro del buffer y su número
+
+    def pagina_en(offset):
+        return numeros[bisect_right(inicios, offset) - 1]
+
+    for numero, texto in pages:
+        # Mismo separador que el '\n\n'.join(texts) original
+        if buffer:
+            buffer += "\n\n"
+        inicios.append(len(buffer))
+        numeros.append(numero)
+        buffer += texto
+        if len(buffer) < ventana:
+            continue
+
+        # Inicio de cada bloque de '\n\n' (el separador queda al inicio del bloque, como en el splitter)
+        bloques = [0] + [m.start() for m in re.finditer("\n\n", buffer) if m.start() > 0]
+        if len(bloques) < 2:
+            continue  # sin '\n\n' el splitter usaría otro separador que sobre el libro completo
+
+        docs = splitter.create_documents([buffer])
+        corte = None
+        for doc in reversed(docs):
+            k = bisect_right(bloques, doc.metadata['start_index']) - 1
+            if k > 0 and buffer[bloques[k - 1]:bloques[k]].strip():
+                corte = bloques[k]
+                break
+        if corte is None:
+            continue
+
+        for doc in docs:
+            if doc.metadata['start_index'] >= corte:
+                break
+            yield doc.page_content, pagina_en(doc.metadata['start_index'])
+
+        pagina_corte = pagina_en(corte)
+        siguientes = [(offset - corte, n) for offset, n in zip(inicios, numeros) if offset > corte]
+        inicios = [0] + [offset for offset, _ in siguientes]
+        numeros = [pagina_corte] + [n for _, n in siguientes]
+        buffer = buffer[corte:]
+
+    if buffer:
+        for doc in splitter.create_documents([buffer]):
+            yield doc.page_content, pagina_en(doc.metadata['start_index'])
@@ -0,0 +1,7 @@
+# Los módulos de rag/ se importan entre sí por nombre (se ejecutan desde rag/), igual que aquí
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "rag"))
+sys.path.insert(0, RAIZ)
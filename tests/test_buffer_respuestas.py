@@ -0,0 +1,89 @@
+import asyncio
+
+from bd.buffer_respuestas import BufferRespuestas, BufferLlenoError
+
+class ErrorPostgrest(Exception):
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+def crear_buffer(insertar, tmp_path, **kwargs):
+    return BufferRespuestas(insertar, dead_letter=str(tmp_path / "fallidas.jsonl"), **kwargs)
+
+def test_caida_no_divide_el_lote(tmp_path):
+    llamadas = []
+
+    async def insertar(filas):
+        llamadas.append(len(filas))
+        raise ConnectionError("Supabase no responde")
+
+    async def escenario():
+        buffer = crear_buffer(insertar, tmp_path, max_filas=200)
+        await buffer.agregar([{"id": i} for i in range(200)])
+        assert not await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(escenario())
+    assert llamadas == [200]
+    assert len(buffer._filas) == 200
+    assert all(intentos == 0 for _, intentos in buffer._filas)
+    assert buffer.metricas()["backoff_segundos"] > 0
+
+def test_aisla_filas_rechazadas(tmp_path):
+    escritas = []
+
+    async def insertar(filas):
+        if any(fila["id"] == 7 for fila in filas):
+            raise ErrorPostgrest("23503")  # clave foránea inválida
+        escritas.extend(fila["id"] for fila in filas)
+
+    async def escenario():
+        buffer = crear_buffer(insertar, tmp_path, max_filas=16, max_intentos=1)
+        await buffer.agregar([{"id": i} for i in range(16)])
+        await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(escenario())
+    assert sorted(escritas) == [i for i in range(16) if i != 7]
+    assert buffer.filas_dead_letter == 1
+    assert '"id": 7' in (tmp_path / "fallidas.jsonl").read_text(encoding="utf-8")
+
+def test_caida_durante_la_biseccion_detiene_las_llamadas(tmp_path):
+    llamadas = []
+
+    async def insertar(filas):
+        llamadas.append(len(filas))
+        if len(llamadas) == 1:
+            raise ErrorPostgrest("23505")
+        raise TimeoutError("timeout")
+
+    async def escenario():
+        buffer = crear_buffer(insertar, tmp_path, max_filas=8)
+        await buffer.agregar([{"id": i} for i in range(8)])
+        await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(escenario())
+    assert llamadas == [8, 4]
+    assert len(buffer._filas) == 8
+    assert all(intentos == 0 for _, intentos in buffer._filas)
+
+def test_lleno_con_supabase_caido_rechaza_sin_esperar(tmp_path):
+    llamadas = []
+
+    async def insertar(filas):
+        llamadas.append(len(filas))
+        raise ConnectionError("Supabase no responde")
+
+    async def escenario():
+        buffer = crear_buffer(insertar, tmp_path, max_filas=2, max_pendientes=2)
+        await buffer.agregar([{"id": 1}, {"id": 2}])
+        await buffer.flush()
+        try:
+            await buffer.agregar([{"id": 3}])
+        except BufferLlenoError:
+            return True
+        return False
+
+    assert asyncio.run(escenario())
+    assert llamadas == [2]
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from bd.cache import CatalogoCache, InvalidacionesCompartidas
+
+def test_carga_cancelada_no_deja_esperando_a_los_demas():
+    llamadas = []
+
+    async def escenario():
+        cache = CatalogoCache()
+        liberar = asyncio.Event()
+
+        async def cargador():
+            llamadas.append(1)
+            if len(llamadas) == 1:
+                await liberar.wait()  # la primera carga queda colgada hasta cancelarla
+            return ["tema"]
+
+        primera = asyncio.create_task(cache.obtener(("tema", 1), cargador))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(cache.obtener(("tema", 1), cargador))
+        await asyncio.sleep(0)
+        primera.cancel()
+        valor = await asyncio.wait_for(segunda, timeout=1)
+        with pytest.raises(asyncio.CancelledError):
+            await primera
+        return cache, valor
+
+    cache, valor = asyncio.run(escenario())
+    assert valor == ["tema"]
+    assert len(llamadas) == 2
+    assert not cache._en_vuelo
+
+def test_invalidacion_llega_a_otro_worker(tmp_path):
+    ruta = str(tmp_path / "catalogo_cache.sqlite3")
+
+    async def escenario():
+        local = CatalogoCache(compartidas=InvalidacionesCompartidas(ruta), sincronizacion=0.0)
+        otro = CatalogoCache(compartidas=InvalidacionesCompartidas(ruta), sincronizacion=0.0)
+        versiones = iter(["v1", "v2"])
+
+        async def cargador():
+            return next(versiones)
+
+        assert await otro.obtener(("tema", 1), cargador) == "v1"
+        await asyncio.sleep(0.01)
+        await local.invalidar("tema")
+        return await otro.obtener(("tema", 1), cargador)
+
+    assert asyncio.run(escenario()) == "v2"
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from splitter import fragmentar_caracteres_por_ventana
+
+def crear_splitter():
+    # La misma configuración que fragmentar_paginas_legacy en process_data.py
+    return RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ". ", " ", ""],
+        chunk_size=1000,
+        chunk_overlap=0,
+        add_start_index=True
+    )
+
+def fragmentar_completo(splitter, pages):
+    """La fragmentación original: el libro completo en un solo string"""
+    texto = "\n\n".join(t for _, t in pages)
+    inicios, offset = [], 0
+    for numero, t in pages:
+        inicios.append((offset, numero))
+        offset += len(t) + 2
+    resultado = []
+    for doc in splitter.create_documents([texto]):
+        pagina = [numero for inicio, numero in inicios if inicio <= doc.metadata['start_index']][-1]
+        resultado.append((doc.page_content, pagina))
+    return resultado
+
+def pagina_aleatoria(aleatorio):
+    palabras = ["fotosíntesis", "agua", "la", "planta", "absorbe", "luz.", "célula", "energía", "tierra", "raíz"]
+    parrafos = []
+    for _ in range(aleatorio.randint(1, 8)):
+        largo = aleatorio.choice([5, 20, 60, 200, 400])  # algunos párrafos superan los 1000 caracteres
+        parrafo = " ".join(aleatorio.choice(palabras) for _ in range(aleatorio.randint(1, largo)))
+        if aleatorio.random() < 0.3:
+            parrafo = parrafo.replace(" la ", "\nla ", 3)
+        parrafos.append(parrafo)
+    separadores = ["\n\n", "\n\n", "\n\n\n", "\n\n\n\n", "\n\n\n\n\n"]
+    texto = parrafos[0]
+    for parrafo in parrafos[1:]:
+        texto += aleatorio.choice(separadores) + parrafo
+    return texto.strip()
+
+@pytest.mark.parametrize("ventana", [1, 500, 2000, 20000])
+def test_ventanas_equivalen_al_texto_completo(ventana):
+    aleatorio = random.Random(ventana)
+    splitter = crear_splitter()
+    for _ in range(40):
+        pages = [(numero, pagina_aleatoria(aleatorio)) for numero in range(1, aleatorio.randint(2, 12))]
+        esperado = fragmentar_completo(splitter, pages)
+        obtenido = list(fragmentar_caracteres_por_ventana(splitter, iter(pages), ventana))
+        assert obtenido == esperado
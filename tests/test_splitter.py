@@ -0,0 +1,71 @@
+import re
+import random
+
+import pytest
+
+from splitter import DivisorTokens
+
+class TokenizerPalabras:
+    """Un token por palabra o signo, con offsets como los de un tokenizer rápido de transformers"""
+
+    def __call__(self, textos, add_special_tokens=False, return_offsets_mapping=False, return_attention_mask=False):
+        offsets = [[m.span() for m in re.finditer(r"\w+|[^\w\s]", texto)] for texto in textos]
+        return {"input_ids": [[0] * len(o) for o in offsets], "offset_mapping": offsets}
+
+def texto_documento(paginas):
+    return "\n\n".join(paginas)
+
+def verificar(fragmentos, documento, max_tokens):
+    for fragmento in fragmentos:
+        assert fragmento.texto == documento[fragmento.inicio_char:fragmento.fin_char]
+        assert fragmento.texto == fragmento.texto.strip()
+        assert 0 < fragmento.fin_token - fragmento.inicio_token <= max_tokens
+    for anterior, actual in zip(fragmentos, fragmentos[1:]):
+        assert actual.inicio_token > anterior.inicio_token
+        assert actual.fin_token > anterior.fin_token
+
+def test_chunk_mas_corto_que_el_solapamiento_no_se_repite():
+    divisor = DivisorTokens(max_tokens=10, solapamiento=4, tokenizer=TokenizerPalabras())
+    paginas = ["aa bb\n\ncc dd ee ff gg hh ii jj kk ll mm"]
+    fragmentos = list(divisor.dividir_textos(paginas))
+
+    assert [f.texto for f in fragmentos][:2] == ["aa bb", "cc dd ee ff gg hh ii jj kk ll"]
+    assert (fragmentos[0].inicio_token, fragmentos[0].fin_token) == (0, 2)
+    verificar(fragmentos, texto_documento(paginas), 10)
+
+def test_separador_dentro_del_solapamiento_no_genera_chunks_anidados():
+    divisor = DivisorTokens(max_tokens=10, solapamiento=4, tokenizer=TokenizerPalabras())
+    paginas = ["a1 a2 a3 a4 a5 a6\n\nb1 b2 b3 b4 b5 b6 b7 b8 b9 b10 b11 b12"]
+    fragmentos = list(divisor.dividir_textos(paginas))
+
+    verificar(fragmentos, texto_documento(paginas), 10)
+    assert fragmentos[0].texto == "a1 a2 a3 a4 a5 a6"
+    assert fragmentos[1].texto.startswith("a3 a4 a5 a6\n\nb1")
+
+def test_offsets_corresponden_al_texto_sin_espacios():
+    divisor = DivisorTokens(max_tokens=4, tokenizer=TokenizerPalabras())
+    paginas = ["  uno dos.  \n\n  tres cuatro cinco seis  "]
+    documento = texto_documento(paginas)
+    fragmentos = list(divisor.dividir_textos(paginas))
+
+    assert [f.texto for f in fragmentos] == ["uno dos.", "tres cuatro cinco seis"]
+    verificar(fragmentos, documento, 4)
+
+@pytest.mark.parametrize("solapamiento", [0, 3, 7])
+def test_textos_aleatorios(solapamiento):
+    aleatorio = random.Random(solapamiento)
+    palabras = ["sol", "agua", "planta", "raíz.", "hoja", "\n", "\n\n", "célula", "luz", "tierra"]
+    divisor = DivisorTokens(max_tokens=8, solapamiento=solapamiento, lote_paginas=2, tokenizer=TokenizerPalabras())
+    for _ in range(50):
+        paginas = [" ".join(aleatorio.choice(palabras) for _ in range(aleatorio.randint(0, 40)))
+                   for _ in range(aleatorio.randint(1, 5))]
+        documento = texto_documento(paginas)
+        fragmentos = list(divisor.dividir_textos(paginas))
+
+        verificar(fragmentos, documento, 8)
+        # Ningún token queda fuera de los chunks
+        cubiertos = set()
+        for fragmento in fragmentos:
+            cubiertos.update(range(fragmento.inicio_char, fragmento.fin_char))
+        for m in re.finditer(r"\w+|[^\w\s]", documento):
+            assert m.start() in cubiertos
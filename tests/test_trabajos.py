@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from api import trabajos
+from api.trabajos import ColaTrabajos, RegistroTrabajos, COMPLETADO
+
+def test_otro_worker_ve_el_resultado_y_el_registro_no_usa_el_loop(tmp_path, monkeypatch):
+    hilos = set()
+    guardar = RegistroTrabajos.guardar
+
+    def guardar_espiado(self, fila):
+        hilos.add(threading.current_thread().name)
+        return guardar(self, fila)
+
+    monkeypatch.setattr(RegistroTrabajos, "guardar", guardar_espiado)
+    ruta = str(tmp_path / "trabajos.sqlite3")
+
+    async def escenario():
+        local = ColaTrabajos(concurrencia=1, registro=RegistroTrabajos(ruta))
+        otro = ColaTrabajos(concurrencia=1, registro=RegistroTrabajos(ruta))
+        local.iniciar()
+        otro.iniciar()
+        trabajo = local.enviar(lambda x: [x * 2], 21)
+        await local.esperar(trabajo)
+        await local._en_registro(lambda: None)  # las escrituras del registro no se esperan
+        copia = await otro.obtener(trabajo.id)
+        copia = await otro.esperar(copia, timeout=2)
+        await local.detener()
+        await otro.detener()
+        return copia
+
+    copia = asyncio.run(escenario())
+    assert copia.estado == COMPLETADO
+    assert copia.resultado == [42]
+    assert hilos and all(nombre.startswith("registro-trabajos") for nombre in hilos)
+
+def test_purga_periodica_del_registro(tmp_path, monkeypatch):
+    monkeypatch.setattr(trabajos, "TRABAJOS_REGISTRO_PURGA", 0.0)
+    registro = RegistroTrabajos(str(tmp_path / "trabajos.sqlite3"), retencion=0.0)
+
+    async def escenario():
+        cola = ColaTrabajos(concurrencia=1, registro=registro, retencion=0.0)
+        cola.iniciar()
+        primero = cola.enviar(lambda: 1)
+        await cola.esperar(primero)
+        await cola.esperar(cola.enviar(lambda: 2))
+        await cola.detener()
+        return primero
+
+    primero = asyncio.run(escenario())
+    assert primero.id not in {fila[0] for fila in registro._conexion.execute("SELECT id FROM trabajos")}